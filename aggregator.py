@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import economy
+from database import AsyncTapDatabase
+from taplog import TapEventLog
+
+logger = logging.getLogger(__name__)
+
+
+class TapAggregator:
+    """Накопитель тапов: отвечает из памяти, в базу пишет пачками"""
+
+    def __init__(self, db: AsyncTapDatabase, flush_interval: float = 1.0, max_pending: int = 1000,
+                 event_log: Optional[TapEventLog] = None):
+        self.db = db
+        # Журнал событий тапов для аналитики и античита (None - не писать)
+        self.event_log = event_log
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Снимки игроков, у которых есть незаписанные тапы
+        self._players: Dict[int, Dict] = {}
+        # Накопленные и уже отправленные в базу (но ещё не записанные) тапы
+        self._pending: Dict[int, int] = {}
+        self._flushing: Dict[int, int] = {}
+        self._pending_taps = 0
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def add_tap(self, user_id: int, taps: int = 1) -> Dict:
+        """Засчитать тап в памяти и вернуть актуальное состояние игрока"""
+        player = self._players.get(user_id)
+        if player is None:
+            loaded = await self.db.get_player(user_id)
+            if not loaded:
+                # Строку в базе создаст ближайший сброс
+                loaded = {'user_id': user_id, 'username': '', 'display_name': '',
+                          'coins': 0, 'total_taps': 0}
+            # Пока ждали базу, параллельный тап мог уже загрузить игрока
+            player = self._players.setdefault(user_id, self._overlay(loaded))
+
+        player['coins'] = player.get('coins', 0) + taps * player.get('tap_power', 1)
+        player['total_taps'] = player.get('total_taps', 0) + taps
+        self._pending[user_id] = self._pending.get(user_id, 0) + taps
+        self._pending_taps += taps
+        if self.event_log is not None:
+            self.event_log.append(user_id, taps)
+
+        if self._pending_taps >= self.max_pending:
+            await self.flush()
+        # Снимок хранит монеты на момент загрузки; доход с тех пор база
+        # зачисляет при сбросах, а в ответе он досчитывается по той же формуле
+        return economy.settle(player)
+
+    def _overlay(self, player: Dict) -> Dict:
+        """Добавить к записи из базы ещё не записанные тапы"""
+        user_id = player.get('user_id')
+        delta = self._pending.get(user_id, 0) + self._flushing.get(user_id, 0)
+        if delta:
+            player = dict(player)
+            player['coins'] = player.get('coins', 0) + delta * player.get('tap_power', 1)
+            player['total_taps'] = player.get('total_taps', 0) + delta
+        return player
+
+    def stats(self) -> Dict:
+        """Объём ещё не записанных в базу тапов"""
+        return {
+            'pending_taps': self._pending_taps,
+            'pending_players': len(self._pending),
+            'flushing_players': len(self._flushing),
+            'active_players': len(self._players)
+        }
+
+    def peek(self, user_id: int) -> Optional[Dict]:
+        """Снимок активного игрока из памяти, без обращения к базе"""
+        player = self._players.get(user_id)
+        return economy.settle(dict(player)) if player is not None else None
+
+    async def get_player(self, user_id: int) -> Dict:
+        """Данные игрока из базы с учётом накопленных тапов"""
+        player = await self.db.get_player(user_id)
+        if not player:
+            # Новый игрок, чьи тапы ещё не дошли до базы
+            cached = self._players.get(user_id)
+            return economy.settle(dict(cached)) if cached else {}
+        return self._overlay(player)
+
+    async def buy_upgrade(self, user_id: int, upgrade: str) -> Dict:
+        """Купить улучшение: сначала записываются накопленные тапы, чтобы их
+        монеты можно было потратить"""
+        await self.flush()
+        result = await self.db.buy_upgrade(user_id, upgrade)
+        if result['success']:
+            # Снимок со старой силой тапа и монетами до покупки больше не годится;
+            # тапы, пришедшие во время сброса, загрузят игрока заново
+            self._players.pop(user_id, None)
+        result['player'] = self._overlay(result['player'])
+        return result
+
+    async def flush(self) -> int:
+        """Записать накопленные тапы одной транзакцией"""
+        if self.event_log is not None:
+            self.event_log.flush()
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            self._pending_taps = 0
+            self._flushing = batch
+            try:
+                await self.db.add_taps_bulk(list(batch.items()))
+            except Exception:
+                # Возвращаем тапы в очередь, чтобы не потерять их
+                for user_id, taps in batch.items():
+                    self._pending[user_id] = self._pending.get(user_id, 0) + taps
+                    self._pending_taps += taps
+                raise
+            finally:
+                self._flushing = {}
+
+            # Снимки игроков без новых тапов больше не нужны
+            for user_id in batch:
+                if user_id not in self._pending:
+                    self._players.pop(user_id, None)
+
+            logger.debug(f"Записано тапов: {sum(batch.values())} для {len(batch)} игроков")
+            return len(batch)
+
+    async def _flush_periodically(self):
+        """Фоновый сброс по таймеру"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи тапов: {e}")
+
+    def start(self):
+        """Запустить периодический сброс"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        """Остановить фоновый сброс и записать остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,280 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from aiohttp import web
+
+from aggregator import TapAggregator
+from cache import LRUCache
+from database import AsyncTapDatabase
+from economy import UPGRADES, upgrade_offers
+from leaderboard import page_cursors, parse_cursor
+from metrics import REGISTRY
+from names import MAX_NAME_LENGTH
+from ratelimit import TokenBucketLimiter
+from windows import check_window
+
+logger = logging.getLogger(__name__)
+
+# Больше тапов за одну пачку честный клиент за ~300 мс не наберёт
+MAX_TAPS_PER_BATCH = 100
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# initData старше суток не принимается: WebApp получает новую при каждом открытии
+INIT_DATA_MAX_AGE = 86400  # секунд
+
+TAPS_ACCEPTED = REGISTRY.counter("taps_total", "Засчитанные тапы", ("source",))
+TAPS_REJECTED = REGISTRY.counter("taps_rejected_total", "Тапы, отброшенные лимитом", ("source",))
+API_SECONDS = REGISTRY.histogram("api_request_seconds", "Время обработки HTTP-запроса", ("route",))
+
+
+def json_error(message: str, status: int = 400) -> web.Response:
+    """Ответ об ошибке в формате WebApp"""
+    return web.json_response({"success": False, "error": message}, status=status)
+
+
+@web.middleware
+async def cors_middleware(request: web.Request, handler):
+    """WebApp отдаётся с другого origin, поэтому разрешаем CORS"""
+    if request.method == "OPTIONS":
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    return response
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    """Гистограмма задержек по маршрутам"""
+    started = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "unmatched"
+        API_SECONDS.observe(time.perf_counter() - started, route)
+
+
+def init_data_hash(fields: Dict[str, str], bot_token: str) -> str:
+    """Подпись initData по правилам Telegram WebApp"""
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()) if key != "hash")
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    return hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: float = INIT_DATA_MAX_AGE) -> int:
+    """user_id из проверенной initData WebApp; ValueError, если подпись неверна или устарела"""
+    if not bot_token:
+        raise ValueError("проверка initData невозможна без BOT_TOKEN")
+    fields = dict(parse_qsl(init_data or "", keep_blank_values=True))
+    if not hmac.compare_digest(fields.get("hash", ""), init_data_hash(fields, bot_token)):
+        raise ValueError("неверная подпись initData")
+    if max_age and time.time() - int(fields.get("auth_date", 0)) > max_age:
+        raise ValueError("initData устарела")
+    user_id = int(json.loads(fields.get("user", "{}")).get("id", 0))
+    if user_id <= 0:
+        raise ValueError("в initData нет пользователя")
+    return user_id
+
+
+def sign_init_data(user_id: int, bot_token: str, auth_date: Optional[int] = None) -> str:
+    """initData, какую Telegram выдал бы WebApp игрока - для бенчмарков и проверок"""
+    fields = {
+        "auth_date": str(int(auth_date if auth_date is not None else time.time())),
+        "user": json.dumps({"id": user_id}, separators=(",", ":"))
+    }
+    fields["hash"] = init_data_hash(fields, bot_token)
+    return urlencode(fields)
+
+
+class TapApi:
+    """HTTP API для WebApp: пачки тапов вместо сообщения на каждый тап"""
+
+    def __init__(self, db: AsyncTapDatabase, taps: TapAggregator, bot_token: str,
+                 limiter: Optional[TokenBucketLimiter] = None, max_clients: int = 100000,
+                 metrics_token: str = ""):
+        self.db = db
+        self.taps = taps
+        # Игрок определяется по initData, подписанной токеном бота, а не по
+        # user_id из запроса: иначе тапать и тратить монеты можно за любого
+        self.bot_token = bot_token
+        self.limiter = limiter
+        # /metrics отдаётся только с токеном; без него - 404 (метрики - в файл)
+        self.metrics_token = metrics_token
+        # Последний применённый client_seq по игроку - повторы не начисляются дважды
+        self.last_seq = LRUCache(maxsize=max_clients)
+
+    def authenticate(self, init_data: Optional[str]) -> int:
+        """user_id из initData запроса; ValueError, если она не прошла проверку"""
+        return verify_init_data(init_data or "", self.bot_token)
+
+    def player_state(self, player: dict) -> dict:
+        """Состояние игрока для ответа"""
+        return {
+            "success": True,
+            "coins": player.get('coins', 0),
+            "total_taps": player.get('total_taps', 0),
+            "display_name": player.get('display_name') or '',
+            "has_name": bool(player.get('display_name')),
+            "tap_power": player.get('tap_power', 1),
+            "income_per_hour": player.get('income_per_hour', 0)
+        }
+
+    async def post_taps(self, request: web.Request) -> web.Response:
+        """POST /api/taps {init_data, taps, client_seq}"""
+        try:
+            data = await request.json()
+            count = int(data.get("taps", 0))
+            client_seq = int(data.get("client_seq", 0))
+        except (ValueError, TypeError, AttributeError) as e:
+            return json_error(f"Некорректный запрос: {e}")
+        try:
+            user_id = self.authenticate(data.get("init_data"))
+        except (ValueError, TypeError) as e:
+            return json_error(f"Доступ запрещён: {e}", status=401)
+
+        if count < 0 or count > MAX_TAPS_PER_BATCH:
+            return json_error(f"taps должно быть от 0 до {MAX_TAPS_PER_BATCH}")
+
+        requested = count
+        last_seq = self.last_seq.get(user_id, 0)
+        if client_seq and client_seq <= last_seq:
+            # Повтор уже применённой пачки (клиент не дождался ответа) - только состояние
+            requested = count = 0
+        elif count and self.limiter is not None:
+            # Тапы сверх лимита отбрасываются до базы
+            count = self.limiter.consume(user_id, count)
+
+        if requested != count:
+            TAPS_REJECTED.inc("api", amount=requested - count)
+        if count:
+            TAPS_ACCEPTED.inc("api", amount=count)
+            player = await self.taps.add_tap(user_id, count)
+        else:
+            player = self.taps.peek(user_id) or await self.taps.get_player(user_id)
+        if client_seq and client_seq > last_seq:
+            self.last_seq.set(user_id, client_seq)
+
+        response = self.player_state(player)
+        response["coins_added"] = count * player.get('tap_power', 1)
+        response["rejected"] = requested - count
+        response["client_seq"] = client_seq
+        return web.json_response(response)
+
+    async def get_state(self, request: web.Request) -> web.Response:
+        """GET /api/state?init_data="""
+        try:
+            user_id = self.authenticate(request.query.get("init_data"))
+        except (ValueError, TypeError) as e:
+            return json_error(f"Доступ запрещён: {e}", status=401)
+
+        player = await self.taps.get_player(user_id)
+        if not player:
+            player = await self.db.create_player(user_id)
+        response = self.player_state(player)
+        response["upgrades"] = upgrade_offers(player)
+        return web.json_response(response)
+
+    async def post_upgrade(self, request: web.Request) -> web.Response:
+        """POST /api/upgrade {init_data, upgrade} - купить уровень улучшения"""
+        try:
+            data = await request.json()
+            upgrade = str(data.get("upgrade", ""))
+        except (ValueError, TypeError, AttributeError) as e:
+            return json_error(f"Некорректный запрос: {e}")
+        try:
+            user_id = self.authenticate(data.get("init_data"))
+        except (ValueError, TypeError) as e:
+            return json_error(f"Доступ запрещён: {e}", status=401)
+        if upgrade not in UPGRADES:
+            return json_error(f"upgrade должно быть одним из: {', '.join(UPGRADES)}")
+
+        result = await self.taps.buy_upgrade(user_id, upgrade)
+        response = self.player_state(result['player'])
+        response["success"] = result['success']
+        response["price"] = result['price']
+        response["upgrades"] = upgrade_offers(result['player'])
+        if not result['success']:
+            response["error"] = "Не хватает монет"
+        return web.json_response(response)
+
+    async def get_top(self, request: web.Request) -> web.Response:
+        """GET /api/top?limit=&window=&after=&before=&around= - топ за период (day, week,
+        season), страница до или после курсора "монеты:user_id" или соседи игрока around"""
+        window = request.query.get("window", "")
+        try:
+            limit = min(max(int(request.query.get("limit", 10)), 1), 100)
+            if window:
+                check_window(window)
+            after = parse_cursor(request.query.get("after"))
+            before = parse_cursor(request.query.get("before"))
+            around = int(request.query.get("around", 0))
+        except ValueError as e:
+            return json_error(f"Некорректный запрос: {e}")
+
+        if window:
+            top_players = await self.db.get_window_top(window, limit)
+            return web.json_response({"success": True, "window": window, "top_players": top_players})
+        if around:
+            top_players = await self.db.get_players_around(around, limit // 2)
+        else:
+            top_players = await self.db.get_top_page(after, before, limit)
+        return web.json_response({"success": True, "top_players": top_players, **page_cursors(top_players)})
+
+    async def suggest_names(self, request: web.Request) -> web.Response:
+        """GET /api/names/suggest?name=&count=&user_id= - свободно ли имя и варианты"""
+        name = request.query.get("name", "").strip()
+        try:
+            count = min(max(int(request.query.get("count", 3)), 1), 10)
+            user_id = int(request.query.get("user_id", 0))
+        except ValueError as e:
+            return json_error(f"Некорректный запрос: {e}")
+        if not name or len(name) > MAX_NAME_LENGTH:
+            return json_error(f"name должно быть от 1 до {MAX_NAME_LENGTH} символов")
+
+        result = await self.db.suggest_names(name, count, user_id)
+        return web.json_response({"success": True, "name": name, **result})
+
+    async def get_metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics - метрики процесса в текстовом формате Prometheus"""
+        if not self.metrics_token:
+            raise web.HTTPNotFound()
+        supplied = request.query.get("token", "")
+        authorization = request.headers.get("Authorization", "")
+        if not supplied and authorization.startswith("Bearer "):
+            supplied = authorization[len("Bearer "):]
+        if not supplied or not hmac.compare_digest(supplied.encode(), self.metrics_token.encode()):
+            return web.Response(status=403)
+        return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+    def setup(self, app: web.Application):
+        """Добавить маршруты API в существующее приложение (например, вебхука)"""
+        app.middlewares.append(metrics_middleware)
+        app.middlewares.append(cors_middleware)
+        app.router.add_post("/api/taps", self.post_taps)
+        app.router.add_get("/api/state", self.get_state)
+        app.router.add_post("/api/upgrade", self.post_upgrade)
+        app.router.add_get("/api/top", self.get_top)
+        app.router.add_get("/api/names/suggest", self.suggest_names)
+        app.router.add_get("/metrics", self.get_metrics)
+
+    def create_app(self) -> web.Application:
+        """Отдельное aiohttp-приложение с маршрутами API"""
+        app = web.Application()
+        self.setup(app)
+        return app
+
+
+async def start_api(api: TapApi, host: str, port: int) -> web.AppRunner:
+    """Запустить API рядом с ботом; вернуть runner для остановки"""
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"HTTP API запущен на http://{host}:{port}")
+    return runner
@@ -0,0 +1,96 @@
+"""Пропускная способность обработки апдейтов: синхронная база против AsyncTapDatabase
+
+Каждый симулированный пользователь шлёт тапы подряд. Обработчик пишет тап в
+базу и "отвечает" в Telegram (asyncio.sleep вместо сетевого вызова).
+Параллельно heartbeat-задача меряет, насколько event loop не успевает
+проснуться вовремя - это задержка, которую видят все остальные пользователи.
+
+    python benchmarks/bench_async_db.py --users 50 --taps 40
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncTapDatabase, TapDatabase  # noqa: E402
+
+HEARTBEAT = 0.005
+
+
+async def heartbeat(stop: asyncio.Event, lags: list):
+    """Фиксировать опоздания event loop"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run(mode: str, users: int, taps: int, latency: float, workdir: str) -> dict:
+    """Прогнать users x taps апдейтов через выбранный режим доступа к базе"""
+    database = TapDatabase(os.path.join(workdir, f"{mode}.db"))
+    adb = AsyncTapDatabase(database)
+
+    async def handle_tap(user_id: int):
+        if mode == "sync":
+            database.add_tap(user_id)
+        else:
+            await adb.add_tap(user_id)
+        # Ответ пользователю
+        await asyncio.sleep(latency)
+
+    async def user(user_id: int):
+        for _ in range(taps):
+            await handle_tap(user_id)
+
+    stop = asyncio.Event()
+    lags = []
+    monitor = asyncio.create_task(heartbeat(stop, lags))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+    await adb.close()
+
+    updates = users * taps
+    lags.sort()
+    return {
+        'mode': mode,
+        'updates': updates,
+        'seconds': elapsed,
+        'updates_per_sec': updates / elapsed,
+        'loop_lag_p99_ms': lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+        'loop_lag_max_ms': lags[-1] * 1000 if lags else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--taps", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="имитация сетевого ответа Telegram, секунд")
+    parser.add_argument("--dir", default=None,
+                        help="каталог для файлов базы (по умолчанию временный); "
+                             "укажите каталог на боевом диске, чтобы учесть реальный fsync")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        for mode in ("sync", "async"):
+            result = asyncio.run(run(mode, args.users, args.taps, args.latency, workdir))
+            print(
+                f"{result['mode']:>5}: {result['updates']} апдейтов за {result['seconds']:.2f} с "
+                f"({result['updates_per_sec']:.0f}/с), лаг loop p99 {result['loop_lag_p99_ms']:.1f} мс, "
+                f"max {result['loop_lag_max_ms']:.1f} мс"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Скорость рассылки (broadcast.Broadcaster) с поддельным Bot API
+
+FakeBot отвечает с задержкой --latency, как Telegram, отбрасывает
+сообщения сверх --flood-limit в секунду ответом retry_after и отвечает
+Forbidden для доли --blocked игроков. Замеры:
+
+  engine    - без лимитов: сколько сообщений в секунду даёт сам движок
+              при разном числе одновременных отправок;
+  limited   - с общим лимитом --rate против флуд-контроля FakeBot
+              (и без лимита - сколько при этом будет retry_after);
+  resume    - рассылка прерывается посередине и продолжается новым
+              Broadcaster с контрольной точки: все игроки получают
+              сообщение, повторов не больше страницы.
+
+    python benchmarks/bench_broadcast.py --players 20000 --concurrency 16 64 256
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import BroadcastStore, Broadcaster  # noqa: E402
+from database import AsyncTapDatabase  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+class FakeBot:
+    """Вместо Bot API: задержка, флуд-контроль и заблокировавшие бота игроки"""
+
+    def __init__(self, latency: float, flood_limit: float = 0, blocked_share: float = 0.0):
+        self.latency = latency
+        self.flood_limit = flood_limit
+        self.blocked_per_mille = int(blocked_share * 1000)
+        self.window = deque()
+        self.delivered = Counter()
+        self.retry_after = 0
+
+    def is_blocked(self, chat_id: int) -> bool:
+        """Детерминированно: одни и те же игроки заблокировали бота"""
+        return (chat_id * 2654435761) % 1000 < self.blocked_per_mille
+
+    async def send_message(self, chat_id: int, text: str, parse_mode=None):
+        if self.flood_limit:
+            now = time.monotonic()
+            while self.window and now - self.window[0] >= 1.0:
+                self.window.popleft()
+            if len(self.window) >= self.flood_limit:
+                self.retry_after += 1
+                raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Flood control exceeded", 1)
+            self.window.append(now)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.is_blocked(chat_id):
+            raise TelegramForbiddenError(SendMessage(chat_id=chat_id, text=text), "bot was blocked by the user")
+        self.delivered[chat_id] += 1
+
+
+def seed(db_path: str, players: int):
+    """База с игроками 1..players"""
+    storage = create_storage("sqlite", db_path)
+    rows = [(user_id, f"user{user_id}", None, 0, 0, None, None) for user_id in range(1, players + 1)]
+    storage.import_players(rows)
+    storage.close()
+
+
+async def broadcast_once(db_path: str, store_path: str, bot: FakeBot, players: int, **options) -> dict:
+    """Одна рассылка от начала до конца"""
+    db = AsyncTapDatabase(create_storage("sqlite", db_path))
+    store = BroadcastStore(store_path)
+    broadcaster = Broadcaster(bot, db, store, **options)
+    job = await asyncio.to_thread(store.create, "bench", None)
+    started = time.perf_counter()
+    counts = await broadcaster.run(job['id'])
+    elapsed = time.perf_counter() - started
+    store.close()
+    await db.close()
+    assert sum(counts.values()) == players, counts
+    return {
+        **counts,
+        "seconds": round(elapsed, 2),
+        "messages_per_sec": round(players / elapsed, 1),
+        "retry_after": bot.retry_after
+    }
+
+
+async def resume_check(db_path: str, store_path: str, players: int, args) -> dict:
+    """Прервать рассылку посередине и продолжить с контрольной точки"""
+    bot = FakeBot(args.latency, blocked_share=args.blocked)
+    options = dict(rate=1e9, concurrency=16, chunk_size=args.chunk_size)
+
+    db = AsyncTapDatabase(create_storage("sqlite", db_path))
+    store = BroadcastStore(store_path)
+    first = Broadcaster(bot, db, store, **options)
+    job = await first.start("bench resume")
+    while len(bot.delivered) < players // 2:
+        await asyncio.sleep(0.01)
+    await first.stop()
+    interrupted_at = (await asyncio.to_thread(store.get, job['id']))['last_user_id']
+
+    second = Broadcaster(bot, db, store, **options)
+    await second.resume()
+    while (await asyncio.to_thread(store.get, job['id']))['status'] == 'running':
+        await asyncio.sleep(0.05)
+    final = await asyncio.to_thread(store.get, job['id'])
+    store.close()
+    await db.close()
+
+    expected = [user_id for user_id in range(1, players + 1) if not bot.is_blocked(user_id)]
+    missing = sum(1 for user_id in expected if not bot.delivered[user_id])
+    duplicates = sum(count - 1 for count in bot.delivered.values() if count > 1)
+    return {
+        "interrupted_at": interrupted_at,
+        "status": final['status'],
+        "missing": missing,
+        "duplicates": duplicates,
+        "max_duplicates": args.chunk_size
+    }
+
+
+async def run(args, workdir: str) -> dict:
+    db_path = os.path.join(workdir, "players.db")
+    seed(db_path, args.players)
+    results = {"engine": {}, "limited": {}}
+
+    print(f"Игроков: {args.players}, задержка Bot API: {args.latency * 1000:.0f} мс")
+    print("engine (без лимитов):")
+    for concurrency in args.concurrency:
+        bot = FakeBot(args.latency, blocked_share=args.blocked)
+        result = await broadcast_once(
+            db_path, os.path.join(workdir, f"engine{concurrency}.db"), bot, args.players,
+            rate=1e9, per_chat_rate=1e9, concurrency=concurrency, chunk_size=args.chunk_size
+        )
+        results["engine"][concurrency] = result
+        print(f"  одновременно {concurrency:>4}: {result['messages_per_sec']:>9.1f} сообщ/с "
+              f"(отправлено {result['sent']}, заблокировали {result['blocked']})")
+
+    limited_db = os.path.join(workdir, "limited.db")
+    seed(limited_db, args.limited_players)
+    print(f"limited ({args.limited_players} игроков, флуд-контроль FakeBot {args.flood_limit}/с):")
+    for rate in (args.rate, 1e9):
+        bot = FakeBot(args.latency, flood_limit=args.flood_limit)
+        result = await broadcast_once(
+            limited_db, os.path.join(workdir, f"limited{rate:.0f}.db"), bot, args.limited_players,
+            rate=rate, concurrency=16, chunk_size=args.chunk_size
+        )
+        label = f"лимит {rate:g}/с" if rate < 1e9 else "без лимита"
+        results["limited"][label] = result
+        print(f"  {label:<14}: {result['messages_per_sec']:>9.1f} сообщ/с, retry_after: {result['retry_after']}, "
+              f"не доставлено: {result['failed']}")
+
+    result = await resume_check(db_path, os.path.join(workdir, "resume.db"), args.players, args)
+    results["resume"] = result
+    print(f"resume: прервана после игрока {result['interrupted_at']}, статус {result['status']}, "
+          f"не получили {result['missing']}, повторов {result['duplicates']} (допустимо до {result['max_duplicates']})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--latency", type=float, default=0.03, help="ответ Bot API, секунд")
+    parser.add_argument("--blocked", type=float, default=0.05, help="доля заблокировавших бота")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--limited-players", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=25.0, help="общий лимит рассылки, сообщений в секунду")
+    parser.add_argument("--flood-limit", type=float, default=30.0, help="флуд-контроль FakeBot, сообщений в секунду")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(run(args, workdir))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Ленивый пассивный доход: стоимость не зависит от времени простоя
+
+Хранилище заполняется игроками; доля --earning получает автотапер, и их
+последний расчёт дохода (settled_at) отстоит от текущего момента на одно
+из значений --idle. Для каждой группы меряются get_player (доход
+досчитывается при чтении) и add_tap (доход зачисляется той же записью) на
+разных игроках - время должно быть одинаковым для минуты и месяца простоя
+и таким же, как у игроков без дохода. Затем меряется массовое зачисление
+settle_income: оно обходит только игроков с доходом.
+
+    python benchmarks/bench_income.py --players 10000 100000 --engine sqlite memory
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import TapStorage, create_storage  # noqa: E402
+
+SEED_CHUNK = 50000
+# Доход игроков с автотапером: 10 уровней по 360 монет в час
+INCOME_PER_HOUR = 3600
+
+
+def seed(storage: TapStorage, players: int, earning: float, idles: List[int], rnd: random.Random) -> Dict:
+    """Игроки с доходом по группам простоя; вернуть {группа: [user_id]}"""
+    now = time.time()
+    groups = {'без дохода': []}
+    groups.update({f"простой {idle} с": [] for idle in idles})
+    chunk = []
+    for user_id in range(1, players + 1):
+        coins = rnd.randint(0, 100000)
+        if rnd.random() < earning:
+            idle = rnd.choice(idles)
+            groups[f"простой {idle} с"].append(user_id)
+            economy = (1, INCOME_PER_HOUR, now - idle)
+        else:
+            groups['без дохода'].append(user_id)
+            economy = (1, 0, None)
+        chunk.append((user_id, f"user{user_id}", None, coins, coins, None, None) + economy)
+        if len(chunk) == SEED_CHUNK:
+            storage.import_players(chunk)
+            chunk = []
+    if chunk:
+        storage.import_players(chunk)
+    return groups
+
+
+def median_us(func, user_ids: List[int]) -> float:
+    """Медиана времени вызова func(user_id) в микросекундах"""
+    samples = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        func(user_id)
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1e6, 1)
+
+
+def bench(engine: str, players: int, args, workdir: str) -> Dict:
+    """Прогон одного хранилища"""
+    rnd = random.Random(args.seed)
+    path = os.path.join(workdir, f"{engine}{players}.{'db' if engine == 'sqlite' else 'mem'}")
+    options = {"snapshot_on_close": False} if engine == "memory" else {}
+    storage = create_storage(engine, path, **options)
+    groups = seed(storage, players, args.earning, args.idle, rnd)
+
+    result = {"groups": {}}
+    for group, user_ids in groups.items():
+        # Разные игроки для чтения и записи: каждый замер - на ещё не тронутом игроке
+        sample = rnd.sample(user_ids, min(len(user_ids), 2 * args.ops))
+        reads, writes = sample[:len(sample) // 2], sample[len(sample) // 2:]
+        result["groups"][group] = {
+            "players": len(user_ids),
+            "get_player_us": median_us(storage.get_player, reads),
+            "add_tap_us": median_us(storage.add_tap, writes)
+        }
+
+    earners = players - len(groups['без дохода'])
+    started = time.perf_counter()
+    settled = storage.settle_income()
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    storage.settle_income()
+    second = time.perf_counter() - started
+    storage.close()
+
+    result["settle_income"] = {
+        "earners": earners,
+        "settled": settled,
+        "ms": round(first * 1000, 1),
+        "us_per_earner": round(first / max(earners, 1) * 1e6, 2),
+        "repeat_ms": round(second * 1000, 1)
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--engine", nargs="+", default=["sqlite", "memory"], choices=["sqlite", "memory"])
+    parser.add_argument("--earning", type=float, default=0.3, help="доля игроков с доходом")
+    parser.add_argument("--idle", type=int, nargs="+", default=[60, 86400, 30 * 86400],
+                        help="простой игроков с доходом, секунд")
+    parser.add_argument("--ops", type=int, default=1000, help="замеров на группу")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for engine in args.engine:
+            for players in args.players:
+                result = bench(engine, players, args, workdir)
+                results[f"{engine}/{players}"] = result
+                print(f"{engine}, игроков {players}:")
+                for group, stats in result["groups"].items():
+                    print(f"  {group:<18} get_player {stats['get_player_us']:>7.1f} мкс, "
+                          f"add_tap {stats['add_tap_us']:>7.1f} мкс")
+                settle = result["settle_income"]
+                print(f"  settle_income: {settle['settled']} из {settle['earners']} игроков с доходом "
+                      f"за {settle['ms']} мс ({settle['us_per_earner']} мкс на игрока), "
+                      f"повторно {settle['repeat_ms']} мс")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Атомарные начисления: скорость и проверка, что ни один тап не потерян
+
+Несколько потоков одновременно тапают одним и тем же игрокам через
+TapDatabase.add_tap и add_taps_bulk. В конце суммы в базе сверяются с
+числом отправленных тапов; при расхождении скрипт завершается с ошибкой.
+
+    python benchmarks/bench_increments.py --threads 8 --taps 500 --users 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import TapDatabase  # noqa: E402
+
+
+def hammer(database: TapDatabase, users: int, taps: int, bulk: bool, sent: list):
+    """Поток, отправляющий taps начислений случайным игрокам"""
+    rnd = random.Random()
+    local = 0
+    if bulk:
+        # Пачки по 10 пар (user_id, delta)
+        for _ in range(taps // 10):
+            deltas = [(rnd.randint(1, users), rnd.randint(1, 3)) for _ in range(10)]
+            database.add_taps_bulk(deltas)
+            local += sum(delta for _, delta in deltas)
+    else:
+        for _ in range(taps):
+            database.add_tap(rnd.randint(1, users))
+            local += 1
+    sent.append(local)
+
+
+def run(threads: int, taps: int, users: int, bulk: bool, workdir: str) -> bool:
+    """Прогон одного режима; возвращает True, если суммы сошлись"""
+    database = TapDatabase(os.path.join(workdir, f"bulk{int(bulk)}.db"), pool_size=threads)
+    sent = []
+    workers = [
+        threading.Thread(target=hammer, args=(database, users, taps, bulk, sent))
+        for _ in range(threads)
+    ]
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    stats = database.get_global_stats()
+    database.close()
+
+    expected = sum(sent)
+    ok = stats['total_coins'] == expected and stats['total_taps'] == expected
+    mode = "add_taps_bulk" if bulk else "add_tap"
+    print(
+        f"{mode:>13}: {expected} тапов за {elapsed:.2f} с ({expected / elapsed:.0f}/с), "
+        f"в базе {stats['total_coins']} монет - {'OK' if ok else 'ПОТЕРЯНЫ ТАПЫ'}"
+    )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--taps", type=int, default=500, help="начислений на поток")
+    parser.add_argument("--users", type=int, default=5, help="мало игроков - больше конфликтов")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        ok = all([
+            run(args.threads, args.taps, args.users, False, workdir),
+            run(args.threads, args.taps, args.users, True, workdir)
+        ])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
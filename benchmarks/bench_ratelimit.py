@@ -0,0 +1,52 @@
+"""Накладные расходы TokenBucketLimiter на один вызов
+
+Меряет consume() для горячего игрока, для потока разных игроков и
+evict_idle() на заполненной таблице бакетов.
+
+    python benchmarks/bench_ratelimit.py --users 100000 --calls 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import TokenBucketLimiter  # noqa: E402
+
+
+def measure(label: str, limiter: TokenBucketLimiter, keys: list):
+    """Прогнать consume() по списку ключей и напечатать нс/вызов"""
+    consume = limiter.consume
+    started = time.perf_counter()
+    for key in keys:
+        consume(key)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>22}: {elapsed / len(keys) * 1e9:.0f} нс/вызов, {limiter.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=1000000)
+    args = parser.parse_args()
+
+    measure("один игрок", TokenBucketLimiter(rate=20, burst=40), [1] * args.calls)
+
+    rnd = random.Random(1)
+    keys = [rnd.randint(1, args.users) for _ in range(args.calls)]
+    limiter = TokenBucketLimiter(rate=20, burst=40)
+    measure(f"{args.users} игроков", limiter, keys)
+
+    # Все бакеты "простаивают": сдвигаем часы за idle_ttl
+    now = time.monotonic() + limiter.idle_ttl + 1
+    limiter.clock = lambda: now
+    started = time.perf_counter()
+    evicted = limiter.evict_idle()
+    elapsed = time.perf_counter() - started
+    print(f"{'evict_idle':>22}: {evicted} бакетов за {elapsed * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Суммарная скорость записи в зависимости от числа шардов
+
+Для каждого числа шардов --concurrency корутин пишут тапы случайным игрокам
+через AsyncTapDatabase (у каждого шарда свой поток-писатель) - по одной
+транзакции на тап, как без агрегатора, - и печатается число записей в секунду.
+
+    python benchmarks/bench_shards.py --shards 1 2 4 8 --writes 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncTapDatabase, TapDatabase  # noqa: E402
+
+
+async def run(shards: int, writes: int, concurrency: int, users: int, workdir: str) -> float:
+    """Записать writes тапов и вернуть записей в секунду"""
+    db = AsyncTapDatabase(TapDatabase(
+        os.path.join(workdir, f"shards{shards}.db"), shards=shards, in_memory_ranking=False
+    ))
+    per_worker = writes // concurrency
+
+    async def worker(seed: int):
+        rnd = random.Random(seed)
+        for _ in range(per_worker):
+            await db.add_tap(rnd.randint(1, users))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(seed) for seed in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stats = await db.get_global_stats()
+    await db.close()
+    assert stats['total_taps'] == per_worker * concurrency, stats
+    return per_worker * concurrency / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--writes", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--dir", default=None, help="каталог для файлов базы (по умолчанию временный)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        for shards in args.shards:
+            rate = asyncio.run(run(shards, args.writes, args.concurrency, args.users, workdir))
+            print(f"шардов: {shards:>2} - {rate:.0f} записей/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""Бенчмарки горячих путей: операции хранилища и обработчики бота
+
+Для каждого размера из --players хранилище заполняется синтетическими
+игроками, после чего меряются задержки (p50/p95/p99/max) и пропускная
+способность add_tap, get_player, get_top_players, get_player_rank и т.д.
+Затем handle_web_app_data, top_handler и stats_handler из handlers.py
+вызываются с поддельными Message/CallbackQuery от --concurrency
+одновременных пользователей; ответы Telegram заменяет StubBot с задержкой
+--latency; для них считаются чтения, склеенные с одновременными такими
+же, и правки сообщений, которые не пришлось отправлять. Время запуска
+(импорт main.py и create_app с открытием базы) меряется в отдельных
+интерпретаторах, --startup-runs раз.
+Результаты пишутся в JSON (--output), два JSON можно сравнить.
+
+    python benchmarks/bench_suite.py --players 10000 100000 --output before.json
+    python benchmarks/bench_suite.py --players 1000000 --ops 20000 --skip-handlers
+    python benchmarks/bench_suite.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config  # noqa: E402
+from storage import TapStorage, create_storage  # noqa: E402
+
+SEED_CHUNK = 50000
+# Доля игроков с отображаемым именем (попадают в топ)
+NAMED_SHARE = 0.2
+
+
+def synthetic_rows(players: int, seed: int) -> Iterator[Tuple]:
+    """Строки игроков для import_players с монетами по степенному закону"""
+    rnd = random.Random(seed)
+    for user_id in range(1, players + 1):
+        coins = int(rnd.paretovariate(1.2) * 10) - 10
+        display_name = f"bench_{user_id}" if rnd.random() < NAMED_SHARE else None
+        yield (user_id, f"user{user_id}", display_name, coins, coins,
+               "2024-01-01 00:00:00", "2024-01-01 00:00:00")
+
+
+def seed_storage(storage: TapStorage, players: int, seed: int) -> float:
+    """Заполнить хранилище игроками; вернуть время в секундах"""
+    started = time.perf_counter()
+    chunk = []
+    for row in synthetic_rows(players, seed):
+        chunk.append(row)
+        if len(chunk) == SEED_CHUNK:
+            storage.import_players(chunk)
+            chunk = []
+    if chunk:
+        storage.import_players(chunk)
+    return time.perf_counter() - started
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict:
+    """Перцентили задержки (мкс) и операций в секунду"""
+    samples = sorted(samples)
+
+    def percentile(q: float) -> float:
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6, 1)
+
+    return {
+        'count': len(samples),
+        'ops_per_sec': round(len(samples) / elapsed, 1),
+        'p50_us': percentile(0.50),
+        'p95_us': percentile(0.95),
+        'p99_us': percentile(0.99),
+        'max_us': round(samples[-1] * 1e6, 1)
+    }
+
+
+def measure(func: Callable, args: List[Tuple]) -> Dict:
+    """Вызвать func для каждого набора аргументов, замеряя каждый вызов"""
+    clock = time.perf_counter
+    samples = []
+    started = clock()
+    for call_args in args:
+        t0 = clock()
+        func(*call_args)
+        samples.append(clock() - t0)
+    return summarize(samples, clock() - started)
+
+
+def storage_options(engine: str) -> Dict:
+    """Параметры движка для замеров: без TTL-кэша топа, чтобы мерить сам запрос"""
+    if engine == "sqlite":
+        return {'top_cache_ttl': 0}
+    # Снимок посреди замера исказил бы хвост задержек
+    return {'snapshot_every': 0}
+
+
+def bench_storage(engine: str, players: int, ops: int, workdir: str, seed: int) -> Dict:
+    """Замеры операций хранилища на players игроках"""
+    path = os.path.join(workdir, f"storage_{engine}_{players}.db")
+    storage = create_storage(engine, path, **storage_options(engine))
+    result = {'seed_seconds': round(seed_storage(storage, players, seed), 2)}
+
+    rnd = random.Random(seed + 1)
+    users = [(rnd.randint(1, players),) for _ in range(ops)]
+    new_users = [(players + idx,) for idx in range(1, ops + 1)]
+    batches = [
+        ([(rnd.randint(1, players), rnd.randint(1, 30)) for _ in range(100)],)
+        for _ in range(max(1, ops // 100))
+    ]
+
+    result['get_player'] = measure(storage.get_player, users)
+    result['get_player_miss'] = measure(storage.get_player, new_users)
+    result['add_tap'] = measure(storage.add_tap, users)
+    result['add_tap_new_player'] = measure(storage.add_tap, new_users)
+    result['add_taps_bulk_100'] = measure(storage.add_taps_bulk, batches)
+    result['get_player_rank'] = measure(storage.get_player_rank, users)
+    result['get_top_players_10'] = measure(storage.get_top_players, [(10,)] * max(1, ops // 10))
+    # Курсоры с малыми монетами - глубоко в топе, где OFFSET обошёл бы почти всю таблицу
+    deep_pages = [((rnd.randint(0, 5), user_id), None, 10) for user_id, in users]
+    result['get_top_page_deep'] = measure(storage.get_top_page, deep_pages)
+    result['get_players_around'] = measure(storage.get_players_around, [(user_id, 5) for user_id, in users])
+    # Рейтинг за неделю по тапам, начисленным замерами выше
+    result['get_window_rank'] = measure(storage.get_window_rank, [('week', user_id) for user_id, in users])
+    result['get_window_top_10'] = measure(storage.get_window_top, [('week', 10)] * max(1, ops // 10))
+    result['get_global_stats'] = measure(storage.get_global_stats, [()] * max(1, ops // 10))
+    storage.close()
+    return result
+
+
+class StubBot:
+    """Вместо Bot API: копит отправленные ответы и ждёт latency секунд"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+        self.errors = 0
+
+    async def send(self, text: str):
+        """Отправить ответ пользователю"""
+        self.sent += 1
+        if text.startswith('{"success": false'):
+            self.errors += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.username = f"user{user_id}"
+        self.first_name = "Bench"
+
+
+class FakeWebAppData:
+    def __init__(self, data: str):
+        self.data = data
+
+
+class FakeMessage:
+    """Минимум aiogram.types.Message, который используют обработчики"""
+
+    def __init__(self, bot: StubBot, user_id: int, text: str = None, web_app_data: str = None):
+        self.bot = bot
+        self.from_user = FakeUser(user_id)
+        # Личный чат: id чата совпадает с id пользователя
+        self.chat = FakeUser(user_id)
+        self.message_id = 1
+        self.text = text
+        self.web_app_data = FakeWebAppData(web_app_data) if web_app_data is not None else None
+
+    async def answer(self, text: str, **kwargs):
+        await self.bot.send(text)
+
+    async def edit_text(self, text: str, **kwargs):
+        await self.bot.send(text)
+
+
+class FakeCallbackQuery:
+    """Минимум aiogram.types.CallbackQuery, который используют обработчики"""
+
+    def __init__(self, bot: StubBot, user_id: int, data: str):
+        self.bot = bot
+        self.from_user = FakeUser(user_id)
+        self.data = data
+        self.message = FakeMessage(bot, user_id)
+
+    async def answer(self, text: str = None, **kwargs):
+        if self.bot.latency:
+            await asyncio.sleep(self.bot.latency)
+
+
+# Токен нужен только для формы: Bot API в замерах не вызывается
+BENCH_BOT_TOKEN = "123456:bench"
+# Запуск в отдельном интерпретаторе: импорт main.py, create_app, закрытие базы
+STARTUP_SCRIPT = '''
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported_ms = round((time.perf_counter() - started) * 1000, 1)
+game = main.create_app()
+asyncio.run(game.db.close())
+print(json.dumps({"import": imported_ms, **game.startup_timings}))
+'''
+
+
+def create_game(engine: str, db_path: str, rate_limit: bool):
+    """Собрать приложение main.py поверх подготовленной базы"""
+    main_module = importlib.import_module("main")
+    game = main_module.create_app(Config(
+        bot_token=BENCH_BOT_TOKEN, db_engine=engine, db_path=db_path, api_public_url="",
+        broadcast_db_path=os.path.join(os.path.dirname(db_path), "broadcasts.db")
+    ))
+    if not rate_limit:
+        game.tap_limiter.rate = game.tap_limiter.burst = 1e9
+    return game
+
+
+def bench_startup(engine: str, db_path: str, runs: int) -> Dict:
+    """Медианы этапов запуска по runs свежим интерпретаторам, мс"""
+    env = dict(
+        os.environ, BOT_TOKEN=BENCH_BOT_TOKEN, DB_ENGINE=engine, DB_PATH=db_path, DB_SHARDS="1",
+        BROADCAST_DB_PATH=os.path.join(os.path.dirname(db_path), "broadcasts.db")
+    )
+    samples: Dict[str, List[float]] = {}
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT], cwd=ROOT, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout
+        for stage, ms in json.loads(out.strip().splitlines()[-1]).items():
+            samples.setdefault(stage, []).append(ms)
+    return {stage: round(statistics.median(values), 1) for stage, values in samples.items()}
+
+
+async def run_handler(game, stub: StubBot, scenario: str, players: int,
+                      requests: int, concurrency: int, seed: int) -> Dict:
+    """Прогнать requests вызовов обработчика от concurrency пользователей"""
+    rnd = random.Random(seed)
+    per_worker = max(1, requests // concurrency)
+
+    import handlers
+
+    def make_call(user_id: int):
+        if scenario == "web_app_tap":
+            data = json.dumps({"action": "tap"})
+            return handlers.handle_web_app_data(FakeMessage(stub, user_id, web_app_data=data), game)
+        if scenario == "web_app_get_state":
+            data = json.dumps({"action": "get_state"})
+            return handlers.handle_web_app_data(FakeMessage(stub, user_id, web_app_data=data), game)
+        if scenario == "top":
+            return handlers.top_handler(FakeCallbackQuery(stub, user_id, "top"), game)
+        return handlers.stats_handler(FakeCallbackQuery(stub, user_id, "stats"), game)
+
+    samples = []
+
+    async def worker():
+        for _ in range(per_worker):
+            t0 = time.perf_counter()
+            await make_call(rnd.randint(1, players))
+            samples.append(time.perf_counter() - t0)
+
+    def saved() -> Tuple[int, int]:
+        """Запросы к базе, склеенные с одновременными, и непосланные правки"""
+        edits = game.edits.stats()
+        return (sum(stats['shared'] for stats in game.db.coalescing_stats().values()),
+                edits['skipped'] + edits['debounced'])
+
+    errors_before = stub.errors
+    saved_before = saved()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(samples, time.perf_counter() - started)
+    result['errors'] = stub.errors - errors_before
+    result['queries_saved'], result['edits_saved'] = (
+        after - before for after, before in zip(saved(), saved_before)
+    )
+    return result
+
+
+async def bench_handlers(game, players: int, requests: int, concurrency: int,
+                         latency: float, seed: int) -> Dict:
+    """Замеры обработчиков бота"""
+    stub = StubBot(latency)
+    game.taps.start()
+    try:
+        return {
+            scenario: await run_handler(game, stub, scenario, players, requests, concurrency, seed)
+            for scenario in ("web_app_tap", "web_app_get_state", "top", "stats")
+        }
+    finally:
+        await game.edits.close()
+        await game.taps.stop()
+        await game.db.close()
+
+
+def compare(base_path: str, new_path: str):
+    """Напечатать изменение ops/s и p99 между двумя прогонами"""
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    def rows(result: Dict) -> Dict[str, Dict]:
+        flat = {}
+        for players, ops in result.get('storage', {}).items():
+            for op, summary in ops.items():
+                if isinstance(summary, dict):
+                    flat[f"storage/{players}/{op}"] = summary
+        for scenario, summary in result.get('handlers', {}).items():
+            flat[f"handlers/{scenario}"] = summary
+        return flat
+
+    for stage, ms in base.get('startup', {}).items():
+        if stage in new.get('startup', {}):
+            cur = new['startup'][stage]
+            change = (cur / ms - 1) * 100 if ms else 0.0
+            print(f"{'startup/' + stage:<45} {cur:>10.1f} мс {change:>+6.1f}%")
+
+    old_rows, new_rows = rows(base), rows(new)
+    print(f"{'замер':<45} {'ops/s':>18} {'p99, мкс':>22}")
+    for key in old_rows:
+        if key not in new_rows:
+            continue
+        old, cur = old_rows[key], new_rows[key]
+        ops_change = (cur['ops_per_sec'] / old['ops_per_sec'] - 1) * 100 if old['ops_per_sec'] else 0.0
+        p99_change = (cur['p99_us'] / old['p99_us'] - 1) * 100 if old['p99_us'] else 0.0
+        print(f"{key:<45} {cur['ops_per_sec']:>10.0f} {ops_change:>+6.1f}% "
+              f"{cur['p99_us']:>13.1f} {p99_change:>+6.1f}%")
+
+
+def print_summary(name: str, summary: Dict):
+    """Строка отчёта для человека"""
+    line = (f"  {name:<22} {summary['ops_per_sec']:>10.0f} оп/с  p50 {summary['p50_us']:>9.1f}  "
+            f"p95 {summary['p95_us']:>9.1f}  p99 {summary['p99_us']:>9.1f}  max {summary['max_us']:>10.1f} мкс")
+    if summary.get('errors'):
+        line += f"  ошибок: {summary['errors']}"
+    if summary.get('queries_saved') or summary.get('edits_saved'):
+        line += f"  сэкономлено запросов к базе: {summary['queries_saved']}, правок: {summary['edits_saved']}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[10000, 100000],
+                        help="размеры базы для замеров хранилища (например 10000 100000 1000000)")
+    parser.add_argument("--engine", choices=("sqlite", "memory"), default="sqlite")
+    parser.add_argument("--ops", type=int, default=10000, help="вызовов на операцию хранилища")
+    parser.add_argument("--handler-players", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=5000, help="вызовов на сценарий обработчика")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа StubBot, секунд")
+    parser.add_argument("--rate-limit", action="store_true", help="не отключать лимит тапов")
+    parser.add_argument("--skip-storage", action="store_true")
+    parser.add_argument("--skip-handlers", action="store_true")
+    parser.add_argument("--startup-runs", type=int, default=5, help="запусков для замера старта (0 - не мерить)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    parser.add_argument("--dir", default=None, help="каталог для файлов базы (по умолчанию временный)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="сравнить два JSON и выйти")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = {
+        'meta': {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        },
+        'storage': {},
+        'handlers': {},
+        'startup': {}
+    }
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        if not args.skip_storage:
+            for players in args.players:
+                print(f"Хранилище {args.engine}, игроков: {players}")
+                result = bench_storage(args.engine, players, args.ops, workdir, args.seed)
+                results['storage'][str(players)] = result
+                print(f"  заполнение: {result['seed_seconds']} с")
+                for op, summary in result.items():
+                    if isinstance(summary, dict):
+                        print_summary(op, summary)
+
+        if not args.skip_handlers:
+            db_path = os.path.join(workdir, "handlers.db")
+            storage = create_storage(args.engine, db_path)
+            seed_storage(storage, args.handler_players, args.seed)
+            storage.close()
+
+            game = create_game(args.engine, db_path, args.rate_limit)
+            print(f"Обработчики, игроков: {args.handler_players}, одновременно: {args.concurrency}")
+            results['handlers'] = asyncio.run(bench_handlers(
+                game, args.handler_players, args.requests, args.concurrency, args.latency, args.seed
+            ))
+            for scenario, summary in results['handlers'].items():
+                print_summary(scenario, summary)
+
+        if args.startup_runs:
+            db_path = os.path.join(workdir, "startup.db")
+            storage = create_storage(args.engine, db_path)
+            seed_storage(storage, args.handler_players, args.seed)
+            storage.close()
+
+            print(f"Запуск, игроков: {args.handler_players}, прогонов: {args.startup_runs}")
+            results['startup'] = bench_startup(args.engine, db_path, args.startup_runs)
+            print("  " + ", ".join(f"{stage} {ms} мс" for stage, ms in results['startup'].items()))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты записаны в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
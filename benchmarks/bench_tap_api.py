@@ -0,0 +1,96 @@
+"""Пропускная способность HTTP API тапов: по запросу на тап против пачек
+
+Поднимает TapApi на локальном порту с временной базой и гоняет через него
+клиентов, каждый из которых отправляет --taps тапов: в режиме per-tap по
+одному тапу на запрос (как было с sendData), в режиме batch - пачками по
+--batch тапов (как делает WebApp раз в ~300 мс). Старый путь через sendData
+вдобавок тратит два запроса к Telegram Bot API на каждый тап - здесь они не
+учитываются, так что выигрыш пачек на практике ещё больше.
+
+    python benchmarks/bench_tap_api.py --clients 50 --taps 200 --batch 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregator import TapAggregator  # noqa: E402
+from api import TapApi, sign_init_data  # noqa: E402
+from database import AsyncTapDatabase, TapDatabase  # noqa: E402
+
+BOT_TOKEN = "123456:bench"
+
+
+async def client(session: ClientSession, url: str, user_id: int, taps: int, batch: int):
+    """Один игрок: отправить taps тапов пачками по batch"""
+    seq = 0
+    sent = 0
+    init_data = sign_init_data(user_id, BOT_TOKEN)
+    while sent < taps:
+        seq += 1
+        count = min(batch, taps - sent)
+        async with session.post(url, json={"init_data": init_data, "taps": count, "client_seq": seq}) as resp:
+            data = await resp.json()
+            assert data["success"], data
+        sent += count
+
+
+async def run(mode: str, clients: int, taps: int, batch: int, port: int, workdir: str) -> dict:
+    """Прогнать один режим и вернуть результат"""
+    db = AsyncTapDatabase(TapDatabase(os.path.join(workdir, f"{mode}.db")))
+    aggregator = TapAggregator(db)
+    aggregator.start()
+    runner = web.AppRunner(TapApi(db, aggregator, BOT_TOKEN).create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    url = f"http://127.0.0.1:{port}/api/taps"
+    size = 1 if mode == "per-tap" else batch
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        await asyncio.gather(*(
+            client(session, url, user_id, taps, size) for user_id in range(1, clients + 1)
+        ))
+    elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    await aggregator.stop()
+    stats = await db.get_global_stats()
+    await db.close()
+
+    total = clients * taps
+    assert stats['total_taps'] == total, (stats, total)
+    return {
+        'mode': mode,
+        'taps': total,
+        'requests': clients * -(-taps // size),
+        'seconds': elapsed,
+        'taps_per_sec': total / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--taps", type=int, default=200, help="тапов на клиента")
+    parser.add_argument("--batch", type=int, default=20, help="тапов в пачке")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ("per-tap", "batch"):
+            result = asyncio.run(run(mode, args.clients, args.taps, args.batch, args.port, workdir))
+            print(
+                f"{result['mode']:>7}: {result['taps']} тапов, {result['requests']} запросов "
+                f"за {result['seconds']:.2f} с - {result['taps_per_sec']:.0f} тапов/с"
+            )
+
+
+if __name__ == "__main__":
+    main()
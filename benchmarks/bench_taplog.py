@@ -0,0 +1,137 @@
+"""Журнал событий тапов: цена записи на горячем пути и скорость выгрузки
+
+TapAggregator.add_tap вызывается --taps раз для --players активных игроков
+без журнала и с журналом (TapEventLog во временном каталоге) - дважды:
+только накопление в памяти (сброс в базу не наступает) и с обычными
+сбросами каждые --flush-threshold тапов. Отдельно меряются сама запись
+события, чтение сегментов через mmap и почасовая сводка export_taps.py.
+
+    python benchmarks/bench_taplog.py --players 10000 --taps 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregator import TapAggregator  # noqa: E402
+from database import AsyncTapDatabase  # noqa: E402
+from storage import create_storage  # noqa: E402
+from taplog import TapEventLog, hourly_summaries, read_events, segment_paths  # noqa: E402
+
+SEED_CHUNK = 50000
+
+
+async def bench_add_tap(db: AsyncTapDatabase, players: int, taps: int, max_pending: int,
+                        event_log: Optional[TapEventLog], seed: int) -> float:
+    """Наносекунд на вызов add_tap"""
+    rnd = random.Random(seed)
+    user_ids = [rnd.randint(1, players) for _ in range(taps)]
+    aggregator = TapAggregator(db, max_pending=max_pending, event_log=event_log)
+    # Прогрев: игроки уже в памяти накопителя, как у активных
+    for user_id in range(1, players + 1):
+        await aggregator.add_tap(user_id)
+    started = time.perf_counter()
+    for user_id in user_ids:
+        await aggregator.add_tap(user_id)
+    elapsed = time.perf_counter() - started
+    await aggregator.stop()
+    return round(elapsed / taps * 1e9)
+
+
+def bench(args, workdir: str) -> Dict:
+    """Все замеры на одной базе"""
+    storage = create_storage("sqlite", os.path.join(workdir, "bench.db"))
+    chunk = []
+    for user_id in range(1, args.players + 1):
+        chunk.append((user_id, f"user{user_id}", None, 0, 0, None, None))
+        if len(chunk) == SEED_CHUNK:
+            storage.import_players(chunk)
+            chunk = []
+    if chunk:
+        storage.import_players(chunk)
+
+    result = {"add_tap_ns": {}}
+
+    async def hot_path():
+        db = AsyncTapDatabase(storage)
+        for name, max_pending in (("в памяти", 10 ** 12), ("со сбросами", args.flush_threshold)):
+            row = result["add_tap_ns"][name] = {}
+            row["без журнала"] = await bench_add_tap(db, args.players, args.taps, max_pending, None, args.seed)
+            log = TapEventLog(os.path.join(workdir, f"hot{max_pending}"))
+            row["с журналом"] = await bench_add_tap(db, args.players, args.taps, max_pending, log, args.seed)
+            log.close()
+            row["накладные, %"] = round((row["с журналом"] / row["без журнала"] - 1) * 100, 1)
+        await db.close()
+
+    asyncio.run(hot_path())
+
+    # Запись событий подряд: сутки активности --players игроков
+    log_path = os.path.join(workdir, "events")
+    log = TapEventLog(log_path, segment_bytes=args.segment_mb * 1024 * 1024)
+    rnd = random.Random(args.seed)
+    start = time.time() - 86400
+    events = args.events
+    started = time.perf_counter()
+    for i in range(events):
+        log.append(rnd.randint(1, args.players), rnd.randint(1, 30), start + i * 86400 / events)
+    log.close()
+    elapsed = time.perf_counter() - started
+    size = sum(os.path.getsize(path) for path in segment_paths(log_path))
+    result["append"] = {
+        "events": events,
+        "segments": len(segment_paths(log_path)),
+        "bytes_per_event": round(size / events, 1),
+        # Включая генерацию случайных событий
+        "ns_per_event": round(elapsed / events * 1e9)
+    }
+
+    started = time.perf_counter()
+    read = sum(1 for _ in read_events(log_path))
+    elapsed = time.perf_counter() - started
+    result["read"] = {"events_per_sec": round(read / elapsed), "mb_per_sec": round(size / elapsed / 2 ** 20, 1)}
+
+    started = time.perf_counter()
+    rows = sum(1 for _ in hourly_summaries(read_events(log_path)))
+    elapsed = time.perf_counter() - started
+    result["hourly_export"] = {"rows": rows, "events_per_sec": round(events / elapsed)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--taps", type=int, default=200000, help="вызовов add_tap на замер")
+    parser.add_argument("--flush-threshold", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=2000000, help="событий для замеров записи и чтения")
+    parser.add_argument("--segment-mb", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        result = bench(args, workdir)
+
+    for name, row in result["add_tap_ns"].items():
+        print(f"add_tap {name}: без журнала {row['без журнала']} нс, с журналом {row['с журналом']} нс "
+              f"({row['накладные, %']:+.1f}%)")
+    append = result["append"]
+    print(f"запись: {append['events']} событий, {append['bytes_per_event']} байт на событие, "
+          f"{append['ns_per_event']} нс на событие, сегментов {append['segments']}")
+    print(f"чтение через mmap: {result['read']['events_per_sec']} событий/с ({result['read']['mb_per_sec']} МБ/с)")
+    print(f"почасовая сводка: {result['hourly_export']['events_per_sec']} событий/с, "
+          f"строк {result['hourly_export']['rows']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
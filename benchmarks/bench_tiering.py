@@ -0,0 +1,159 @@
+"""Холодный слой: цена горячих операций до и после переноса неактивных игроков
+
+Строится база из --players игроков, из которых --active-share активны
+(последняя активность - сейчас), остальные давно не заходили. До и после
+archive_inactive меряются начисление тапов активным (add_taps_bulk), чтение
+игрока, ранг, топ, зачисление дохода и запуск - с таблицей лидеров в памяти
+и без неё (рейтинг SQL-запросами). Отдельно - цена возврата холодного игрока
+и проверка, что топ, ранги и общая статистика после переноса не изменились.
+
+    python benchmarks/bench_tiering.py --players 500000 --active-share 0.05
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import TapDatabase, format_timestamp  # noqa: E402
+
+SEED_CHUNK = 50000
+
+
+def seed(path: str, args) -> List[int]:
+    """Заполнить базу; вернуть user_id активных игроков"""
+    rnd = random.Random(args.seed)
+    db = TapDatabase(path, in_memory_ranking=False)
+    now = format_timestamp(time.time())
+    dormant = format_timestamp(time.time() - 365 * 86400)
+    active, chunk = [], []
+    for user_id in range(1, args.players + 1):
+        is_active = rnd.random() < args.active_share
+        if is_active:
+            active.append(user_id)
+        name = f"player{user_id}" if rnd.random() < 0.3 else None
+        chunk.append((user_id, f"user{user_id}", name, rnd.randint(0, 10 ** 6), rnd.randint(0, 10 ** 5),
+                      dormant, now if is_active else dormant))
+        if len(chunk) == SEED_CHUNK:
+            db.import_players(chunk)
+            chunk = []
+    if chunk:
+        db.import_players(chunk)
+    db.reconcile_global_stats()
+    db.close()
+    return active
+
+
+def per_call_us(func: Callable, calls: int) -> float:
+    """Микросекунд на вызов"""
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return round((time.perf_counter() - started) / calls * 1e6, 1)
+
+
+def measure(path: str, in_memory: bool, active: List[int], args) -> Dict:
+    """Замеры горячих операций на одной базе"""
+    rnd = random.Random(args.seed)
+    started = time.perf_counter()
+    db = TapDatabase(path, in_memory_ranking=in_memory, player_cache_size=1, top_cache_ttl=0)
+    result = {"startup_s": round(time.perf_counter() - started, 2)}
+    batches = [[(rnd.choice(active), rnd.randint(1, 30)) for _ in range(args.batch)] for _ in range(args.batches)]
+    result["add_taps_bulk_ms"] = round(per_call_us(lambda i: db.add_taps_bulk(batches[i]), args.batches) / 1000, 2)
+    result["get_player_us"] = per_call_us(lambda i: db.get_player(active[i % len(active)]), args.reads)
+    result["get_player_rank_us"] = per_call_us(lambda i: db.get_player_rank(active[i % len(active)]), args.reads)
+    result["top_us"] = per_call_us(lambda i: db.get_top_players(10), args.reads)
+    result["settle_income_ms"] = round(per_call_us(lambda i: db.settle_income(), 5) / 1000, 2)
+    db.close()
+    return result
+
+
+def snapshot(path: str, in_memory: bool, sample: List[int]) -> Dict:
+    """Топ, ранги выборки игроков и общая статистика - для сверки до и после переноса"""
+    db = TapDatabase(path, in_memory_ranking=in_memory, top_cache_ttl=0)
+    result = {
+        "top": db.get_top_players(100),
+        "ranks": [db.get_player_rank(user_id) for user_id in sample],
+        "stats": db.get_global_stats()
+    }
+    db.close()
+    return result
+
+
+def bench(args, workdir: str) -> Dict:
+    """Все замеры: до переноса, после переноса и возврат холодных"""
+    path = os.path.join(workdir, "bench.db")
+    active = seed(path, args)
+    # Ранги - активных: чтение ранга возвращает холодного игрока в players
+    sample = random.Random(args.seed).sample(active, min(200, len(active)))
+    result = {"players": args.players, "active": len(active), "before": {}, "after": {}}
+
+    # Снимок базы до переноса: замеры меняют монеты
+    pristine = os.path.join(workdir, "pristine.db")
+    shutil.copyfile(path, pristine)
+    expected = {mode: snapshot(pristine, mode == "memory", sample) for mode in ("memory", "sql")}
+    for mode in ("memory", "sql"):
+        shutil.copyfile(pristine, path)
+        result["before"][mode] = measure(path, mode == "memory", active, args)
+
+    shutil.copyfile(pristine, path)
+    db = TapDatabase(path, in_memory_ranking=False)
+    started = time.perf_counter()
+    result["archive"] = dict(db.archive_inactive(args.inactive_days), seconds=round(time.perf_counter() - started, 2))
+    db.close()
+    archived = os.path.join(workdir, "archived.db")
+    shutil.copyfile(path, archived)
+
+    result["unchanged"] = all(snapshot(archived, mode == "memory", sample) == expected[mode] for mode in ("memory", "sql"))
+    for mode in ("memory", "sql"):
+        shutil.copyfile(archived, path)
+        result["after"][mode] = measure(path, mode == "memory", active, args)
+
+    # Возврат давно не заходивших: первое чтение переносит строку обратно
+    shutil.copyfile(archived, path)
+    db = TapDatabase(path, in_memory_ranking=False, player_cache_size=1)
+    active_set = set(active)
+    dormant = [user_id for user_id in range(1, args.players + 1) if user_id not in active_set]
+    returning = random.Random(args.seed).sample(dormant, min(args.reads, len(dormant)))
+    result["rehydrate_us"] = per_call_us(lambda i: db.get_player(returning[i]), len(returning))
+    db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=200000)
+    parser.add_argument("--active-share", type=float, default=0.05, help="доля активных игроков")
+    parser.add_argument("--inactive-days", type=float, default=30)
+    parser.add_argument("--batch", type=int, default=1000, help="начислений в пачке add_taps_bulk")
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=2000, help="вызовов на замер чтения")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        result = bench(args, workdir)
+
+    print(f"игроков {result['players']}, активных {result['active']}, "
+          f"перенесено {result['archive']['archived']} за {result['archive']['seconds']} с")
+    for mode in ("memory", "sql"):
+        print(f"рейтинг {'в памяти' if mode == 'memory' else 'SQL-запросами'}:")
+        for name, before in result["before"][mode].items():
+            print(f"  {name}: {before} -> {result['after'][mode][name]}")
+    print(f"возврат холодного игрока: {result['rehydrate_us']} мкс")
+    print(f"топ, ранги и статистика после переноса {'совпадают' if result['unchanged'] else 'РАЗОШЛИСЬ'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Пропускная способность HTTP API в зависимости от числа воркеров supervisor.py
+
+Для каждого числа воркеров поднимает supervisor.py с временной базой (без
+установки вебхука) и гоняет смешанную нагрузку из --clients процессов:
+~70% POST /api/taps, остальное поровну /api/state и /api/top. После
+остановки проверяет, что в базе ровно столько тапов, сколько API засчитал.
+На машине с одним ядром выигрыша от воркеров не будет - смотрите на число
+ядер в выводе.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --clients 4 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import TapDatabase  # noqa: E402
+
+
+async def load(base_url: str, duration: float, concurrency: int, users: int, seed: int) -> dict:
+    """Нагрузка одного клиентского процесса; вернуть счётчики"""
+    rnd = random.Random(seed)
+    # Каждый процесс берёт свой диапазон игроков, чтобы client_seq не пересекались
+    first_user = seed * users + 1
+    result = {"requests": 0, "errors": 0, "coins_added": 0}
+    deadline = time.monotonic() + duration
+    seqs = {}
+
+    async def worker(session: ClientSession):
+        while time.monotonic() < deadline:
+            user_id = rnd.randint(first_user, first_user + users - 1)
+            roll = rnd.random()
+            try:
+                if roll < 0.7:
+                    seqs[user_id] = seqs.get(user_id, 0) + 1
+                    payload = {"user_id": user_id, "taps": rnd.randint(1, 20), "client_seq": seqs[user_id]}
+                    async with session.post(f"{base_url}/api/taps", json=payload) as resp:
+                        data = await resp.json()
+                        result["coins_added"] += data.get("coins_added", 0)
+                elif roll < 0.85:
+                    async with session.get(f"{base_url}/api/state", params={"user_id": user_id}) as resp:
+                        data = await resp.json()
+                else:
+                    async with session.get(f"{base_url}/api/top", params={"limit": 10}) as resp:
+                        data = await resp.json()
+                if not data.get("success"):
+                    result["errors"] += 1
+            except (ClientError, asyncio.TimeoutError, ValueError):
+                result["errors"] += 1
+            result["requests"] += 1
+
+    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return result
+
+
+def client_process(args: tuple) -> dict:
+    """Точка входа клиентского процесса"""
+    return asyncio.run(load(*args))
+
+
+async def wait_ready(base_url: str, timeout: float = 60.0):
+    """Дождаться, пока API ответит"""
+    deadline = time.monotonic() + timeout
+    async with ClientSession(timeout=ClientTimeout(total=2)) as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base_url}/api/top") as resp:
+                    if resp.status == 200:
+                        return
+            except (ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"API на {base_url} не поднялся за {timeout} с")
+
+
+def run(workers: int, args, workdir: str) -> dict:
+    """Поднять супервизор с workers воркерами, нагрузить и проверить базу"""
+    db_path = os.path.join(workdir, f"workers{workers}.db")
+    env = dict(
+        os.environ,
+        # Вебхук не ставится, к Bot API никто не обращается - токену достаточно формы
+        BOT_TOKEN=os.environ.get("BOT_TOKEN", "123456:bench"),
+        DB_ENGINE="sqlite",
+        DB_PATH=db_path,
+        DB_SHARDS=str(args.shards),
+        WEBHOOK_BASE_URL="",
+        WEBHOOK_HOST="127.0.0.1",
+        API_PUBLIC_URL=f"http://127.0.0.1:{args.port}",
+        METRICS_DUMP_INTERVAL="0"
+    )
+    supervisor = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "supervisor.py"), "--workers", str(workers), "--port", str(args.port)],
+        env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(wait_ready(base_url))
+        # Все воркеры должны успеть занять порт
+        time.sleep(1.0 + 0.5 * workers)
+        jobs = [
+            (base_url, args.duration, args.concurrency, args.users, seed)
+            for seed in range(args.clients)
+        ]
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(client_process, jobs)
+        elapsed = time.perf_counter() - started
+    finally:
+        supervisor.send_signal(signal.SIGTERM)
+        supervisor.wait(120)
+
+    requests = sum(r["requests"] for r in results)
+    coins_added = sum(r["coins_added"] for r in results)
+    db = TapDatabase(db_path, shards=args.shards)
+    stored = db.reconcile_global_stats()['total_taps']
+    db.close()
+    return {
+        "workers": workers,
+        "requests": requests,
+        "errors": sum(r["errors"] for r in results),
+        "rps": requests / elapsed,
+        "coins_added": coins_added,
+        "stored_taps": stored,
+        "lost_taps": coins_added - stored
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="клиентских процессов")
+    parser.add_argument("--concurrency", type=int, default=32, help="одновременных запросов на клиент")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд нагрузки")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--port", type=int, default=18443)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    print(f"Ядер: {os.cpu_count()}, клиентов: {args.clients} x {args.concurrency}, {args.duration} с")
+    print(f"{'воркеров':>9} {'запросов':>10} {'запр/с':>10} {'ошибок':>8} {'тапов':>10} {'потеряно':>9}")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for workers in args.workers:
+            result = run(workers, args, workdir)
+            results.append(result)
+            print(f"{result['workers']:>9} {result['requests']:>10} {result['rps']:>10.0f} "
+                  f"{result['errors']:>8} {result['stored_taps']:>10} {result['lost_taps']:>9}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cpu_count": os.cpu_count(), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
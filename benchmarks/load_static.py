@@ -0,0 +1,82 @@
+"""Нагрузочный тест статического сервера WebApp
+
+Запускает --concurrency потоков с keep-alive соединениями, которые в течение
+--duration секунд запрашивают страницу, и печатает запросы в секунду.
+Сервер нужно запустить заранее: python start_server.py
+
+    python benchmarks/load_static.py --url http://localhost:8000/webapp.html
+    python benchmarks/load_static.py --gzip --revalidate
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def worker(url, duration: float, headers: dict, counts: list, errors: list):
+    """Поток: запросы по одному соединению до истечения времени"""
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    path = url.path or '/'
+    done = 0
+    transferred = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+            if response.status not in (200, 304):
+                errors.append(response.status)
+                continue
+            done += 1
+            transferred += len(body)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    conn.close()
+    counts.append((done, transferred))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000/webapp.html')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--gzip', action='store_true', help='Accept-Encoding: gzip, br')
+    parser.add_argument('--revalidate', action='store_true', help='слать If-None-Match (повторные открытия)')
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    headers = {}
+    if args.gzip:
+        headers['Accept-Encoding'] = 'gzip, br'
+    if args.revalidate:
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+        conn.request('HEAD', url.path or '/')
+        headers['If-None-Match'] = conn.getresponse().getheader('ETag', '')
+        conn.close()
+
+    counts, errors = [], []
+    threads = [
+        threading.Thread(target=worker, args=(url, args.duration, headers, counts, errors))
+        for _ in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    requests = sum(done for done, _ in counts)
+    transferred = sum(size for _, size in counts)
+    print(
+        f"{requests} запросов за {elapsed:.1f} с: {requests / elapsed:.0f} запросов/с, "
+        f"{transferred / elapsed / 1024 / 1024:.1f} МБ/с тела, ошибок: {len(errors)}"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+)
+
+from database import AsyncTapDatabase, ConnectionPool
+from metrics import REGISTRY
+from migrations import apply_migrations
+from ratelimit import TokenBucketLimiter
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота и 1 в секунду в один чат
+GLOBAL_RATE = 25.0  # сообщений в секунду
+PER_CHAT_RATE = 1.0  # сообщений в секунду
+# Исходы отправки одному игроку
+RESULTS = ('sent', 'blocked', 'failed')
+
+BROADCAST_MESSAGES = REGISTRY.counter(
+    "broadcast_messages_total", "Сообщения рассылок по исходу", ("result",)
+)
+BROADCAST_RETRY_AFTER = REGISTRY.counter(
+    "broadcast_retry_after_total", "Ответы Telegram с retry_after во время рассылок"
+)
+
+SQL_CREATE_BROADCASTS = '''
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        parse_mode TEXT,
+        status TEXT NOT NULL DEFAULT 'running',
+        last_user_id INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        blocked INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+'''
+BROADCAST_COLUMNS = 'id, text, parse_mode, status, last_user_id, sent, blocked, failed, created_at, updated_at, finished_at'
+SQL_CREATE_BROADCAST = 'INSERT INTO broadcasts (text, parse_mode) VALUES (?, ?)'
+SQL_GET_BROADCAST = f'SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE id = ?'
+SQL_RUNNING_BROADCASTS = f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE status = 'running' ORDER BY id"
+SQL_RECENT_BROADCASTS = f'SELECT {BROADCAST_COLUMNS} FROM broadcasts ORDER BY id DESC LIMIT ?'
+SQL_CHECKPOINT = '''
+    UPDATE broadcasts SET last_user_id = ?, sent = ?, blocked = ?, failed = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+SQL_FINISH = '''
+    UPDATE broadcasts SET status = ?, updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND status = 'running'
+'''
+
+BROADCAST_MIGRATIONS = [
+    (1, "таблица рассылок", lambda conn, path: conn.execute(SQL_CREATE_BROADCASTS)),
+]
+
+
+class BroadcastStore:
+    """Рассылки и их прогресс: таблица broadcasts в отдельном файле SQLite
+
+    Отдельный файл - чтобы рассылки работали с любым хранилищем игроков
+    (memory, remote) и не занимали писателей шардов.
+    """
+
+    def __init__(self, path: str = "tap_game.broadcasts.db"):
+        self.path = path
+        self.pool = ConnectionPool(path, size=2)
+        with self.pool.transaction() as conn:
+            apply_migrations(conn, path, BROADCAST_MIGRATIONS)
+
+    def close(self):
+        """Закрыть соединения"""
+        self.pool.close()
+
+    def create(self, text: str, parse_mode: Optional[str] = None) -> Dict:
+        """Завести рассылку; она сразу считается запущенной"""
+        with self.pool.transaction() as conn:
+            broadcast_id = conn.execute(SQL_CREATE_BROADCAST, (text, parse_mode)).lastrowid
+            return dict(conn.execute(SQL_GET_BROADCAST, (broadcast_id,)).fetchone())
+
+    def get(self, broadcast_id: int) -> Optional[Dict]:
+        """Рассылка по id или None"""
+        with self.pool.connection() as conn:
+            row = conn.execute(SQL_GET_BROADCAST, (broadcast_id,)).fetchone()
+        return dict(row) if row else None
+
+    def running(self) -> List[Dict]:
+        """Незавершённые рассылки - их продолжают после перезапуска"""
+        with self.pool.connection() as conn:
+            return [dict(row) for row in conn.execute(SQL_RUNNING_BROADCASTS)]
+
+    def recent(self, limit: int = 5) -> List[Dict]:
+        """Последние рассылки, новые первыми"""
+        with self.pool.connection() as conn:
+            return [dict(row) for row in conn.execute(SQL_RECENT_BROADCASTS, (limit,))]
+
+    def checkpoint(self, broadcast_id: int, last_user_id: int, counts: Dict[str, int]):
+        """Запомнить, что игроки до last_user_id включительно обработаны"""
+        with self.pool.transaction() as conn:
+            conn.execute(SQL_CHECKPOINT, (
+                last_user_id, counts['sent'], counts['blocked'], counts['failed'], broadcast_id
+            ))
+
+    def finish(self, broadcast_id: int, status: str = 'done') -> bool:
+        """Завершить рассылку (done или cancelled); False - если она уже не идёт"""
+        with self.pool.transaction() as conn:
+            return conn.execute(SQL_FINISH, (status, broadcast_id)).rowcount > 0
+
+
+class Broadcaster:
+    """Рассылка сообщения всем игрокам с учётом лимитов Telegram
+
+    Игроки читаются страницами по user_id (list_user_ids), страница
+    отправляется concurrency корутинами под общим лимитом и лимитом на чат,
+    после неё прогресс записывается в BroadcastStore. Следующая страница
+    читается, пока отправляется текущая. После перезапуска рассылка
+    продолжается с последней записанной страницы: игроки недописанной
+    страницы могут получить сообщение повторно (не больше chunk_size).
+    """
+
+    def __init__(self, bot, db: AsyncTapDatabase, store: BroadcastStore, rate: float = GLOBAL_RATE,
+                 per_chat_rate: float = PER_CHAT_RATE, concurrency: int = 16, chunk_size: int = 1000,
+                 max_attempts: int = 5):
+        self.bot = bot
+        self.db = db
+        self.store = store
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        # Без запаса: Telegram считает лимит по коротким окнам и наказывает всплески
+        self.global_limiter = TokenBucketLimiter(rate=rate, burst=1)
+        self.chat_limiter = TokenBucketLimiter(rate=per_chat_rate, burst=1)
+        # До этого момента (loop.time()) отправка приостановлена по retry_after
+        self._paused_until = 0.0
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def start(self, text: str, parse_mode: Optional[str] = None) -> Dict:
+        """Завести рассылку и запустить её в фоне"""
+        job = await asyncio.to_thread(self.store.create, text, parse_mode)
+        self._spawn(job['id'])
+        logger.info(f"Рассылка #{job['id']} запущена")
+        return job
+
+    async def resume(self) -> int:
+        """Продолжить рассылки, прерванные остановкой; вернуть их число"""
+        jobs = await asyncio.to_thread(self.store.running)
+        for job in jobs:
+            if job['id'] not in self._tasks:
+                logger.info(f"Рассылка #{job['id']} продолжается после игрока {job['last_user_id']}")
+                self._spawn(job['id'])
+        return len(jobs)
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Отменить рассылку; уже отправленное не отзывается"""
+        task = self._tasks.pop(broadcast_id, None)
+        if task is not None:
+            task.cancel()
+        return await asyncio.to_thread(self.store.finish, broadcast_id, 'cancelled')
+
+    async def stop(self):
+        """Остановить фоновые рассылки; они продолжатся при следующем запуске"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, broadcast_id: int):
+        """Фоновая задача рассылки"""
+        task = asyncio.create_task(self.run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda done: self._finished(broadcast_id, done))
+
+    def _finished(self, broadcast_id: int, task: asyncio.Task):
+        """Убрать завершившуюся задачу и записать её ошибку"""
+        if self._tasks.get(broadcast_id) is task:
+            del self._tasks[broadcast_id]
+        if not task.cancelled() and task.exception() is not None:
+            # Статус остаётся running: рассылка продолжится при следующем запуске
+            logger.error(f"Рассылка #{broadcast_id} прервана ошибкой: {task.exception()}")
+
+    async def run(self, broadcast_id: int) -> Dict[str, int]:
+        """Отправить рассылку всем игрокам после её контрольной точки"""
+        job = await asyncio.to_thread(self.store.get, broadcast_id)
+        counts = {result: job[result] for result in RESULTS}
+        started = time.perf_counter()
+        done_before = sum(counts.values())
+
+        page = await self.db.list_user_ids(job['last_user_id'], self.chunk_size)
+        while page:
+            # Следующая страница читается, пока отправляется текущая
+            next_page = asyncio.ensure_future(self.db.list_user_ids(page[-1], self.chunk_size))
+            try:
+                for result in await self._send_page(job, page):
+                    counts[result] += 1
+            except BaseException:
+                next_page.cancel()
+                raise
+            await asyncio.to_thread(self.store.checkpoint, broadcast_id, page[-1], counts)
+            # Бакеты уже обработанных чатов больше не нужны
+            self.chat_limiter.evict_idle()
+            page = await next_page
+
+        await asyncio.to_thread(self.store.finish, broadcast_id, 'done')
+        elapsed = time.perf_counter() - started
+        processed = sum(counts.values()) - done_before
+        logger.info(
+            f"Рассылка #{broadcast_id} завершена: {counts}, {processed} сообщений за {elapsed:.1f} с"
+        )
+        return counts
+
+    async def _send_page(self, job: Dict, page: List[int]) -> List[str]:
+        """Отправить сообщение игрокам страницы; вернуть исходы"""
+        results = []
+        chat_ids = iter(page)
+
+        async def worker():
+            # Общий итератор: следующий чат берёт освободившаяся корутина
+            for chat_id in chat_ids:
+                result = await self._send(job, chat_id)
+                BROADCAST_MESSAGES.inc(result)
+                results.append(result)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(page)))))
+        return results
+
+    async def _acquire(self, limiter: TokenBucketLimiter, key):
+        """Дождаться токена лимита"""
+        while not limiter.consume(key):
+            await asyncio.sleep(limiter.delay(key))
+
+    async def _send(self, job: Dict, chat_id: int) -> str:
+        """Отправить сообщение одному игроку с повторами; вернуть исход"""
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, self.max_attempts + 1):
+            pause = self._paused_until - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._acquire(self.global_limiter, None)
+            await self._acquire(self.chat_limiter, chat_id)
+            try:
+                await self.bot.send_message(chat_id, job['text'], parse_mode=job['parse_mode'])
+                return 'sent'
+            except TelegramRetryAfter as e:
+                # Флуд-контроль общий на бота: приостанавливаем всех отправителей
+                BROADCAST_RETRY_AFTER.inc()
+                self._paused_until = max(self._paused_until, loop.time() + e.retry_after)
+                logger.warning(f"Рассылка #{job['id']}: retry_after {e.retry_after} с")
+            except TelegramForbiddenError:
+                # Игрок заблокировал бота или удалил аккаунт
+                return 'blocked'
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.debug(f"Рассылка #{job['id']}, чат {chat_id}, попытка {attempt}: {e}")
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 30))
+            except TelegramAPIError as e:
+                logger.debug(f"Рассылка #{job['id']}, чат {chat_id}: {e}")
+                return 'failed'
+        return 'failed'
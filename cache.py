@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением по числу записей и необязательным TTL"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Незавершённые заполнения: ключ -> токен читателя
+        self._fills: Dict[Hashable, object] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение по ключу или default; просроченные записи удаляются"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Положить значение, вытеснив самые старые записи при переполнении"""
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def begin_fill(self, key: Hashable) -> object:
+        """Отметить начало чтения из базы; вернуть токен для complete_fill"""
+        token = object()
+        with self._lock:
+            self._fills[key] = token
+        return token
+
+    def complete_fill(self, key: Hashable, token: object, value: Any) -> bool:
+        """Сохранить прочитанное значение, если за время чтения ключ не инвалидировали"""
+        with self._lock:
+            if self._fills.get(key) is not token:
+                return False
+            del self._fills[key]
+            self._store(key, value)
+            return True
+
+    def cancel_fill(self, key: Hashable, token: object):
+        """Забыть незавершённое заполнение (значения нет или чтение упало)"""
+        with self._lock:
+            if self._fills.get(key) is token:
+                del self._fills[key]
+
+    def invalidate(self, key: Hashable):
+        """Удалить запись и отменить идущие заполнения этого ключа"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._fills.pop(key, None)
+
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._data.clear()
+            self._fills.clear()
+
+    def stats(self) -> Dict:
+        """Счётчики попаданий и промахов"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0
+            }
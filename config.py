@@ -0,0 +1,133 @@
+import logging
+import os
+from dataclasses import dataclass, fields
+from typing import Mapping, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+@dataclass
+class Config:
+    """Настройки бота; каждое поле можно задать переменной окружения
+    с тем же именем в верхнем регистре (BOT_TOKEN, DB_ENGINE, ...) или в .env"""
+
+    # Получите у @BotFather
+    bot_token: str = ""
+    # Для локального тестирования; для публикации: https://ваш-сайт.com/webapp.html
+    webapp_url: str = "http://localhost:8000/webapp.html"
+    # Хранилище игроков: sqlite (tap_game.db), memory (всё в памяти,
+    # журнал и снимки в tap_game.mem.*) или remote (процесс-писатель supervisor.py)
+    db_engine: str = "sqlite"
+    # Пустой путь - tap_game.db или tap_game.mem в зависимости от хранилища
+    db_path: str = ""
+    # Число файлов-шардов базы игроков (переход на шарды - migrate_shards.py)
+    db_shards: int = 1
+    # Тапы копятся в памяти и пишутся в базу раз в интервал или по порогу
+    tap_flush_interval: float = 1.0  # секунд
+    tap_flush_threshold: int = 1000  # тапов
+    # Лимит тапов на игрока: человек не тапает быстрее ~15 раз в секунду
+    tap_rate_limit: float = 20  # тапов в секунду
+    tap_rate_burst: float = 40  # тапов подряд
+    tap_limiter_evict_interval: float = 60  # секунд
+    # Сколько живёт отрисованный текст топа
+    top_render_ttl: float = 2.0  # секунд
+    # Правки сообщений в одном чате не чаще раза в интервал: промежуточные
+    # нажатия «Обновить» и листания склеиваются в одну правку (0 - без задержки)
+    edit_debounce_interval: float = 1.0  # секунд
+    # Сверка общей статистики с таблицей игроков (0 - не сверять)
+    stats_reconcile_interval: float = 3600  # секунд
+    # Пассивный доход копится лениво и досчитывается при чтении игрока; раз в
+    # интервал он зачисляется всем одним запросом, чтобы топ и ранги не отставали
+    # (0 - не зачислять)
+    income_settle_interval: float = 60  # секунд
+    # Журнал событий тапов (user_id, время, тапов) для аналитики: сегменты
+    # <TAP_LOG_PATH>.w<воркер>.<номер>.seg, выгрузка - export_taps.py (пусто - не писать)
+    tap_log_path: str = ""
+    tap_log_segment_mb: int = 64
+    # Свёртка часовых корзин тапов в суточные и удаление старых (0 - не сворачивать)
+    window_compact_interval: float = 3600  # секунд
+    # Перенос игроков без активности дольше COLD_TIER_AFTER_DAYS (и без дохода)
+    # в холодную таблицу; при возвращении игрок переносится обратно (0 - не переносить)
+    cold_tier_interval: float = 3600  # секунд
+    cold_tier_after_days: float = 30
+    # HTTP API для пачек тапов из WebApp (пустой API_PUBLIC_URL - только sendData).
+    # Слушает только localhost: наружу - через обратный прокси с HTTPS
+    api_host: str = "127.0.0.1"
+    api_port: int = 8080
+    api_public_url: str = "http://localhost:8080"
+    # Метрики: GET /metrics на порту API (или вебхука) с ?token= или Bearer;
+    # пустой токен - /metrics выключен, остаётся запись в файл
+    metrics_token: str = ""
+    # Как часто обновлять статистику кэшей хранилища для метрик: у remote это
+    # запрос к писателю, поэтому не на каждое чтение /metrics
+    cache_stats_interval: float = 15  # секунд
+    # Периодическая запись метрик в файл (textfile collector); 0 - не писать
+    metrics_dump_interval: float = 0  # секунд
+    metrics_dump_path: str = "tap_game.prom"
+    # Режим получения апдейтов: polling или webhook
+    bot_mode: str = "polling"
+    # Вебхук: Telegram шлёт апдейты на WEBHOOK_BASE_URL + WEBHOOK_PATH,
+    # мы слушаем WEBHOOK_HOST:WEBHOOK_PORT (за балансировщиком - несколько воркеров)
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_path: str = "/webhook"
+    webhook_base_url: str = ""
+    # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token каждого запроса
+    webhook_secret: str = ""
+    # Рассылки (/broadcast): user_id администраторов через запятую, файл с
+    # прогрессом рассылок, общий лимит сообщений и число одновременных отправок
+    admin_ids: str = ""
+    broadcast_db_path: str = "tap_game.broadcasts.db"
+    broadcast_rate: float = 25.0  # сообщений в секунду
+    broadcast_concurrency: int = 16
+    # Задаются supervisor.py для воркеров: номер воркера, общий порт,
+    # ключ IPC писателя и имя сегмента разделяемой памяти со снимком топа
+    worker_id: int = 0
+    webhook_reuse_port: bool = False
+    ipc_authkey: str = ""
+    snapshot_shm: str = ""
+
+    def __post_init__(self):
+        if not self.db_path:
+            self.db_path = "tap_game.mem" if self.db_engine == "memory" else "tap_game.db"
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Config":
+        """Настройки из переменных окружения; неизвестные переменные игнорируются"""
+        values = {}
+        for field in fields(cls):
+            raw = environ.get(field.name.upper())
+            if raw is None:
+                continue
+            try:
+                if field.type is bool:
+                    values[field.name] = raw.strip().lower() in TRUE_VALUES
+                else:
+                    values[field.name] = field.type(raw)
+            except ValueError:
+                raise ValueError(f"{field.name.upper()}={raw!r}: ожидается {field.type.__name__}") from None
+        return cls(**values)
+
+    def admin_user_ids(self) -> Set[int]:
+        """Администраторы из ADMIN_IDS"""
+        return {int(value) for value in self.admin_ids.replace(',', ' ').split()}
+
+    def storage_options(self) -> dict:
+        """Параметры create_storage для выбранного хранилища"""
+        if self.db_engine == "sqlite":
+            return {"shards": self.db_shards}
+        if self.db_engine == "remote":
+            return {"authkey": bytes.fromhex(self.ipc_authkey), "snapshot_name": self.snapshot_shm}
+        return {}
+
+
+def load_config(env_file: Optional[str] = None) -> Config:
+    """Прочитать .env (переменные окружения важнее) и собрать настройки"""
+    env_file = env_file or os.getenv("ENV_FILE", ".env")
+    if os.path.exists(env_file):
+        from dotenv import load_dotenv
+        load_dotenv(env_file, override=False)
+        logger.debug(f"Настройки дополнены из {env_file}")
+    return Config.from_env(os.environ)
@@ -0,0 +1,1132 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+import economy
+from cache import LRUCache
+from leaderboard import NO_RANK, Leaderboard
+from migrations import apply_migrations
+from names import NameIndex, normalize_name
+from singleflight import SingleFlight
+from storage import TapStorage
+from windows import WindowedLeaderboard, check_window, compaction_cutoffs, history_start, hour_start, window_start
+
+logger = logging.getLogger(__name__)
+
+# Настройки, применяемые к каждому соединению пула
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA foreign_keys=ON",
+)
+
+# SQL держим в константах: модуль sqlite3 кэширует подготовленные
+# выражения по тексту запроса, поэтому один и тот же текст переиспользуется
+# Имена, рейтинг и статистика при запуске учитывают и холодных игроков (players_cold)
+SQL_NAME_ROWS = '''
+    SELECT user_id, display_name FROM (
+        SELECT user_id, display_name, created_at FROM players WHERE name_key IS NOT NULL
+        UNION ALL
+        SELECT user_id, display_name, created_at FROM players_cold WHERE name_key IS NOT NULL
+    ) ORDER BY created_at, user_id
+'''
+SQL_READ_GLOBAL_STATS = 'SELECT total_players, total_coins, total_taps FROM global_stats WHERE id = 1'
+SQL_WRITE_GLOBAL_STATS = '''
+    UPDATE global_stats SET total_players = ?, total_coins = ?, total_taps = ? WHERE id = 1
+'''
+# Колонки строки игрока, которые отдаются наружу (name_key - служебная)
+PLAYER_COLUMNS = (
+    'user_id, username, display_name, coins, total_taps, created_at, last_active, '
+    'tap_power, income_per_hour, settled_at'
+)
+SQL_GET_PLAYER = f'SELECT {PLAYER_COLUMNS} FROM players WHERE user_id = ?'
+SQL_CREATE_PLAYER = '''
+    INSERT INTO players (user_id, username, coins, total_taps, created_at, last_active)
+    VALUES (?, ?, 0, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO NOTHING
+'''
+# Upsert вместо INSERT OR REPLACE: REPLACE удаляет строку и сбрасывает created_at
+SQL_SAVE_PLAYER = '''
+    INSERT INTO players
+    (user_id, username, display_name, name_key, coins, total_taps,
+     tap_power, income_per_hour, settled_at, last_active)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username = excluded.username,
+        display_name = excluded.display_name,
+        name_key = excluded.name_key,
+        coins = excluded.coins,
+        total_taps = excluded.total_taps,
+        tap_power = excluded.tap_power,
+        income_per_hour = excluded.income_per_hour,
+        settled_at = excluded.settled_at,
+        last_active = CURRENT_TIMESTAMP
+'''
+SQL_SET_USERNAME = 'UPDATE players SET username = ?, last_active = CURRENT_TIMESTAMP WHERE user_id = ?'
+# Пассивный доход, накопленный к :now (формулы economy.py): целые монеты
+# и сдвиг settled_at ровно на их время. В SET все выражения видят старую строку
+SQL_ACCRUED_INCOME = '''
+    CASE WHEN income_per_hour > 0
+    THEN CAST(MAX(:now - settled_at, 0) * income_per_hour / 3600 AS INTEGER) ELSE 0 END
+'''
+SQL_SETTLED_AT = f'''
+    CASE WHEN income_per_hour > 0
+    THEN settled_at + ({SQL_ACCRUED_INCOME}) * 3600.0 / income_per_hour ELSE settled_at END
+'''
+# Создание и начисление одним выражением: без гонки чтение-изменение-запись.
+# Тап приносит tap_power монет; накопленный доход зачисляется заодно
+SQL_ADD_TAPS = f'''
+    INSERT INTO players (user_id, username, coins, total_taps)
+    VALUES (:user_id, '', :taps, :taps)
+    ON CONFLICT(user_id) DO UPDATE SET
+        coins = coins + excluded.total_taps * tap_power + {SQL_ACCRUED_INCOME},
+        settled_at = {SQL_SETTLED_AT},
+        total_taps = total_taps + excluded.total_taps,
+        last_active = CURRENT_TIMESTAMP
+'''
+SQL_ADD_TAPS_RETURNING = SQL_ADD_TAPS + f'RETURNING {PLAYER_COLUMNS}'
+# Тапы в часовую корзину рейтингов за период - в той же транзакции
+# и с теми же параметрами, что и SQL_ADD_TAPS, плюс :hour
+SQL_ADD_HOUR_TAPS = '''
+    INSERT INTO tap_hours (hour, user_id, taps) VALUES (:hour, :user_id, :taps)
+    ON CONFLICT(hour, user_id) DO UPDATE SET taps = taps + excluded.taps
+'''
+# Монеты и тапы пачки игроков после записи - для таблицы лидеров
+SQL_PLAYER_SCORES = '''
+    SELECT user_id, coins, total_taps FROM players WHERE user_id IN (SELECT value FROM json_each(?))
+'''
+SQL_BUY_UPGRADE = '''
+    UPDATE players SET
+        coins = :coins, tap_power = :tap_power, income_per_hour = :income_per_hour,
+        settled_at = :settled_at, last_active = CURRENT_TIMESTAMP
+    WHERE user_id = :user_id
+'''
+# Массовое зачисление дохода: один проход по частичному индексу игроков
+# с доходом (idx_players_earning), простаивающие без дохода не читаются
+SQL_SETTLE_INCOME = f'''
+    UPDATE players SET coins = coins + {SQL_ACCRUED_INCOME}, settled_at = {SQL_SETTLED_AT}
+    WHERE income_per_hour > 0 AND settled_at <= :now - 3600.0 / income_per_hour
+    RETURNING user_id, coins, total_taps
+'''
+SQL_SET_NAME = '''
+    UPDATE players
+    SET display_name = ?, name_key = ?, last_active = CURRENT_TIMESTAMP
+    WHERE user_id = ?
+'''
+SQL_TOP_PLAYERS = '''
+    SELECT user_id, username, display_name, coins, total_taps
+    FROM players
+    WHERE display_name IS NOT NULL AND display_name != ''
+    ORDER BY coins DESC, user_id
+    LIMIT ?
+'''
+# Страницы топа по курсору (coins, user_id) вместо OFFSET: поиск по частичному
+# индексу idx_players_named_coins, цена страницы не растёт с её номером
+SQL_TOP_AFTER = '''
+    SELECT user_id, username, display_name, coins, total_taps
+    FROM players
+    WHERE display_name IS NOT NULL AND display_name != ''
+        AND coins <= :coins AND (coins < :coins OR user_id > :user_id)
+    ORDER BY coins DESC, user_id
+    LIMIT :limit
+'''
+SQL_TOP_BEFORE = '''
+    SELECT user_id, username, display_name, coins, total_taps
+    FROM players
+    WHERE display_name IS NOT NULL AND display_name != ''
+        AND coins >= :coins AND (coins > :coins OR user_id < :user_id)
+    ORDER BY coins, user_id DESC
+    LIMIT :limit
+'''
+# Место первой строки страницы: сколько игроков с именем стоят выше
+SQL_TOP_AHEAD = '''
+    SELECT COUNT(*) FROM players
+    WHERE display_name IS NOT NULL AND display_name != ''
+        AND coins >= :coins AND (coins > :coins OR user_id < :user_id)
+'''
+SQL_PLAYER_RANK = 'SELECT COUNT(*) + 1 FROM players WHERE coins > ?'
+SQL_LEADERBOARD_ROWS = '''
+    SELECT user_id, display_name, coins, total_taps FROM players
+    UNION ALL
+    SELECT user_id, display_name, coins, total_taps FROM players_cold
+'''
+SQL_IMPORT_PLAYER = '''
+    INSERT INTO players
+    (user_id, username, display_name, coins, total_taps, created_at, last_active,
+     tap_power, income_per_hour, settled_at, name_key)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_GLOBAL_STATS = 'SELECT COUNT(*), SUM(coins), SUM(total_taps) FROM players'
+SQL_GLOBAL_STATS_ALL = '''
+    SELECT COUNT(*), SUM(coins), SUM(total_taps) FROM (
+        SELECT coins, total_taps FROM players UNION ALL SELECT coins, total_taps FROM players_cold
+    )
+'''
+SQL_DISPLAY_NAMES = '''
+    SELECT user_id, display_name FROM players WHERE display_name IS NOT NULL AND display_name != ''
+    UNION ALL
+    SELECT user_id, display_name FROM players_cold WHERE display_name IS NOT NULL AND display_name != ''
+'''
+# Корзины тапов с начала :since (суточные и часовые не пересекаются)
+SQL_TAP_BUCKETS = '''
+    SELECT day, user_id, taps FROM tap_days WHERE day >= :since
+    UNION ALL
+    SELECT hour, user_id, taps FROM tap_hours WHERE hour >= :since
+'''
+# Рейтинг за период SQL-запросами - когда таблиц в памяти нет
+SQL_WINDOW_TAPS = f'SELECT user_id, SUM(taps) AS taps FROM ({SQL_TAP_BUCKETS}) GROUP BY user_id'
+SQL_WINDOW_TOP = f'''
+    SELECT w.user_id, COALESCE(p.display_name, c.display_name) AS display_name, w.taps
+    FROM ({SQL_WINDOW_TAPS}) AS w
+    LEFT JOIN players AS p ON p.user_id = w.user_id
+    LEFT JOIN players_cold AS c ON c.user_id = w.user_id
+    WHERE COALESCE(p.display_name, c.display_name, '') != ''
+    ORDER BY w.taps DESC, w.user_id
+    LIMIT :limit
+'''
+SQL_WINDOW_PLAYER_TAPS = '''
+    SELECT (SELECT COALESCE(SUM(taps), 0) FROM tap_days WHERE day >= :since AND user_id = :user_id)
+         + (SELECT COALESCE(SUM(taps), 0) FROM tap_hours WHERE hour >= :since AND user_id = :user_id)
+'''
+SQL_WINDOW_HIGHER = f'SELECT COUNT(*) FROM ({SQL_WINDOW_TAPS}) WHERE taps > :taps'
+# Свёртка старых часов в сутки и удаление корзин старше хранения
+SQL_ROLL_UP_HOURS = '''
+    INSERT INTO tap_days (day, user_id, taps)
+    SELECT hour - hour % 86400, user_id, SUM(taps) FROM tap_hours WHERE hour < :cutoff
+    GROUP BY hour - hour % 86400, user_id
+    ON CONFLICT(day, user_id) DO UPDATE SET taps = taps + excluded.taps
+'''
+SQL_DELETE_HOURS = 'DELETE FROM tap_hours WHERE hour < :cutoff'
+SQL_DELETE_DAYS = 'DELETE FROM tap_days WHERE day < :cutoff'
+# Страница обхода игроков по первичному ключу
+SQL_LIST_USER_IDS = 'SELECT user_id FROM players WHERE user_id > ? ORDER BY user_id LIMIT ?'
+
+# Холодный слой (migrations.py): игроки без активности дольше порога и без
+# дохода лежат в players_cold, их монеты не меняются. Любая запись сначала
+# возвращает игрока в players; перенос не меняет общую статистику - триггеры
+# обеих таблиц погашают друг друга
+COLD_COLUMNS = PLAYER_COLUMNS + ', name_key'
+SQL_HAS_COLD = 'SELECT EXISTS (SELECT 1 FROM players_cold)'
+SQL_COLD_COINS = 'SELECT coins FROM players_cold'
+# Кандидаты в холодный слой - обходом по первичному ключу, без индекса по
+# last_active: он дорожал бы на каждом тапе. Формат :cutoff - как у CURRENT_TIMESTAMP
+SQL_ARCHIVE_CANDIDATES = '''
+    SELECT user_id, coins FROM players
+    WHERE user_id > :after AND income_per_hour = 0 AND IFNULL(last_active, '') < :cutoff
+    ORDER BY user_id
+    LIMIT :limit
+'''
+SQL_ARCHIVE_PLAYERS = f'''
+    INSERT INTO players_cold ({COLD_COLUMNS})
+    SELECT {COLD_COLUMNS} FROM players WHERE user_id IN (SELECT value FROM json_each(?))
+'''
+SQL_DELETE_HOT_PLAYERS = 'DELETE FROM players WHERE user_id IN (SELECT value FROM json_each(?))'
+SQL_COLD_PLAYERS_OF = 'SELECT user_id, coins FROM players_cold WHERE user_id IN (SELECT value FROM json_each(?))'
+SQL_REHYDRATE_PLAYERS = f'''
+    INSERT INTO players ({COLD_COLUMNS})
+    SELECT {COLD_COLUMNS} FROM players_cold WHERE user_id IN (SELECT value FROM json_each(?))
+'''
+SQL_DELETE_COLD_PLAYERS = 'DELETE FROM players_cold WHERE user_id IN (SELECT value FROM json_each(?))'
+SQL_GET_COLD_PLAYER = f'SELECT {PLAYER_COLUMNS} FROM players_cold WHERE user_id = ?'
+# Те же запросы топа по холодной таблице: при рейтинге без таблицы в памяти
+# выборки обеих таблиц сливаются так же, как выборки шардов
+SQL_TOP_PLAYERS_COLD = SQL_TOP_PLAYERS.replace('FROM players', 'FROM players_cold')
+SQL_TOP_AFTER_COLD = SQL_TOP_AFTER.replace('FROM players', 'FROM players_cold')
+SQL_TOP_BEFORE_COLD = SQL_TOP_BEFORE.replace('FROM players', 'FROM players_cold')
+SQL_TOP_AHEAD_COLD = SQL_TOP_AHEAD.replace('FROM players', 'FROM players_cold')
+SQL_LIST_COLD_USER_IDS = SQL_LIST_USER_IDS.replace('FROM players', 'FROM players_cold')
+
+
+def format_timestamp(ts: float) -> str:
+    """Момент в формате CURRENT_TIMESTAMP SQLite (UTC)"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+
+
+class ConnectionPool:
+    """Ограниченный пул долгоживущих соединений SQLite"""
+
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 10.0,
+                 cached_statements: int = 256):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть и настроить новое соединение"""
+        # isolation_level=None: транзакции открываем явно через transaction()
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Взять соединение из пула (или открыть новое, пока не достигнут лимит)"""
+        if self._closed:
+            raise RuntimeError("Пул соединений закрыт")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Нет свободных соединений с {self.db_path} за {self.timeout} с")
+
+    def release(self, conn: sqlite3.Connection):
+        """Вернуть соединение в пул"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """Соединение на время блока with"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Пишущая транзакция: BEGIN IMMEDIATE, commit при успехе, rollback при ошибке"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        """Закрыть все простаивающие соединения"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """Файлы шардов: tap_game.db -> tap_game.0.db, tap_game.1.db, ..."""
+    if shards <= 1:
+        return [db_path]
+    base, ext = os.path.splitext(db_path)
+    return [f"{base}.{shard}{ext}" for shard in range(shards)]
+
+
+# Класс для работы с базой данных
+class TapDatabase(TapStorage):
+    def __init__(self, db_path="tap_game.db", pool_size: int = 4, in_memory_ranking: bool = True,
+                 player_cache_size: int = 10000, top_cache_ttl: float = 2.0, shards: int = 1):
+        self.db_path = db_path
+        # Игроки разложены по файлам-шардам по user_id: у каждого файла
+        # свой писатель, и запись не упирается в одну блокировку SQLite
+        self.shard_paths = shard_paths(db_path, shards)
+        self.pools = [ConnectionPool(path, size=pool_size) for path in self.shard_paths]
+        # Строки игроков; любая запись через этот класс инвалидирует запись кэша
+        self.player_cache = LRUCache(maxsize=player_cache_size)
+        # Топ живёт недолго и не инвалидируется на каждый тап
+        self.top_cache = LRUCache(maxsize=16, ttl=top_cache_ttl)
+        # Без таблицы в памяти ранг и топ считаются SQL-запросами по индексам
+        self.leaderboard: Optional[Leaderboard] = Leaderboard() if in_memory_ranking else None
+        # Рейтинги за день, неделю и сезон - по тем же правилам
+        self.windows: Optional[WindowedLeaderboard] = WindowedLeaderboard() if in_memory_ranking else None
+        # Занятые имена всех шардов: проверка и резерв без запросов к базе
+        self.names = NameIndex()
+        # Есть ли в шарде холодные игроки: пока нет, записи не ищут их в players_cold
+        self._has_cold = [False] * len(self.pools)
+        # Монеты холодных игроков для ранга без таблицы в памяти: они не
+        # меняются, поэтому ранг не пересчитывает players_cold запросом
+        self._cold_coins: Optional[SortedList] = SortedList() if self.leaderboard is None else None
+        self._cold_lock = threading.Lock()
+        self.init_db()
+
+    def init_db(self):
+        """Инициализация базы данных"""
+        now = time.time()
+        for shard, (path, pool) in enumerate(zip(self.shard_paths, self.pools)):
+            # Схема версионируется (migrations.py): актуальная база не трогается
+            with pool.transaction() as conn:
+                apply_migrations(conn, path)
+
+            with pool.connection() as conn:
+                conflicts = self.names.load(conn.execute(SQL_NAME_ROWS))
+                self._has_cold[shard] = bool(conn.execute(SQL_HAS_COLD).fetchone()[0])
+                if self._cold_coins is not None:
+                    self._cold_coins.update(row[0] for row in conn.execute(SQL_COLD_COINS))
+                if self.leaderboard is not None:
+                    self.leaderboard.load(conn.execute(SQL_LEADERBOARD_ROWS))
+                if self.windows is not None:
+                    self.windows.load_names(conn.execute(SQL_DISPLAY_NAMES))
+                    self.windows.load(conn.execute(SQL_TAP_BUCKETS, {'since': history_start(now)}), now)
+            if conflicts:
+                logger.warning(f"{path}: имён, занятых в других шардах: {conflicts}")
+
+        logger.info(f"База данных инициализирована (шардов: {len(self.pools)}, имён: {len(self.names)})")
+
+    def close(self):
+        """Закрыть соединения с базой"""
+        for pool in self.pools:
+            pool.close()
+
+    @property
+    def shard_count(self) -> int:
+        """Число файлов-шардов"""
+        return len(self.pools)
+
+    @property
+    def reader_threads(self) -> int:
+        """По потоку чтения на соединение пулов"""
+        return sum(pool.size for pool in self.pools)
+
+    def _pool(self, user_id: int) -> ConnectionPool:
+        """Пул соединений шарда игрока"""
+        return self.pools[user_id % len(self.pools)]
+
+    def _rehydrate(self, conn: sqlite3.Connection, user_ids: List[int]) -> List[int]:
+        """Вернуть холодных игроков шарда в players (внутри пишущей транзакции); их монеты"""
+        if not self._has_cold[user_ids[0] % len(self.pools)]:
+            return []
+        payload = json.dumps(user_ids)
+        rows = conn.execute(SQL_COLD_PLAYERS_OF, (payload,)).fetchall()
+        if not rows:
+            return []
+        conn.execute(SQL_REHYDRATE_PLAYERS, (payload,))
+        conn.execute(SQL_DELETE_COLD_PLAYERS, (payload,))
+        logger.debug(f"Из холодного слоя возвращено игроков: {len(rows)}")
+        return [row['coins'] for row in rows]
+
+    @contextmanager
+    def _player_transaction(self, user_ids: List[int]):
+        """Пишущая транзакция шарда игроков user_ids, вернувшая их из холодного слоя"""
+        with self._pool(user_ids[0]).transaction() as conn:
+            coins = self._rehydrate(conn, user_ids)
+            yield conn
+        # Только после фиксации: при откате игроки остаются холодными
+        if coins and self._cold_coins is not None:
+            with self._cold_lock:
+                for value in coins:
+                    self._cold_coins.remove(value)
+
+    def cached_player(self, user_id: int) -> Optional[Dict]:
+        """Строка игрока из кэша, без запроса к базе"""
+        cached = self.player_cache.get(user_id)
+        return economy.settle(dict(cached)) if cached is not None else None
+
+    def get_player(self, user_id: int) -> Dict:
+        """Получить данные игрока с доходом на момент чтения"""
+        player, cold = self.read_player(user_id)
+        # Вернувшийся игрок: переносим в players до его первого тапа
+        return self.rehydrate_player(user_id) if cold else player
+
+    def read_player(self, user_id: int) -> Tuple[Dict, bool]:
+        """Данные игрока без записи: (строка с доходом, из холодного ли она слоя)"""
+        # В кэше - строка как в базе; доход досчитывается при каждом чтении
+        cached = self.player_cache.get(user_id)
+        if cached is not None:
+            return economy.settle(dict(cached)), False
+
+        token = self.player_cache.begin_fill(user_id)
+        try:
+            with self._pool(user_id).connection() as conn:
+                row = conn.execute(SQL_GET_PLAYER, (user_id,)).fetchone()
+                if row is None and self._has_cold[user_id % len(self.pools)]:
+                    # Холодная строка не кэшируется: игрок вот-вот переедет в players
+                    cold = conn.execute(SQL_GET_COLD_PLAYER, (user_id,)).fetchone()
+                    if cold is not None:
+                        return economy.settle(dict(cold)), True
+
+            if row:
+                player = dict(row)
+                self.player_cache.complete_fill(user_id, token, player)
+                return economy.settle(dict(player)), False
+            return {}, False
+        finally:
+            # Несуществующие user_id (их присылает кто угодно) не копятся в заполнениях
+            self.player_cache.cancel_fill(user_id, token)
+
+    def rehydrate_player(self, user_id: int) -> Dict:
+        """Вернуть игрока из холодного слоя в players; его данные"""
+        with self._player_transaction([user_id]) as conn:
+            row = conn.execute(SQL_GET_PLAYER, (user_id,)).fetchone()
+        self.player_cache.invalidate(user_id)
+        return economy.settle(dict(row)) if row else {}
+
+    def create_player(self, user_id: int, username: str = "") -> Dict:
+        """Создать нового игрока"""
+        with self._player_transaction([user_id]) as conn:
+            conn.execute(SQL_CREATE_PLAYER, (user_id, username))
+            # Игрока мог успеть создать параллельный запрос - возвращаем то, что в базе
+            row = conn.execute(SQL_GET_PLAYER, (user_id,)).fetchone()
+
+        self.player_cache.invalidate(user_id)
+        if self.leaderboard is not None:
+            self.leaderboard.add_player(user_id)
+        return dict(row)
+
+    def save_player(self, player_data: Dict) -> bool:
+        """Сохранить данные игрока"""
+        user_id = player_data['user_id']
+        display_name = player_data.get('display_name', '')
+        if not self.names.reserve(user_id, display_name or ''):
+            logger.error(f"Ошибка сохранения: имя {display_name!r} занято")
+            return False
+        try:
+            with self._player_transaction([user_id]) as conn:
+                conn.execute(SQL_SAVE_PLAYER, (
+                    user_id,
+                    player_data.get('username', ''),
+                    display_name,
+                    normalize_name(display_name or '') or None,
+                    player_data.get('coins', 0),
+                    player_data.get('total_taps', 0),
+                    player_data.get('tap_power', 1),
+                    player_data.get('income_per_hour', 0),
+                    player_data.get('settled_at')
+                ))
+            self.names.commit(user_id, display_name or '')
+            self.player_cache.invalidate(player_data['user_id'])
+            if self.leaderboard is not None:
+                self.leaderboard.set_player(
+                    player_data['user_id'],
+                    player_data.get('coins', 0),
+                    player_data.get('total_taps', 0),
+                    player_data.get('display_name') or ''
+                )
+            if self.windows is not None:
+                self.windows.set_name(user_id, display_name)
+            return True
+        except Exception as e:
+            self.names.release(user_id, display_name or '')
+            logger.error(f"Ошибка сохранения: {e}")
+            return False
+
+    def set_username(self, user_id: int, username: str) -> bool:
+        """Обновить username, не трогая монеты"""
+        with self._player_transaction([user_id]) as conn:
+            updated = conn.execute(SQL_SET_USERNAME, (username, user_id)).rowcount
+
+        self.player_cache.invalidate(user_id)
+        return updated > 0
+
+    def add_tap(self, user_id: int, taps: int = 1) -> Dict:
+        """Добавить тап игроку"""
+        now = time.time()
+        params = {'user_id': user_id, 'taps': taps, 'now': now, 'hour': hour_start(now)}
+        with self._player_transaction([user_id]) as conn:
+            row = conn.execute(SQL_ADD_TAPS_RETURNING, params).fetchone()
+            conn.execute(SQL_ADD_HOUR_TAPS, params)
+            # Монеты зависят от силы тапа и дохода, поэтому в таблицу лидеров -
+            # итог из базы, ещё под блокировкой записи шарда: параллельные
+            # начисления попадают в неё в порядке своих транзакций
+            if self.leaderboard is not None:
+                self.leaderboard.update([(user_id, row['coins'], row['total_taps'])])
+            if self.windows is not None:
+                self.windows.add([(user_id, taps)], now)
+
+        self.player_cache.invalidate(user_id)
+        return dict(row)
+
+    def add_taps_bulk(self, deltas: List[Tuple[int, int]]):
+        """Начислить тапы пачке игроков (user_id, delta): по транзакции на шард"""
+        now = time.time()
+        hour = hour_start(now)
+        for shard, group in self.split_by_shard(deltas).items():
+            params = [{'user_id': user_id, 'taps': taps, 'now': now, 'hour': hour} for user_id, taps in group]
+            # Иначе upsert создал бы вторую строку игрока рядом с холодной
+            with self._player_transaction([user_id for user_id, _ in group]) as conn:
+                conn.executemany(SQL_ADD_TAPS, params)
+                conn.executemany(SQL_ADD_HOUR_TAPS, params)
+                if self.leaderboard is not None:
+                    user_ids = json.dumps([user_id for user_id, _ in group])
+                    self.leaderboard.update(tuple(row) for row in conn.execute(SQL_PLAYER_SCORES, (user_ids,)))
+                if self.windows is not None:
+                    self.windows.add(group, now)
+
+        for user_id, taps in deltas:
+            self.player_cache.invalidate(user_id)
+
+    def buy_upgrade(self, user_id: int, upgrade: str) -> Dict:
+        """Купить уровень улучшения за монеты"""
+        now = time.time()
+        # Чтение и списание - в одной пишущей транзакции: монеты не потратить дважды
+        with self._player_transaction([user_id]) as conn:
+            row = conn.execute(SQL_GET_PLAYER, (user_id,)).fetchone()
+            player = dict(row) if row else {}
+            bought, price = economy.buy_upgrade(player, upgrade, now)
+            if bought is not None:
+                conn.execute(SQL_BUY_UPGRADE, bought)
+                if self.leaderboard is not None:
+                    self.leaderboard.update([(user_id, bought['coins'], bought['total_taps'])])
+
+        self.player_cache.invalidate(user_id)
+        return {
+            'success': bought is not None,
+            'price': price,
+            'player': bought if bought is not None else economy.settle(player, now)
+        }
+
+    def set_display_name(self, user_id: int, display_name: str) -> bool:
+        """Установить отображаемое имя"""
+        # Резерв в памяти атомарен для всех шардов; уникальный индекс
+        # по name_key не пустит дубликат, записанный в обход этого процесса
+        if not self.names.reserve(user_id, display_name):
+            return False
+        try:
+            with self._player_transaction([user_id]) as conn:
+                updated = conn.execute(
+                    SQL_SET_NAME, (display_name, normalize_name(display_name) or None, user_id)
+                ).rowcount
+        except sqlite3.IntegrityError:
+            self.names.release(user_id, display_name)
+            return False
+        except Exception as e:
+            self.names.release(user_id, display_name)
+            logger.error(f"Ошибка установки имени: {e}")
+            return False
+
+        if not updated:
+            self.names.release(user_id, display_name)
+            return True
+
+        self.names.commit(user_id, display_name)
+        self.player_cache.invalidate(user_id)
+        if self.leaderboard is not None:
+            self.leaderboard.set_name(user_id, display_name)
+        if self.windows is not None:
+            self.windows.set_name(user_id, display_name)
+        return True
+
+    def suggest_names(self, display_name: str, count: int = 3, user_id: int = 0) -> Dict:
+        """Свободно ли имя и какие похожие свободны"""
+        return {
+            'available': self.names.is_available(display_name, user_id),
+            'suggestions': self.names.suggest(display_name, count, user_id)
+        }
+
+    def get_top_players(self, limit: int = 10) -> List[Dict]:
+        """Получить топ игроков"""
+        cached = self.top_cache.get(limit)
+        if cached is not None:
+            return cached
+
+        result = self._query_top_players(limit)
+        self.top_cache.set(limit, result)
+        return result
+
+    def _query_top_players(self, limit: int) -> List[Dict]:
+        """Топ игроков из таблицы лидеров или SQL-запросом"""
+        if self.leaderboard is not None:
+            return self.leaderboard.top(limit)
+
+        shard_rows = []
+        for shard, pool in enumerate(self.pools):
+            with pool.connection() as conn:
+                shard_rows.append(conn.execute(SQL_TOP_PLAYERS, (limit,)).fetchall())
+                if self._has_cold[shard]:
+                    shard_rows.append(conn.execute(SQL_TOP_PLAYERS_COLD, (limit,)).fetchall())
+
+        # k-way merge уже отсортированных выборок шардов
+        merged = heapq.merge(*shard_rows, key=lambda row: (-row['coins'], row['user_id']))
+        return self._top_rows(itertools.islice(merged, limit), 1)
+
+    def _top_rows(self, rows: Iterable[sqlite3.Row], first_rank: int) -> List[Dict]:
+        """Строки players -> строки топа с местами начиная с first_rank"""
+        result = []
+        for idx, row in enumerate(rows, first_rank):
+            data = dict(row)
+            # Используем display_name если есть, иначе username
+            name = data.get('display_name') or data.get('username') or f"Игрок_{data['user_id']}"
+            result.append({
+                'user_id': data['user_id'],
+                'name': name,
+                'coins': data['coins'],
+                'total_taps': data['total_taps'],
+                'rank': idx
+            })
+
+        return result
+
+    def get_top_page(self, after: Optional[Tuple[int, int]] = None, before: Optional[Tuple[int, int]] = None,
+                     limit: int = 10) -> List[Dict]:
+        """Страница топа после (или до) курсора (coins, user_id)"""
+        if after is None and before is None:
+            return self.get_top_players(limit)
+        if self.leaderboard is not None:
+            return self.leaderboard.page(after, before, limit)
+
+        coins, user_id = before if before is not None else after
+        params = {'coins': coins, 'user_id': user_id, 'limit': limit}
+        if before is not None:
+            sql, cold_sql = SQL_TOP_BEFORE, SQL_TOP_BEFORE_COLD
+        else:
+            sql, cold_sql = SQL_TOP_AFTER, SQL_TOP_AFTER_COLD
+        shard_rows = []
+        for shard, pool in enumerate(self.pools):
+            with pool.connection() as conn:
+                shard_rows.append(conn.execute(sql, params).fetchall())
+                if self._has_cold[shard]:
+                    shard_rows.append(conn.execute(cold_sql, params).fetchall())
+
+        if before is not None:
+            # Выборки шардов идут от курсора вверх - сливаем и разворачиваем
+            merged = heapq.merge(*shard_rows, key=lambda row: (row['coins'], -row['user_id']))
+            rows = list(itertools.islice(merged, limit))[::-1]
+        else:
+            merged = heapq.merge(*shard_rows, key=lambda row: (-row['coins'], row['user_id']))
+            rows = list(itertools.islice(merged, limit))
+        if not rows:
+            return []
+
+        ahead = 0
+        cursor = {'coins': rows[0]['coins'], 'user_id': rows[0]['user_id']}
+        for shard, pool in enumerate(self.pools):
+            with pool.connection() as conn:
+                ahead += conn.execute(SQL_TOP_AHEAD, cursor).fetchone()[0]
+                if self._has_cold[shard]:
+                    ahead += conn.execute(SQL_TOP_AHEAD_COLD, cursor).fetchone()[0]
+        return self._top_rows(rows, ahead + 1)
+
+    def get_players_around(self, user_id: int, radius: int = 5) -> List[Dict]:
+        """Игрок и по radius соседей выше и ниже него в топе"""
+        if self.leaderboard is not None:
+            return self.leaderboard.around(user_id, radius)
+
+        # Место в топе - по монетам в базе, как у соседей, без досчёта дохода
+        with self._pool(user_id).connection() as conn:
+            row = conn.execute(SQL_GET_PLAYER, (user_id,)).fetchone()
+            if row is None and self._has_cold[user_id % len(self.pools)]:
+                row = conn.execute(SQL_GET_COLD_PLAYER, (user_id,)).fetchone()
+        coins = row['coins'] if row else 0
+        own = 1 if row and row['display_name'] else 0
+        above = self.get_top_page(before=(coins, user_id), limit=radius)
+        # Курсор (coins, user_id - 1) - строка самого игрока попадает в выборку
+        below = self.get_top_page(after=(coins, user_id - 1), limit=radius + own)
+        return above + below
+
+    def get_player_rank(self, user_id: int) -> int:
+        """Получить ранг игрока"""
+        # Свои монеты - с доходом на момент запроса, чужие - на последнее зачисление.
+        # Холодного игрока не переносим: ранг - чтение, оно идёт не в потоке-писателе
+        player, _ = self.read_player(user_id)
+        if self.leaderboard is not None:
+            return self.leaderboard.rank(user_id, player.get('coins'))
+
+        if not player or player.get('coins', 0) == 0:
+            return NO_RANK
+
+        higher = 0
+        for pool in self.pools:
+            with pool.connection() as conn:
+                higher += conn.execute(SQL_PLAYER_RANK, (player.get('coins', 0),)).fetchone()[0] - 1
+        with self._cold_lock:
+            higher += len(self._cold_coins) - self._cold_coins.bisect_right(player.get('coins', 0))
+        return higher + 1
+
+    def get_window_top(self, window: str, limit: int = 10) -> List[Dict]:
+        """Топ игроков по тапам за текущий период"""
+        check_window(window)
+        cached = self.top_cache.get((window, limit))
+        if cached is not None:
+            return cached
+
+        result = self._query_window_top(window, limit)
+        self.top_cache.set((window, limit), result)
+        return result
+
+    def _query_window_top(self, window: str, limit: int) -> List[Dict]:
+        """Топ за период из таблицы в памяти или SQL-запросом по корзинам"""
+        if self.windows is not None:
+            return self.windows.top(window, limit)
+
+        params = {'since': window_start(window, time.time()), 'limit': limit}
+        shard_rows = []
+        for pool in self.pools:
+            with pool.connection() as conn:
+                shard_rows.append(conn.execute(SQL_WINDOW_TOP, params).fetchall())
+
+        merged = heapq.merge(*shard_rows, key=lambda row: (-row['taps'], row['user_id']))
+        return [
+            {'user_id': row['user_id'], 'name': row['display_name'], 'taps': row['taps'], 'rank': idx}
+            for idx, row in enumerate(itertools.islice(merged, limit), 1)
+        ]
+
+    def get_window_rank(self, window: str, user_id: int) -> Dict:
+        """Ранг и тапы игрока за текущий период"""
+        check_window(window)
+        if self.windows is not None:
+            return self.windows.rank(window, user_id)
+
+        since = window_start(window, time.time())
+        with self._pool(user_id).connection() as conn:
+            taps = conn.execute(SQL_WINDOW_PLAYER_TAPS, {'since': since, 'user_id': user_id}).fetchone()[0]
+        if not taps:
+            return {'rank': NO_RANK, 'taps': 0}
+
+        higher = 0
+        for pool in self.pools:
+            with pool.connection() as conn:
+                higher += conn.execute(SQL_WINDOW_HIGHER, {'since': since, 'taps': taps}).fetchone()[0]
+        return {'rank': higher + 1, 'taps': taps}
+
+    def get_global_stats(self) -> Dict:
+        """Общая статистика по всем игрокам"""
+        total_players = total_coins = total_taps = 0
+        for pool in self.pools:
+            with pool.connection() as conn:
+                players, coins, taps = conn.execute(SQL_READ_GLOBAL_STATS).fetchone()
+            total_players += players
+            total_coins += coins
+            total_taps += taps
+
+        return {
+            'total_players': total_players,
+            'total_coins': total_coins,
+            'total_taps': total_taps
+        }
+
+    def list_user_ids(self, after_user_id: int = 0, limit: int = 1000) -> List[int]:
+        """Страница user_id по возрастанию: слияние страниц всех шардов"""
+        pages = []
+        for shard, pool in enumerate(self.pools):
+            with pool.connection() as conn:
+                pages.append([row[0] for row in conn.execute(SQL_LIST_USER_IDS, (after_user_id, limit))])
+                if self._has_cold[shard]:
+                    pages.append([row[0] for row in conn.execute(SQL_LIST_COLD_USER_IDS, (after_user_id, limit))])
+        if len(pages) == 1:
+            return pages[0]
+        return list(itertools.islice(heapq.merge(*pages), limit))
+
+    def get_cache_stats(self) -> Dict:
+        """Попадания и промахи кэшей - для подбора размеров"""
+        return {
+            'players': self.player_cache.stats(),
+            'top': self.top_cache.stats()
+        }
+
+    def reconcile_global_stats(self) -> Dict:
+        """Пересчитать статистику по таблице игроков и исправить расхождение"""
+        for path, pool in zip(self.shard_paths, self.pools):
+            with pool.transaction() as conn:
+                cached = tuple(conn.execute(SQL_READ_GLOBAL_STATS).fetchone())
+                total_players, total_coins, total_taps = conn.execute(SQL_GLOBAL_STATS_ALL).fetchone()
+                actual = (total_players, total_coins or 0, total_taps or 0)
+                if cached != actual:
+                    conn.execute(SQL_WRITE_GLOBAL_STATS, actual)
+                    logger.warning(f"Общая статистика {path} расходилась: {cached} -> {actual}")
+
+        return self.get_global_stats()
+
+    def settle_income(self) -> int:
+        """Зачислить пассивный доход: один UPDATE на шард"""
+        now = time.time()
+        settled = 0
+        for pool in self.pools:
+            with pool.transaction() as conn:
+                rows = conn.execute(SQL_SETTLE_INCOME, {'now': now}).fetchall()
+                if self.leaderboard is not None:
+                    self.leaderboard.update(tuple(row) for row in rows)
+            settled += len(rows)
+        # Кэш игроков не сбрасываем: строка из кэша с досчётом дохода при
+        # чтении даёт те же монеты, что и обновлённая строка базы
+        return settled
+
+    def compact_windows(self) -> Dict:
+        """Свернуть старые часовые корзины в суточные и удалить устаревшие"""
+        hour_cutoff, day_cutoff = compaction_cutoffs(time.time())
+        rolled_up = pruned = 0
+        for pool in self.pools:
+            with pool.transaction() as conn:
+                conn.execute(SQL_ROLL_UP_HOURS, {'cutoff': hour_cutoff})
+                rolled_up += conn.execute(SQL_DELETE_HOURS, {'cutoff': hour_cutoff}).rowcount
+                pruned += conn.execute(SQL_DELETE_DAYS, {'cutoff': day_cutoff}).rowcount
+        # Таблицы в памяти не меняются: суммы текущих периодов остаются прежними
+        return {'rolled_up': rolled_up, 'pruned': pruned}
+
+    def archive_inactive(self, inactive_days: float = 30, batch_size: int = 5000,
+                         shard: Optional[int] = None) -> Dict:
+        """Перенести игроков без активности дольше inactive_days в холодный слой"""
+        cutoff = format_timestamp(time.time() - inactive_days * 86400)
+        archived = 0
+        for shard in range(len(self.pools)) if shard is None else [shard]:
+            pool = self.pools[shard]
+            after = -2 ** 63
+            while True:
+                # Пачками: писатель шарда не ждёт весь обход
+                with pool.transaction() as conn:
+                    rows = conn.execute(
+                        SQL_ARCHIVE_CANDIDATES, {'after': after, 'cutoff': cutoff, 'limit': batch_size}
+                    ).fetchall()
+                    if rows:
+                        payload = json.dumps([row['user_id'] for row in rows])
+                        conn.execute(SQL_ARCHIVE_PLAYERS, (payload,))
+                        conn.execute(SQL_DELETE_HOT_PLAYERS, (payload,))
+                        # До фиксации: записи, начатые после неё, уже ищут игроков в players_cold
+                        self._has_cold[shard] = True
+                if not rows:
+                    break
+                if self._cold_coins is not None:
+                    with self._cold_lock:
+                        self._cold_coins.update(row['coins'] for row in rows)
+                # Монеты и имена не меняются: таблицы лидеров в памяти не трогаем
+                for row in rows:
+                    self.player_cache.invalidate(row['user_id'])
+                archived += len(rows)
+                after = rows[-1]['user_id']
+        return {'archived': archived}
+
+    def import_players(self, rows: Iterable[Tuple]) -> int:
+        """Вставить готовые строки (user_id, username, display_name, coins,
+        total_taps, created_at, last_active) - для миграций"""
+        imported = 0
+        for shard, group in self.split_by_shard(rows).items():
+            keyed = []
+            for row in group:
+                # Строки без колонок экономики получают значения нового игрока
+                row = tuple(row) + economy.ECONOMY_DEFAULTS[len(row) - 7:]
+                # Имя, совпавшее после нормализации с уже занятым, не резервируется
+                key = normalize_name(row[2] or '') or None
+                if key and not self.names.reserve(row[0], row[2]):
+                    key = None
+                keyed.append(tuple(row) + (key,))
+            with self.pools[shard].transaction() as conn:
+                conn.executemany(SQL_IMPORT_PLAYER, keyed)
+            for row in keyed:
+                if row[10]:
+                    self.names.commit(row[0], row[2])
+            imported += len(group)
+
+            if self.leaderboard is not None:
+                self.leaderboard.load((row[0], row[2], row[3], row[4]) for row in group)
+            if self.windows is not None:
+                self.windows.load_names((row[0], row[2]) for row in group)
+        return imported
+
+
+class AsyncTapDatabase:
+    """Неблокирующий доступ к хранилищу: запросы уходят в отдельные потоки БД"""
+
+    def __init__(self, database: TapStorage, workers: Optional[int] = None):
+        self.database = database
+        # Очередь запросов ThreadPoolExecutor разбирают потоки БД,
+        # поэтому event loop aiogram не ждёт диск и fsync
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or database.reader_threads,
+            thread_name_prefix="tapdb"
+        )
+        # Запись - через единственного писателя на шард: SQLite всё равно
+        # пропускает одного писателя на файл, а так они не ждут busy_timeout
+        self._writers = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"tapdb-writer{shard}")
+            for shard in range(database.shard_count)
+        ]
+        # Одинаковые чтения топа и статистики, пришедшие одновременно, делят
+        # один запрос к базе: по склейке на метод, ключ - аргументы
+        self._flights: Dict[str, SingleFlight] = {}
+
+    async def _run(self, func, *args):
+        """Выполнить синхронный метод базы в потоке БД"""
+        if self.database.inline_reads:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def _shared(self, func, *args):
+        """Чтение, общее для одновременных вызовов с теми же аргументами
+
+        Только для результатов, которые вызывающие не меняют: все получат один объект.
+        """
+        if self.database.inline_reads:
+            # Чтение из памяти в event loop быстрее, чем ожидание чужого запроса
+            return func(*args)
+        name = func.__name__
+        flights = self._flights.get(name)
+        if flights is None:
+            flights = self._flights[name] = SingleFlight()
+        return await flights.do(args, functools.partial(self._run, func, *args))
+
+    async def _write(self, user_id: int, func, *args):
+        """Выполнить запись в потоке-писателе шарда игрока"""
+        loop = asyncio.get_running_loop()
+        writer = self._writers[self.database.shard_of(user_id)]
+        return await loop.run_in_executor(writer, functools.partial(func, *args))
+
+    async def get_player(self, user_id: int) -> Dict:
+        """Получить данные игрока"""
+        # Попадание в кэш отдаём сразу, без перехода в поток БД
+        cached = self.database.cached_player(user_id)
+        if cached is not None:
+            return cached
+        player, cold = await self._run(self.database.read_player, user_id)
+        if cold:
+            # Перенос из холодного слоя - запись: в очередь писателя шарда,
+            # чтобы не столкнуться с archive_inactive и тапами игрока
+            player = await self._write(user_id, self.database.rehydrate_player, user_id)
+        return player
+
+    async def create_player(self, user_id: int, username: str = "") -> Dict:
+        """Создать нового игрока"""
+        return await self._write(user_id, self.database.create_player, user_id, username)
+
+    async def save_player(self, player_data: Dict) -> bool:
+        """Сохранить данные игрока"""
+        return await self._write(player_data['user_id'], self.database.save_player, player_data)
+
+    async def set_username(self, user_id: int, username: str) -> bool:
+        """Обновить username, не трогая монеты"""
+        return await self._write(user_id, self.database.set_username, user_id, username)
+
+    async def add_tap(self, user_id: int, taps: int = 1) -> Dict:
+        """Добавить тап игроку"""
+        return await self._write(user_id, self.database.add_tap, user_id, taps)
+
+    async def add_taps_bulk(self, deltas: List[Tuple[int, int]]):
+        """Начислить тапы пачке игроков (user_id, delta): шарды пишутся параллельно"""
+        await asyncio.gather(*(
+            self._write(group[0][0], self.database.add_taps_bulk, group)
+            for group in self.database.split_by_shard(deltas).values()
+        ))
+
+    async def buy_upgrade(self, user_id: int, upgrade: str) -> Dict:
+        """Купить уровень улучшения за монеты"""
+        return await self._write(user_id, self.database.buy_upgrade, user_id, upgrade)
+
+    async def set_display_name(self, user_id: int, display_name: str) -> bool:
+        """Установить отображаемое имя"""
+        return await self._write(user_id, self.database.set_display_name, user_id, display_name)
+
+    async def suggest_names(self, display_name: str, count: int = 3, user_id: int = 0) -> Dict:
+        """Свободно ли имя и какие похожие свободны"""
+        return await self._run(self.database.suggest_names, display_name, count, user_id)
+
+    async def get_top_players(self, limit: int = 10) -> List[Dict]:
+        """Получить топ игроков"""
+        return await self._shared(self.database.get_top_players, limit)
+
+    async def get_top_page(self, after: Optional[Tuple[int, int]] = None,
+                           before: Optional[Tuple[int, int]] = None, limit: int = 10) -> List[Dict]:
+        """Страница топа после (или до) курсора (coins, user_id)"""
+        return await self._shared(self.database.get_top_page, after, before, limit)
+
+    async def get_players_around(self, user_id: int, radius: int = 5) -> List[Dict]:
+        """Игрок и его соседи в топе"""
+        return await self._shared(self.database.get_players_around, user_id, radius)
+
+    async def get_player_rank(self, user_id: int) -> int:
+        """Получить ранг игрока"""
+        return await self._shared(self.database.get_player_rank, user_id)
+
+    async def get_window_top(self, window: str, limit: int = 10) -> List[Dict]:
+        """Топ игроков по тапам за текущий период"""
+        return await self._shared(self.database.get_window_top, window, limit)
+
+    async def get_window_rank(self, window: str, user_id: int) -> Dict:
+        """Ранг и тапы игрока за текущий период"""
+        return await self._shared(self.database.get_window_rank, window, user_id)
+
+    async def get_global_stats(self) -> Dict:
+        """Общая статистика по всем игрокам"""
+        return await self._shared(self.database.get_global_stats)
+
+    async def list_user_ids(self, after_user_id: int = 0, limit: int = 1000) -> List[int]:
+        """Страница user_id по возрастанию после after_user_id"""
+        return await self._run(self.database.list_user_ids, after_user_id, limit)
+
+    async def get_cache_stats(self) -> Dict:
+        """Попадания и промахи кэшей - для подбора размеров"""
+        return await self._run(self.database.get_cache_stats)
+
+    def coalescing_stats(self) -> Dict[str, Dict[str, int]]:
+        """Склеенные чтения по методам: сколько запросов ушло в базу и сколько их дождались"""
+        return {name: flights.stats() for name, flights in self._flights.items()}
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Сколько запросов ждут свободного потока БД"""
+        # Очередь ThreadPoolExecutor не публична, но qsize() - ровно то, что нужно
+        depths = {'reader': self._executor._work_queue.qsize()}
+        for shard, writer in enumerate(self._writers):
+            depths[f'writer{shard}'] = writer._work_queue.qsize()
+        return depths
+
+    async def reconcile_global_stats(self) -> Dict:
+        """Пересчитать статистику по таблице игроков и исправить расхождение"""
+        return await self._run(self.database.reconcile_global_stats)
+
+    async def settle_income(self) -> int:
+        """Зачислить накопленный пассивный доход всем игрокам с доходом"""
+        return await self._run(self.database.settle_income)
+
+    async def compact_windows(self) -> Dict:
+        """Свернуть и удалить устаревшие корзины тапов"""
+        return await self._run(self.database.compact_windows)
+
+    async def archive_inactive(self, inactive_days: float = 30, batch_size: int = 5000) -> Dict:
+        """Перенести неактивных игроков в холодный слой"""
+        # В потоке-писателе каждого шарда: перенос встаёт в очередь его записей,
+        # а не борется с ними за BEGIN IMMEDIATE. Один писатель - всё хранилище сразу
+        loop = asyncio.get_running_loop()
+        shards = [None] if len(self._writers) == 1 else range(len(self._writers))
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                self._writers[shard or 0],
+                functools.partial(self.database.archive_inactive, inactive_days, batch_size, shard)
+            )
+            for shard in shards
+        ))
+        return {'archived': sum(result['archived'] for result in results)}
+
+    async def close(self):
+        """Дождаться запросов в очереди и закрыть базу"""
+        loop = asyncio.get_running_loop()
+        for executor in self._writers + [self._executor]:
+            await loop.run_in_executor(None, functools.partial(executor.shutdown, wait=True))
+        self.database.close()
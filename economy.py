@@ -0,0 +1,94 @@
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Пассивный доход не начисляется таймерами: у игрока хранятся скорость
+# (income_per_hour) и момент последнего расчёта (settled_at), а монеты за
+# прошедшее время досчитываются, когда игрока читают или меняют. settled_at
+# сдвигается ровно на время начисленных целых монет, поэтому дробный
+# остаток не теряется между расчётами. Формулы повторены в SQL (database.py).
+SECONDS_PER_HOUR = 3600
+# Колонки экономики нового игрока: tap_power, income_per_hour, settled_at
+ECONOMY_DEFAULTS = (1, 0, None)
+
+
+class Upgrade(NamedTuple):
+    """Улучшение: каждый уровень прибавляет step к колонке игрока"""
+    title: str
+    column: str
+    step: int
+    base_price: int
+    price_growth: float
+    # Значение колонки без улучшений
+    default: int = 0
+
+
+UPGRADES: Dict[str, Upgrade] = {
+    'tap_power': Upgrade("Сила тапа", 'tap_power', 1, 100, 1.8, default=1),
+    # 360 монет в час - 0.1 в секунду за уровень
+    'autotapper': Upgrade("Автотапер", 'income_per_hour', 360, 250, 1.5),
+}
+
+
+def accrued_income(income_per_hour: int, settled_at: Optional[float], now: float) -> int:
+    """Целые монеты пассивного дохода, накопленные с settled_at"""
+    if income_per_hour <= 0 or settled_at is None:
+        return 0
+    return int(max(now - settled_at, 0) * income_per_hour / SECONDS_PER_HOUR)
+
+
+def settle(player: Dict, now: Optional[float] = None) -> Dict:
+    """Строка игрока с зачисленным пассивным доходом (исходная не меняется)"""
+    income_per_hour = player.get('income_per_hour') or 0
+    coins = accrued_income(income_per_hour, player.get('settled_at'), now or time.time())
+    if not coins:
+        return player
+    player = dict(player)
+    player['coins'] = player.get('coins', 0) + coins
+    player['settled_at'] += coins * SECONDS_PER_HOUR / income_per_hour
+    return player
+
+
+def upgrade_level(player: Dict, key: str) -> int:
+    """Купленный уровень улучшения"""
+    upgrade = UPGRADES[key]
+    return ((player.get(upgrade.column) or upgrade.default) - upgrade.default) // upgrade.step
+
+
+def upgrade_price(key: str, level: int) -> int:
+    """Цена уровня level + 1"""
+    upgrade = UPGRADES[key]
+    return int(upgrade.base_price * upgrade.price_growth ** level)
+
+
+def upgrade_offers(player: Dict) -> List[Dict]:
+    """Улучшения с уровнем игрока и ценой следующего - для WebApp"""
+    offers = []
+    for key, upgrade in UPGRADES.items():
+        level = upgrade_level(player, key)
+        offers.append({
+            'key': key,
+            'title': upgrade.title,
+            'level': level,
+            'step': upgrade.step,
+            'price': upgrade_price(key, level)
+        })
+    return offers
+
+
+def buy_upgrade(player: Dict, key: str, now: float) -> Tuple[Optional[Dict], int]:
+    """Строка игрока после покупки уровня и цена; None вместо строки - не хватает монет"""
+    if key not in UPGRADES:
+        raise ValueError(f"Неизвестное улучшение: {key}")
+    upgrade = UPGRADES[key]
+    # Доход до покупки считается по старой скорости
+    player = settle(player, now)
+    price = upgrade_price(key, upgrade_level(player, key))
+    if player.get('coins', 0) < price:
+        return None, price
+
+    player = dict(player)
+    player['coins'] -= price
+    if upgrade.column == 'income_per_hour' and not player.get('income_per_hour'):
+        player['settled_at'] = now
+    player[upgrade.column] = (player.get(upgrade.column) or upgrade.default) + upgrade.step
+    return player, price
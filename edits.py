@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Telegram пропускает около одного сообщения в секунду в чат; правки чаще
+# упираются в 429, а правка тем же текстом - в "message is not modified"
+EditKey = Tuple[int, int]
+Send = Callable[[], Awaitable[bool]]
+
+
+def edit_digest(text: str, markup: Optional[str] = None) -> str:
+    """Отпечаток текста с клавиатурой (JSON), одинаковый во всех процессах"""
+    digest = hashlib.blake2b(text.encode(), digest_size=16)
+    digest.update(b'\0' + (markup or '').encode())
+    return digest.hexdigest()
+
+
+class MessageEditor:
+    """Правки сообщений бота: одинаковые пропускаются, частые в одном чате откладываются
+
+    Для каждого сообщения помнится отпечаток (edit_digest) последней дошедшей
+    правки - такая же не отправляется. Отпечаток запоминается только после
+    успешной отправки, так что неудавшаяся правка при повторе уйдёт снова.
+    Первая правка в чате уходит сразу; следующие в пределах интервала ждут его
+    конца, и отправляется только последняя из них. Правку тем же текстом, что
+    показал другой воркер, отклоняет Telegram ("message is not modified") - это
+    не ошибка. Модуль не зависит от aiogram: правку выполняет переданная корутина.
+    """
+
+    def __init__(self, interval: float = 1.0, maxsize: int = 10000):
+        self.interval = interval
+        # (chat_id, message_id) -> отпечаток последней дошедшей правки
+        self._sent = LRUCache(maxsize=maxsize)
+        # chat_id -> время последней правки (monotonic)
+        self._last_edit = LRUCache(maxsize=maxsize)
+        # Отложенные правки: ключ -> (отпечаток, корутина отправки) последней из них
+        self._pending: Dict[EditKey, Tuple[str, Send]] = {}
+        self._timers: Dict[EditKey, asyncio.Task] = {}
+        self.counts = {'sent': 0, 'skipped': 0, 'unchanged': 0, 'debounced': 0, 'failed': 0}
+
+    async def edit(self, chat_id: int, message_id: int, digest: str, send: Send) -> bool:
+        """Отправить правку, если она что-то меняет; False - пропущена, отложена или без изменений
+
+        send() возвращает False, если Telegram ответил, что сообщение не изменилось.
+        """
+        key = (chat_id, message_id)
+        pending = self._pending.get(key)
+        if digest == (pending[0] if pending else self._sent.get(key)):
+            self.counts['skipped'] += 1
+            return False
+
+        wait = self.interval - (time.monotonic() - self._last_edit.get(chat_id, float('-inf')))
+        if pending or wait > 0:
+            if pending:
+                # Отложенную правку заменяет новая: старая так и не уйдёт
+                self.counts['debounced'] += 1
+            self._pending[key] = (digest, send)
+            if key not in self._timers:
+                self._timers[key] = asyncio.ensure_future(self._flush_later(key, wait))
+            return False
+
+        return await self._send(key, digest, send)
+
+    async def _send(self, key: EditKey, digest: str, send: Send) -> bool:
+        """Отправить правку; отпечаток запомнить, только если она дошла"""
+        self._last_edit.set(key[0], time.monotonic())
+        sent = await send()
+        self.counts['sent' if sent else 'unchanged'] += 1
+        self._sent.set(key, digest)
+        return sent
+
+    async def _flush_later(self, key: EditKey, wait: float):
+        """Отправлять последнюю отложенную правку по окончании интервала, пока они есть"""
+        try:
+            # Правка, пришедшая во время отправки, ждёт следующего интервала
+            while key in self._pending:
+                await asyncio.sleep(max(wait, 0))
+                wait = self.interval
+                digest, send = self._pending.pop(key)
+                if digest == self._sent.get(key):
+                    # За время ожидания вернулись к уже показанному
+                    self.counts['skipped'] += 1
+                    continue
+                try:
+                    await self._send(key, digest, send)
+                except Exception as e:
+                    self.counts['failed'] += 1
+                    logger.warning(f"Отложенная правка сообщения {key[1]} в чате {key[0]} не отправлена: {e}")
+        finally:
+            self._timers.pop(key, None)
+
+    async def close(self):
+        """Отправить отложенные правки, не дожидаясь интервала"""
+        for timer in list(self._timers.values()):
+            timer.cancel()
+        for key, (digest, send) in list(self._pending.items()):
+            try:
+                await self._send(key, digest, send)
+            except Exception as e:
+                self.counts['failed'] += 1
+                logger.warning(f"Правка сообщения {key[1]} в чате {key[0]} не отправлена: {e}")
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Правки по исходу и отложенные сейчас"""
+        return dict(self.counts, pending=len(self._pending))
@@ -0,0 +1,702 @@
+import asyncio
+import html
+import json
+import logging
+from typing import TYPE_CHECKING
+
+from aiogram import F, Router
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, CommandStart
+from aiogram.types import (
+    Message, WebAppInfo, InlineKeyboardMarkup, 
+    InlineKeyboardButton, CallbackQuery
+)
+
+from api import TAPS_ACCEPTED, TAPS_REJECTED
+from economy import UPGRADES, upgrade_offers
+from edits import edit_digest
+from leaderboard import page_cursors, parse_cursor
+from metrics import REGISTRY, HandlerMetricsMiddleware
+from names import MAX_NAME_LENGTH, MIN_NAME_LENGTH
+from windows import WINDOW_TITLES, WINDOWS
+
+if TYPE_CHECKING:
+    from main import TapGame
+
+logger = logging.getLogger(__name__)
+
+WEBAPP_ERRORS = REGISTRY.counter("webapp_errors_total", "Ошибки обработки данных WebApp")
+
+# Листание топа: строк на странице и соседей выше и ниже игрока
+TOP_PAGE_SIZE = 10
+AROUND_RADIUS = 5
+
+def format_number(num: int) -> str:
+    """Форматировать число"""
+    if num >= 1000000:
+        return f"{num/1000000:.1f}M"
+    elif num >= 1000:
+        return f"{num/1000:.1f}K"
+    return str(num)
+
+async def edit_message(callback_query: CallbackQuery, game: "TapGame", text: str,
+                       keyboard: InlineKeyboardMarkup = None) -> bool:
+    """Заменить текст сообщения с кнопками, если он изменился (правки в чате - с задержкой)"""
+    message = callback_query.message
+
+    async def send() -> bool:
+        try:
+            await message.edit_text(text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
+        except TelegramBadRequest as e:
+            # Этот текст уже на экране: например, его показал другой воркер - не ошибка
+            if "message is not modified" not in str(e):
+                raise
+            return False
+        return True
+
+    digest = edit_digest(text, keyboard.model_dump_json(exclude_none=True) if keyboard else None)
+    return await game.edits.edit(message.chat.id, message.message_id, digest, send)
+
+async def start_command(message: Message, game: "TapGame"):
+    """Обработчик команды /start"""
+    user_id = message.from_user.id
+    username = message.from_user.username or message.from_user.first_name or ""
+    
+    logger.info(f"Пользователь {user_id} начал игру")
+    
+    # Получаем или создаем игрока
+    player = await game.db.get_player(user_id)
+    if not player:
+        player = await game.db.create_player(user_id, username)
+    else:
+        # Обновляем username если изменился
+        if username and player.get('username') != username:
+            player['username'] = username
+            await game.db.set_username(user_id, username)
+    
+    # Проверяем, есть ли у игрока имя
+    has_name = bool(player.get('display_name'))
+    
+    if not has_name:
+        # Предлагаем установить имя
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="🎮 Играть без имени",
+                        web_app=WebAppInfo(url=game.webapp_url(user_id))
+                    )
+                ],
+                [
+                    InlineKeyboardButton(
+                        text="✏️ Установить имя",
+                        callback_data="set_name"
+                    )
+                ]
+            ]
+        )
+        
+        await message.answer(
+            "👋 <b>Добро пожаловать в TapCoin!</b>\n\n"
+            "<i>Простой кликер в стиле Notcoin</i>\n\n"
+            "Чтобы играть с именем, нажми 'Установить имя'.\n"
+            "Или начни играть сразу:",
+            reply_markup=keyboard,
+            parse_mode=ParseMode.HTML
+        )
+    else:
+        # Имя уже есть, показываем меню
+        display_name = player.get('display_name', f"Игрок_{user_id}")
+        
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="💰 ТАПАТЬ!",
+                        web_app=WebAppInfo(url=game.webapp_url(user_id))
+                    )
+                ],
+                [
+                    InlineKeyboardButton(text="🏆 Топ игроков", callback_data="top"),
+                    InlineKeyboardButton(text="📊 Статистика", callback_data="stats")
+                ],
+                [
+                    InlineKeyboardButton(text="✏️ Сменить имя", callback_data="change_name")
+                ]
+            ]
+        )
+        
+        await message.answer(
+            f"👋 <b>С возвращением, {display_name}!</b>\n\n"
+            f"💰 <b>Баланс:</b> {format_number(player.get('coins', 0))} монет\n"
+            f"👆 <b>Тапов:</b> {format_number(player.get('total_taps', 0))}\n\n"
+            "Нажми кнопку ниже, чтобы продолжить играть!",
+            reply_markup=keyboard,
+            parse_mode=ParseMode.HTML
+        )
+
+async def set_name_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Установить имя"""
+    await callback_query.answer()
+    
+    await edit_message(
+        callback_query, game,
+        "✏️ <b>Установите имя</b>\n\n"
+        "Как вас будут видеть другие игроки?\n\n"
+        "<i>Отправьте мне сообщение с вашим именем (2-20 символов)</i>"
+    )
+
+async def change_name_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Сменить имя"""
+    await callback_query.answer()
+    
+    await edit_message(
+        callback_query, game,
+        "✏️ <b>Смена имени</b>\n\n"
+        "Введите новое имя (2-20 символов):"
+    )
+
+async def handle_name_input(message: Message, game: "TapGame"):
+    """Обработка ввода имени"""
+    user_id = message.from_user.id
+    name = message.text.strip()
+    
+    if len(name) < MIN_NAME_LENGTH or len(name) > MAX_NAME_LENGTH:
+        await message.answer(
+            "⚠️ <b>Неверная длина имени!</b>\n\n"
+            "Имя должно быть от 2 до 20 символов.\n"
+            "Попробуйте еще раз:",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    # Проверяем, можно ли установить имя
+    success = await game.db.set_display_name(user_id, name)
+    
+    if success:
+        player = await game.db.get_player(user_id)
+        
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="🎮 Начать играть!",
+                        web_app=WebAppInfo(url=game.webapp_url(user_id))
+                    )
+                ]
+            ]
+        )
+        
+        await message.answer(
+            f"✅ <b>Отлично, {name}!</b>\n\n"
+            "Теперь ваше имя будет отображаться в таблице лидеров.\n\n"
+            "Нажмите кнопку ниже, чтобы начать играть:",
+            reply_markup=keyboard,
+            parse_mode=ParseMode.HTML
+        )
+    else:
+        # Сразу предлагаем свободные варианты, чтобы не угадывать вслепую
+        suggestions = (await game.db.suggest_names(name, 3, user_id))['suggestions']
+        suggestions_text = "".join(f"• <code>{html.escape(s)}</code>\n" for s in suggestions)
+        await message.answer(
+            "❌ <b>Имя уже занято!</b>\n\n"
+            "Это имя уже использует другой игрок.\n"
+            + (f"Свободны, например:\n{suggestions_text}\n" if suggestions_text else "")
+            + "Пожалуйста, выберите другое имя:",
+            parse_mode=ParseMode.HTML
+        )
+
+async def stats_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Показать статистику"""
+    user_id = callback_query.from_user.id
+    player = await game.taps.get_player(user_id)
+    rank = await game.db.get_player_rank(user_id)
+    
+    display_name = player.get('display_name') or player.get('username') or f"Игрок_{user_id}"
+    
+    stats_text = (
+        f"📊 <b>Ваша статистика</b>\n\n"
+        f"👤 <b>Имя:</b> {display_name}\n"
+        f"💰 <b>Монеты:</b> {format_number(player.get('coins', 0))}\n"
+        f"👆 <b>Всего тапов:</b> {format_number(player.get('total_taps', 0))}\n"
+        f"⚡ <b>Монет за тап:</b> {player.get('tap_power', 1)}\n"
+        f"🤖 <b>Доход:</b> {format_number(player.get('income_per_hour', 0))} монет/час\n"
+        f"🏆 <b>Ранг:</b> #{rank}\n\n"
+        f"🕐 <b>В игре с:</b> {player.get('created_at', '')[:10]}"
+    )
+    
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="🎮 Продолжить игру", callback_data="play"),
+                InlineKeyboardButton(text="🏆 Топ игроков", callback_data="top")
+            ]
+        ]
+    )
+    
+    await edit_message(callback_query, game, stats_text, keyboard)
+    await callback_query.answer()
+
+def render_top_lines(top_players: list, field: str = 'coins', unit: str = 'монет') -> tuple:
+    """Строки топа: (user_id, обычная строка, строка с выделением, курсор страницы)"""
+    lines = []
+    for p in top_players:
+        i = p['rank']
+        medal = ""
+        if i == 1: medal = "🥇"
+        elif i == 2: medal = "🥈"
+        elif i == 3: medal = "🥉"
+        else: medal = f"{i}."
+        
+        name = p['name'][:15]
+        if len(p['name']) > 15:
+            name = p['name'][:12] + "..."
+        
+        score = format_number(p[field])
+        lines.append((
+            p['user_id'],
+            f"{medal} {name}: {score} {unit}\n",
+            f"<b>{medal} {name}: {score} {unit} ⭐</b>\n",
+            f"{p[field]}:{p['user_id']}"
+        ))
+    return tuple(lines)
+
+def join_top_lines(lines: tuple, user_id: int) -> str:
+    """Текст строк топа с выделенной строкой игрока"""
+    return "".join(
+        highlighted if line_user_id == user_id else line
+        for line_user_id, line, highlighted, _ in lines
+    )
+
+def top_page_row(lines: tuple, has_prev: bool) -> list:
+    """Кнопки листания топа: курсоры - первая и последняя строки страницы"""
+    buttons = []
+    if lines and has_prev:
+        buttons.append(InlineKeyboardButton(text="⬆️ Выше", callback_data=f"top_page:prev:{lines[0][3]}"))
+    if lines:
+        buttons.append(InlineKeyboardButton(text="⬇️ Ниже", callback_data=f"top_page:next:{lines[-1][3]}"))
+    buttons.append(InlineKeyboardButton(text="📍 Рядом со мной", callback_data="top_me"))
+    return buttons
+
+async def get_top_lines(game: "TapGame", limit: int = 10, window: str = None) -> tuple:
+    """Отрисованные строки топа (за всё время или за период) из кэша"""
+    lines = game.top_render_cache.get((window, limit))
+    if lines is None:
+        if window:
+            lines = render_top_lines(await game.db.get_window_top(window, limit), 'taps', 'тапов')
+        else:
+            lines = render_top_lines(await game.db.get_top_players(limit))
+        game.top_render_cache.set((window, limit), lines)
+    return lines
+
+def top_windows_row(current: str = None) -> list:
+    """Кнопки переключения топа: за всё время и за периоды"""
+    buttons = [("Всё время", "top", None)] + [
+        (WINDOW_TITLES[window].capitalize(), f"top:{window}", window) for window in WINDOWS
+    ]
+    return [
+        InlineKeyboardButton(text=f"• {text}" if window == current else text, callback_data=data)
+        for text, data, window in buttons
+    ]
+
+async def top_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Показать топ игроков"""
+    user_id = callback_query.from_user.id
+    # Запросы независимы, поэтому выполняем их параллельно в потоках БД
+    top_lines, player, user_rank, stats = await asyncio.gather(
+        get_top_lines(game, TOP_PAGE_SIZE),
+        game.taps.get_player(user_id),
+        game.db.get_player_rank(user_id),
+        game.db.get_global_stats()
+    )
+    
+    top_text = "🏆 <b>Топ 10 игроков</b>\n\n"
+    # Выделяем текущего пользователя
+    top_text += join_top_lines(top_lines, user_id)
+    
+    top_text += f"\n<b>Ваш ранг:</b> #{user_rank}\n"
+    top_text += f"<b>Ваши монеты:</b> {format_number(player.get('coins', 0))}\n\n"
+    
+    # Общая статистика
+    top_text += f"📈 <b>Общая статистика</b>\n"
+    top_text += f"👥 Игроков: {stats['total_players']}\n"
+    top_text += f"💰 Всего монет: {format_number(stats['total_coins'])}\n"
+    top_text += f"👆 Всего тапов: {format_number(stats['total_taps'])}\n"
+    
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            top_windows_row(),
+            top_page_row(top_lines, has_prev=False),
+            [InlineKeyboardButton(text="🔄 Обновить", callback_data="top")],
+            [
+                InlineKeyboardButton(text="📊 Моя статистика", callback_data="stats"),
+                InlineKeyboardButton(text="🎮 Играть", callback_data="play")
+            ]
+        ]
+    )
+    
+    await edit_message(callback_query, game, top_text, keyboard)
+    await callback_query.answer()
+
+async def window_top_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Показать топ по тапам за день, неделю или сезон (callback top:<период>)"""
+    user_id = callback_query.from_user.id
+    window = callback_query.data.split(":", 1)[1]
+    if window not in WINDOWS:
+        await callback_query.answer("Неизвестный период")
+        return
+
+    top_lines, user_rank = await asyncio.gather(
+        get_top_lines(game, 10, window),
+        game.db.get_window_rank(window, user_id)
+    )
+    
+    top_text = f"🏆 <b>Топ 10 игроков {WINDOW_TITLES[window]}</b>\n\n"
+    top_text += join_top_lines(top_lines, user_id) or "Пока никто не тапал\n"
+    
+    top_text += f"\n<b>Ваш ранг:</b> #{user_rank['rank']}\n"
+    top_text += f"<b>Ваши тапы {WINDOW_TITLES[window]}:</b> {format_number(user_rank['taps'])}\n"
+    
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            top_windows_row(window),
+            [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"top:{window}")],
+            [
+                InlineKeyboardButton(text="📊 Моя статистика", callback_data="stats"),
+                InlineKeyboardButton(text="🎮 Играть", callback_data="play")
+            ]
+        ]
+    )
+    
+    await edit_message(callback_query, game, top_text, keyboard)
+    await callback_query.answer()
+
+async def show_top_page(callback_query: CallbackQuery, game: "TapGame", rows: list, title: str, note: str = ""):
+    """Показать страницу топа с кнопками листания"""
+    lines = render_top_lines(rows)
+    top_text = f"{title}\n\n" + join_top_lines(lines, callback_query.from_user.id) + note
+    
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            top_page_row(lines, has_prev=bool(rows) and rows[0]['rank'] > 1),
+            [
+                InlineKeyboardButton(text="🏆 Топ игроков", callback_data="top"),
+                InlineKeyboardButton(text="🎮 Играть", callback_data="play")
+            ]
+        ]
+    )
+    
+    await edit_message(callback_query, game, top_text, keyboard)
+    await callback_query.answer()
+
+async def top_page_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Листать топ по курсору (callback top_page:next|prev:<монеты>:<user_id>)"""
+    try:
+        _, direction, coins, cursor_user_id = callback_query.data.split(":")
+        cursor = (int(coins), int(cursor_user_id))
+    except ValueError:
+        await callback_query.answer("Некорректная страница")
+        return
+
+    if direction == "prev":
+        rows = await game.db.get_top_page(before=cursor, limit=TOP_PAGE_SIZE)
+    else:
+        rows = await game.db.get_top_page(after=cursor, limit=TOP_PAGE_SIZE)
+    if not rows:
+        await callback_query.answer("Дальше игроков нет")
+        return
+
+    await show_top_page(callback_query, game, rows, f"🏆 <b>Места {rows[0]['rank']}–{rows[-1]['rank']}</b>")
+
+async def top_around_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Показать игроков рядом с местом игрока в топе"""
+    user_id = callback_query.from_user.id
+    rows = await game.db.get_players_around(user_id, AROUND_RADIUS)
+    note = ""
+    if not any(row['user_id'] == user_id for row in rows):
+        note = "\nЗадайте имя, чтобы попасть в таблицу - здесь ваши соседи по монетам\n"
+    if not rows:
+        await callback_query.answer("В таблице пока никого нет")
+        return
+
+    await show_top_page(callback_query, game, rows, "📍 <b>Вы в рейтинге</b>", note)
+
+async def play_handler(callback_query: CallbackQuery, game: "TapGame"):
+    """Вернуться к игре"""
+    user_id = callback_query.from_user.id
+    player = await game.db.get_player(user_id)
+    
+    has_name = bool(player.get('display_name'))
+    
+    if has_name:
+        display_name = player.get('display_name')
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="💰 ПРОДОЛЖИТЬ ТАПАТЬ",
+                        web_app=WebAppInfo(url=game.webapp_url(user_id))
+                    )
+                ]
+            ]
+        )
+        
+        await edit_message(
+            callback_query, game, f"Нажми кнопку ниже, чтобы продолжить игру, {display_name}!", keyboard
+        )
+    else:
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="🎮 Играть без имени",
+                        web_app=WebAppInfo(url=game.webapp_url(user_id))
+                    )
+                ],
+                [
+                    InlineKeyboardButton(text="✏️ Установить имя", callback_data="set_name")
+                ]
+            ]
+        )
+        
+        await edit_message(callback_query, game, "Вы можете играть без имени или установить его:", keyboard)
+    
+    await callback_query.answer()
+
+async def handle_web_app_data(message: Message, game: "TapGame"):
+    """Обработка данных из WebApp"""
+    try:
+        data = json.loads(message.web_app_data.data)
+        # Игрок - только отправитель сообщения: user_id из данных WebApp
+        # присылает клиент, и чужим id он мог бы тапать за другого
+        user_id = message.from_user.id
+        claimed = data.get("user_id")
+        if claimed is not None and str(claimed) != str(user_id):
+            WEBAPP_ERRORS.inc()
+            logger.warning(f"WebApp запрос от {user_id} с чужим user_id={claimed!r}")
+            await message.answer(json.dumps({"success": False, "error": "Неверный пользователь"}))
+            return
+        action = data.get("action")
+        
+        # На каждый тап - только debug: INFO-строка на тап дороже самого тапа
+        logger.debug(f"WebApp запрос от {user_id}: {action}")
+        
+        response = {}
+        
+        if action == "tap":
+            # Обработка тапа
+            if game.tap_limiter.consume(user_id):
+                TAPS_ACCEPTED.inc("webapp")
+                player = await game.taps.add_tap(user_id)
+                coins_added = player.get('tap_power', 1)
+            else:
+                # Автокликер: тап отбрасываем, в базу не ходим
+                TAPS_REJECTED.inc("webapp")
+                player = game.taps.peek(user_id) or await game.taps.get_player(user_id)
+                coins_added = 0
+            response = {
+                "success": True,
+                "coins": player.get('coins', 0),
+                "total_taps": player.get('total_taps', 0),
+                "coins_added": coins_added
+            }
+            
+        elif action == "get_state":
+            # Получить состояние игрока
+            player = await game.taps.get_player(user_id)
+            if not player:
+                player = await game.db.create_player(user_id)
+            
+            response = {
+                "success": True,
+                "coins": player.get('coins', 0),
+                "total_taps": player.get('total_taps', 0),
+                "display_name": player.get('display_name', ''),
+                "has_name": bool(player.get('display_name')),
+                "tap_power": player.get('tap_power', 1),
+                "income_per_hour": player.get('income_per_hour', 0),
+                "upgrades": upgrade_offers(player)
+            }
+            
+        elif action == "buy_upgrade":
+            # Купить уровень улучшения
+            upgrade = data.get("upgrade")
+            if upgrade in UPGRADES:
+                result = await game.taps.buy_upgrade(user_id, upgrade)
+                player = result['player']
+                response = {
+                    "success": result['success'],
+                    "message": "Улучшение куплено" if result['success'] else "Не хватает монет",
+                    "price": result['price'],
+                    "coins": player.get('coins', 0),
+                    "tap_power": player.get('tap_power', 1),
+                    "income_per_hour": player.get('income_per_hour', 0),
+                    "upgrades": upgrade_offers(player)
+                }
+            else:
+                response = {
+                    "success": False,
+                    "message": "Неизвестное улучшение"
+                }
+            
+        elif action == "get_top":
+            # Получить топ игроков: за всё время или за период ("window");
+            # за всё время - страница по курсору ("after"/"before": [монеты, user_id])
+            # или соседи игрока ("around": true)
+            window = data.get("window")
+            if not window:
+                try:
+                    after, before = parse_cursor(data.get("after")), parse_cursor(data.get("before"))
+                except (TypeError, ValueError):
+                    response = {"success": False, "message": "Некорректная страница"}
+                else:
+                    if data.get("around"):
+                        top_players = await game.db.get_players_around(user_id, AROUND_RADIUS)
+                    else:
+                        top_players = await game.db.get_top_page(after, before, TOP_PAGE_SIZE)
+                    response = {
+                        "success": True,
+                        "top_players": top_players,
+                        **page_cursors(top_players)
+                    }
+            elif window in WINDOWS:
+                response = {
+                    "success": True,
+                    "window": window,
+                    "top_players": await game.db.get_window_top(window, 10),
+                    "my_rank": await game.db.get_window_rank(window, user_id)
+                }
+            else:
+                response = {
+                    "success": False,
+                    "message": "Неизвестный период"
+                }
+            
+        elif action == "set_name_from_app":
+            # Установить имя из WebApp
+            name = data.get("name", "").strip()
+            if MIN_NAME_LENGTH <= len(name) <= MAX_NAME_LENGTH:
+                success = await game.db.set_display_name(user_id, name)
+                response = {
+                    "success": success,
+                    "message": "Имя установлено" if success else "Имя занято"
+                }
+                if not success:
+                    response["suggestions"] = (await game.db.suggest_names(name, 3, user_id))['suggestions']
+            else:
+                response = {
+                    "success": False,
+                    "message": "Имя должно быть 2-20 символов"
+                }
+        
+        # Отправляем ответ обратно в WebApp
+        await message.answer(json.dumps(response))
+        
+    except Exception as e:
+        WEBAPP_ERRORS.inc()
+        logger.error(f"Ошибка обработки WebApp: {e}")
+        await message.answer(json.dumps({"success": False, "error": str(e)}))
+
+async def help_command(message: Message):
+    """Команда /help"""
+    help_text = (
+        "ℹ️ <b>Помощь по игре</b>\n\n"
+        "🎮 <b>Как играть:</b>\n"
+        "1. Установите имя (опционально)\n"
+        "2. Нажмите кнопку 'ТАПАТЬ!'\n"
+        "3. Тапайте по экрану в WebApp\n"
+        "4. Зарабатывайте монеты\n\n"
+        
+        "📱 <b>WebApp работает прямо в Telegram</b>\n"
+        "• Не нужно ничего скачивать\n"
+        "• Сохраняется автоматически\n"
+        "• Работает на всех устройствах\n\n"
+        
+        "🏆 <b>Таблица лидеров</b>\n"
+        "• Соревнуйтесь с другими игроками\n"
+        "• Поднимайтесь в рейтинге\n"
+        "• Показывает топ-10 игроков\n\n"
+        
+        "💾 <b>Сохранение прогресса</b>\n"
+        "• Все данные сохраняются на компьютере\n"
+        "• Имя нужно установить один раз\n"
+        "• Прогресс не теряется\n\n"
+        
+        "🔄 <b>Команды бота:</b>\n"
+        "/start - Начать игру\n"
+        "/stats - Ваша статистика\n"
+        "/help - Эта справка"
+    )
+    
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🎮 НАЧАТЬ ИГРАТЬ", callback_data="play")]
+        ]
+    )
+    
+    await message.answer(help_text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
+
+async def broadcast_command(message: Message, command: CommandObject, game: "TapGame"):
+    """/broadcast текст - разослать сообщение всем игрокам (только администраторам)"""
+    if message.from_user.id not in game.admin_ids:
+        await message.answer("⛔ Команда доступна только администраторам")
+        return
+    if not command.args:
+        await message.answer("Использование: /broadcast текст сообщения")
+        return
+
+    job = await game.broadcaster.start(command.args)
+    stats = await game.db.get_global_stats()
+    await message.answer(
+        f"📣 <b>Рассылка #{job['id']} запущена</b>\n\n"
+        f"Игроков: {stats['total_players']}\n"
+        "Прогресс: /broadcast_status",
+        parse_mode=ParseMode.HTML
+    )
+
+async def broadcast_status_command(message: Message, game: "TapGame"):
+    """/broadcast_status - прогресс последних рассылок"""
+    if message.from_user.id not in game.admin_ids:
+        await message.answer("⛔ Команда доступна только администраторам")
+        return
+
+    jobs = await asyncio.to_thread(game.broadcaster.store.recent, 5)
+    if not jobs:
+        await message.answer("Рассылок ещё не было")
+        return
+    lines = [
+        f"#{job['id']} {job['status']}: отправлено {job['sent']}, "
+        f"заблокировали {job['blocked']}, ошибок {job['failed']}"
+        for job in jobs
+    ]
+    await message.answer("📣 <b>Рассылки</b>\n\n" + "\n".join(lines), parse_mode=ParseMode.HTML)
+
+def create_router() -> Router:
+    """Роутер с обработчиками бота
+
+    Зависимости обработчики получают из данных диспетчера (Dispatcher(game=...)),
+    поэтому роутер создаётся на каждое приложение, а не при импорте модуля.
+    """
+    router = Router()
+    # Время и ошибки каждого обработчика
+    router.message.middleware(HandlerMetricsMiddleware())
+    router.callback_query.middleware(HandlerMetricsMiddleware())
+
+    # Порядок регистрации - порядок проверки фильтров
+    router.message.register(start_command, CommandStart())
+    # Команды администратора - раньше обработчика ввода имени (F.text)
+    router.message.register(broadcast_command, Command("broadcast"))
+    router.message.register(broadcast_status_command, Command("broadcast_status"))
+    router.callback_query.register(set_name_handler, F.data == "set_name")
+    router.callback_query.register(change_name_handler, F.data == "change_name")
+    router.message.register(handle_name_input, F.text)
+    router.callback_query.register(stats_handler, F.data == "stats")
+    router.callback_query.register(top_handler, F.data == "top")
+    router.callback_query.register(window_top_handler, F.data.startswith("top:"))
+    router.callback_query.register(top_page_handler, F.data.startswith("top_page:"))
+    router.callback_query.register(top_around_handler, F.data == "top_me")
+    router.callback_query.register(play_handler, F.data == "play")
+    router.message.register(handle_web_app_data, F.web_app_data)
+    router.message.register(help_command, Command("help"))
+    return router
@@ -0,0 +1,407 @@
+import json
+import logging
+import queue
+import struct
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from storage import TapStorage
+
+logger = logging.getLogger(__name__)
+
+# Методы хранилища, которые можно вызвать по IPC
+REMOTE_METHODS = frozenset((
+    'get_player', 'read_player', 'rehydrate_player', 'create_player', 'save_player', 'set_username', 'add_tap', 'add_taps_bulk',
+    'buy_upgrade', 'set_display_name', 'suggest_names', 'get_top_players', 'get_top_page',
+    'get_players_around', 'get_player_rank',
+    'get_window_top', 'get_window_rank', 'get_global_stats', 'list_user_ids', 'get_cache_stats',
+    'reconcile_global_stats', 'settle_income', 'compact_windows', 'archive_inactive', 'import_players',
+))
+# Записи одного игрока: выполняются под блокировкой его шарда
+PLAYER_WRITES = frozenset((
+    'create_player', 'rehydrate_player', 'set_username', 'add_tap', 'buy_upgrade', 'set_display_name',
+))
+# Записи, затрагивающие все шарды
+GLOBAL_WRITES = frozenset(('reconcile_global_stats', 'settle_income', 'compact_windows', 'import_players'))
+
+# Снимок в разделяемой памяти: [seq: u64][длина: u32][JSON]
+SNAPSHOT_HEADER = struct.Struct('<QI')
+SNAPSHOT_SIZE = 1 << 20
+# Сколько игроков топа публикуется в снимке
+SNAPSHOT_TOP = 100
+
+
+class StorageServer:
+    """Процесс-писатель: единственный владелец хранилища, обслуживает воркеров
+
+    Каждое соединение обслуживает свой поток; записи одного шарда идут
+    под его блокировкой, как у потоков-писателей AsyncTapDatabase.
+    """
+
+    def __init__(self, storage: TapStorage, address: str, authkey: bytes):
+        self.storage = storage
+        self.address = address
+        self.authkey = authkey
+        self._shard_locks = [threading.Lock() for _ in range(storage.shard_count)]
+        self._listener: Optional[Listener] = None
+        self.requests = 0
+
+    def start(self):
+        """Начать принимать соединения в фоновом потоке"""
+        self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        threading.Thread(target=self._accept_loop, name="ipc-accept", daemon=True).start()
+        logger.info(f"Писатель принимает соединения на {self.address}")
+
+    def _accept_loop(self):
+        """Принимать соединения воркеров"""
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError) as e:
+                if self._listener is None:
+                    return
+                logger.warning(f"Ошибка подключения воркера: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name="ipc-conn", daemon=True).start()
+
+    def _serve(self, conn: Connection):
+        """Обработать запросы одного соединения до его закрытия"""
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    result = ('ok', self.call(method, args))
+                except Exception as e:
+                    result = ('error', type(e).__name__, str(e))
+                try:
+                    conn.send(result)
+                except (OSError, ValueError):
+                    return
+
+    def call(self, method: str, args: tuple):
+        """Выполнить метод хранилища с нужными блокировками"""
+        if method not in REMOTE_METHODS:
+            raise ValueError(f"Метод {method} недоступен по IPC")
+        self.requests += 1
+        func = getattr(self.storage, method)
+
+        if method in PLAYER_WRITES:
+            with self._shard_locks[self.storage.shard_of(args[0])]:
+                return func(*args)
+        if method == 'get_player':
+            # Чтение без блокировки; перенос из холодного слоя - под блокировкой шарда
+            player, cold = self.storage.read_player(*args)
+            if not cold:
+                return player
+            with self._shard_locks[self.storage.shard_of(args[0])]:
+                return self.storage.rehydrate_player(*args)
+        if method == 'save_player':
+            with self._shard_locks[self.storage.shard_of(args[0]['user_id'])]:
+                return func(*args)
+        if method == 'add_taps_bulk':
+            for shard, group in self.storage.split_by_shard(args[0]).items():
+                with self._shard_locks[shard]:
+                    func(group)
+            return None
+        if method == 'archive_inactive':
+            # Шард за шардом под его блокировкой: записи других шардов не ждут
+            inactive_days, batch_size, shard = args
+            archived = 0
+            for shard in range(self.storage.shard_count) if shard is None else [shard]:
+                with self._shard_locks[shard]:
+                    archived += func(inactive_days, batch_size, shard)['archived']
+            return {'archived': archived}
+        if method in GLOBAL_WRITES:
+            with self._all_shards():
+                return func(*args)
+        return func(*args)
+
+    @contextmanager
+    def _all_shards(self):
+        """Блокировки всех шардов (всегда в одном порядке)"""
+        with ExitStack() as stack:
+            for lock in self._shard_locks:
+                stack.enter_context(lock)
+            yield
+
+    def stop(self):
+        """Перестать принимать соединения и дождаться начатых записей"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+        with self._all_shards():
+            pass
+
+
+class SharedSnapshot:
+    """Топ и общая статистика в разделяемой памяти: читаются воркерами без IPC
+
+    Запись защищена seqlock: писатель делает seq нечётным, пишет данные и
+    делает seq чётным; читатель повторяет чтение, если seq нечётен или
+    изменился за время копирования.
+    """
+
+    def __init__(self, name: Optional[str] = None, create: bool = False, size: int = SNAPSHOT_SIZE):
+        self.shm = SharedMemory(name=name, create=create, size=size if create else 0)
+        if not create:
+            # Иначе resource_tracker воркера удалит сегмент при его выходе
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.name = self.shm.name
+        # Продолжаем нумерацию: перезапущенный писатель не должен повторить seq из кэша читателей
+        self._seq = (SNAPSHOT_HEADER.unpack_from(self.shm.buf, 0)[0] + 1) // 2
+        self._cached: Tuple[int, Optional[Dict]] = (0, None)
+
+    def publish(self, data: Dict):
+        """Записать новый снимок (вызывает только писатель)"""
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+        limit = self.shm.size - SNAPSHOT_HEADER.size
+        if len(payload) > limit:
+            raise ValueError(f"Снимок {len(payload)} байт не помещается в {limit}")
+        buf = self.shm.buf
+        self._seq += 1
+        SNAPSHOT_HEADER.pack_into(buf, 0, self._seq * 2 - 1, len(payload))
+        buf[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + len(payload)] = payload
+        SNAPSHOT_HEADER.pack_into(buf, 0, self._seq * 2, len(payload))
+
+    def read(self, attempts: int = 5) -> Optional[Dict]:
+        """Последний целый снимок или None"""
+        buf = self.shm.buf
+        for _ in range(attempts):
+            seq, length = SNAPSHOT_HEADER.unpack_from(buf, 0)
+            if seq == 0:
+                return None
+            if seq % 2:
+                continue
+            cached_seq, cached = self._cached
+            if seq == cached_seq:
+                return cached
+            payload = bytes(buf[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length])
+            if SNAPSHOT_HEADER.unpack_from(buf, 0)[0] != seq:
+                continue
+            data = json.loads(payload)
+            self._cached = (seq, data)
+            return data
+        return None
+
+    def close(self, unlink: bool = False):
+        """Отсоединиться от сегмента (и удалить его - владельцу)"""
+        self._cached = (0, None)
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def publish_snapshots(storage: TapStorage, snapshot: SharedSnapshot, interval: float, stop: threading.Event):
+    """Цикл писателя: раз в interval публиковать топ и общую статистику"""
+    while not stop.is_set():
+        try:
+            snapshot.publish({
+                'published_at': time.time(),
+                'top': storage.get_top_players(SNAPSHOT_TOP),
+                'stats': storage.get_global_stats()
+            })
+        except Exception as e:
+            logger.error(f"Ошибка публикации снимка: {e}")
+        stop.wait(interval)
+
+
+class RemoteError(Exception):
+    """Исключение, возникшее в процессе-писателе"""
+
+
+class RemoteStorage(TapStorage):
+    """Хранилище воркера: вызовы уходят процессу-писателю по Unix-сокету
+
+    Топ и общая статистика читаются из SharedSnapshot, пока он свежий.
+    """
+
+    def __init__(self, address: str, authkey: bytes, snapshot_name: str = "",
+                 connections: int = 8, snapshot_max_age: float = 5.0, acquire_timeout: float = 10.0):
+        self.address = address
+        self.authkey = authkey
+        self.connections = connections
+        # Сколько ждать свободного соединения, когда все заняты (писатель завис или перегружен)
+        self.acquire_timeout = acquire_timeout
+        self.snapshot_max_age = snapshot_max_age
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.snapshot = SharedSnapshot(snapshot_name) if snapshot_name else None
+
+    @property
+    def reader_threads(self) -> int:
+        """По потоку на соединение с писателем"""
+        return self.connections
+
+    def _acquire(self) -> Connection:
+        """Свободное соединение (или новое, пока не достигнут лимит)"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.connections:
+                self._created += 1
+                try:
+                    return Client(self.address, family='AF_UNIX', authkey=self.authkey)
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Нет свободного соединения с писателем за {self.acquire_timeout} с") from None
+
+    def _call(self, method: str, *args):
+        """Вызвать метод хранилища в процессе-писателе"""
+        conn = self._acquire()
+        try:
+            conn.send((method, args))
+            reply = conn.recv()
+        except Exception:
+            # Соединение в неизвестном состоянии - не возвращаем его в пул
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            raise
+        self._idle.put(conn)
+        if reply[0] == 'error':
+            raise RemoteError(f"{reply[1]}: {reply[2]}")
+        return reply[1]
+
+    def _fresh_snapshot(self) -> Optional[Dict]:
+        """Снимок из разделяемой памяти, если он не устарел"""
+        if self.snapshot is None:
+            return None
+        data = self.snapshot.read()
+        if data is None or time.time() - data['published_at'] > self.snapshot_max_age:
+            return None
+        return data
+
+    def close(self):
+        """Закрыть соединения с писателем"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+    def get_player(self, user_id: int) -> Dict:
+        """Получить данные игрока"""
+        return self._call('get_player', user_id)
+
+    def read_player(self, user_id: int) -> Tuple[Dict, bool]:
+        """Данные игрока без записи и в холодном ли он слое"""
+        return tuple(self._call('read_player', user_id))
+
+    def rehydrate_player(self, user_id: int) -> Dict:
+        """Вернуть игрока из холодного слоя"""
+        return self._call('rehydrate_player', user_id)
+
+    def create_player(self, user_id: int, username: str = "") -> Dict:
+        """Создать нового игрока"""
+        return self._call('create_player', user_id, username)
+
+    def save_player(self, player_data: Dict) -> bool:
+        """Сохранить данные игрока"""
+        return self._call('save_player', player_data)
+
+    def set_username(self, user_id: int, username: str) -> bool:
+        """Обновить username, не трогая монеты"""
+        return self._call('set_username', user_id, username)
+
+    def add_tap(self, user_id: int, taps: int = 1) -> Dict:
+        """Добавить тап игроку"""
+        return self._call('add_tap', user_id, taps)
+
+    def add_taps_bulk(self, deltas: List[Tuple[int, int]]):
+        """Начислить тапы пачке игроков"""
+        return self._call('add_taps_bulk', list(deltas))
+
+    def buy_upgrade(self, user_id: int, upgrade: str) -> Dict:
+        """Купить уровень улучшения"""
+        return self._call('buy_upgrade', user_id, upgrade)
+
+    def set_display_name(self, user_id: int, display_name: str) -> bool:
+        """Установить отображаемое имя"""
+        return self._call('set_display_name', user_id, display_name)
+
+    def suggest_names(self, display_name: str, count: int = 3, user_id: int = 0) -> Dict:
+        """Свободно ли имя и какие похожие свободны"""
+        return self._call('suggest_names', display_name, count, user_id)
+
+    def get_top_players(self, limit: int = 10) -> List[Dict]:
+        """Топ игроков: из снимка, если в нём хватает строк"""
+        data = self._fresh_snapshot()
+        if data is not None and (limit <= len(data['top']) or len(data['top']) < SNAPSHOT_TOP):
+            return data['top'][:limit]
+        return self._call('get_top_players', limit)
+
+    def get_top_page(self, after: Optional[Tuple[int, int]] = None, before: Optional[Tuple[int, int]] = None,
+                     limit: int = 10) -> List[Dict]:
+        """Страница топа по курсору; первая - из снимка, как get_top_players"""
+        if after is None and before is None:
+            return self.get_top_players(limit)
+        return self._call('get_top_page', after, before, limit)
+
+    def get_players_around(self, user_id: int, radius: int = 5) -> List[Dict]:
+        """Игрок и его соседи в топе"""
+        return self._call('get_players_around', user_id, radius)
+
+    def get_player_rank(self, user_id: int) -> int:
+        """Получить ранг игрока"""
+        return self._call('get_player_rank', user_id)
+
+    def get_window_top(self, window: str, limit: int = 10) -> List[Dict]:
+        """Топ игроков по тапам за текущий период"""
+        return self._call('get_window_top', window, limit)
+
+    def get_window_rank(self, window: str, user_id: int) -> Dict:
+        """Ранг и тапы игрока за текущий период"""
+        return self._call('get_window_rank', window, user_id)
+
+    def get_global_stats(self) -> Dict:
+        """Общая статистика: из снимка, если он свежий"""
+        data = self._fresh_snapshot()
+        if data is not None:
+            return dict(data['stats'])
+        return self._call('get_global_stats')
+
+    def list_user_ids(self, after_user_id: int = 0, limit: int = 1000) -> List[int]:
+        """Страница user_id по возрастанию"""
+        return self._call('list_user_ids', after_user_id, limit)
+
+    def get_cache_stats(self) -> Dict:
+        """Статистика кэшей хранилища писателя"""
+        return self._call('get_cache_stats')
+
+    def reconcile_global_stats(self) -> Dict:
+        """Пересчитать общую статистику"""
+        return self._call('reconcile_global_stats')
+
+    def settle_income(self) -> int:
+        """Зачислить накопленный пассивный доход"""
+        return self._call('settle_income')
+
+    def compact_windows(self) -> Dict:
+        """Свернуть и удалить устаревшие корзины тапов"""
+        return self._call('compact_windows')
+
+    def archive_inactive(self, inactive_days: float = 30, batch_size: int = 5000,
+                         shard: Optional[int] = None) -> Dict:
+        """Перенести неактивных игроков в холодный слой"""
+        return self._call('archive_inactive', inactive_days, batch_size, shard)
+
+    def import_players(self, rows: Iterable[Tuple]) -> int:
+        """Вставить готовые строки игроков"""
+        return self._call('import_players', list(rows))
@@ -0,0 +1,145 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+# Ранг игрока без монет (как и в SQL-версии)
+NO_RANK = 999
+
+
+def parse_cursor(value) -> Optional[Tuple[int, int]]:
+    """Курсор страницы топа из "coins:user_id" или [coins, user_id]; пустой - None"""
+    if value in (None, '', []):
+        return None
+    parts = value.split(':') if isinstance(value, str) else value
+    if len(parts) != 2:
+        raise ValueError(f"Некорректный курсор: {value!r}")
+    return int(parts[0]), int(parts[1])
+
+
+def page_cursors(rows: List[Dict]) -> Dict:
+    """Курсоры соседних страниц для строк топа: {'prev': [coins, user_id] или None, 'next': ...}"""
+    if not rows:
+        return {'prev': None, 'next': None}
+    first, last = rows[0], rows[-1]
+    return {
+        'prev': [first['coins'], first['user_id']] if first['rank'] > 1 else None,
+        'next': [last['coins'], last['user_id']]
+    }
+
+
+class Leaderboard:
+    """Таблица лидеров в памяти: ранг и топ-N за O(log n)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._coins: Dict[int, int] = {}
+        self._taps: Dict[int, int] = {}
+        self._names: Dict[int, str] = {}
+        # Мультимножество монет всех игроков - для ранга
+        self._all = SortedList()
+        # (-coins, user_id) игроков с именем - для топа
+        self._named = SortedList()
+
+    def __len__(self) -> int:
+        return len(self._coins)
+
+    def load(self, rows: Iterable):
+        """Заполнить таблицу строками (user_id, display_name, coins, total_taps)"""
+        with self._lock:
+            for user_id, display_name, coins, total_taps in rows:
+                self._set(user_id, coins or 0, total_taps or 0, display_name or '')
+
+    def _set(self, user_id: int, coins: int, total_taps: int, display_name: Optional[str]):
+        """Записать абсолютные значения игрока (вызывать под блокировкой)"""
+        old = self._coins.get(user_id)
+        if old is not None:
+            self._all.remove(old)
+            if user_id in self._names:
+                self._named.remove((-old, user_id))
+
+        if display_name is not None:
+            if display_name:
+                self._names[user_id] = display_name
+            else:
+                self._names.pop(user_id, None)
+
+        self._coins[user_id] = coins
+        self._taps[user_id] = total_taps
+        self._all.add(coins)
+        if user_id in self._names:
+            self._named.add((-coins, user_id))
+
+    def add_player(self, user_id: int):
+        """Учесть нового игрока с нулём монет"""
+        with self._lock:
+            if user_id not in self._coins:
+                self._set(user_id, 0, 0, None)
+
+    def set_player(self, user_id: int, coins: int, total_taps: int, display_name: Optional[str] = None):
+        """Перезаписать монеты (и имя, если передано) игрока"""
+        with self._lock:
+            self._set(user_id, coins, total_taps, display_name)
+
+    def update(self, rows: Iterable):
+        """Перезаписать монеты и тапы строками (user_id, coins, total_taps), не трогая имена"""
+        with self._lock:
+            for user_id, coins, total_taps in rows:
+                self._set(user_id, coins, total_taps, None)
+
+    def set_name(self, user_id: int, display_name: str):
+        """Обновить отображаемое имя"""
+        with self._lock:
+            coins = self._coins.get(user_id, 0)
+            self._set(user_id, coins, self._taps.get(user_id, 0), display_name)
+
+    def rank(self, user_id: int, coins: Optional[int] = None) -> int:
+        """Ранг = число игроков с большим количеством монет + 1
+
+        coins - монеты игрока с ещё не зачисленным доходом, если известны.
+        """
+        with self._lock:
+            if coins is None:
+                coins = self._coins.get(user_id, 0)
+            if not coins:
+                return NO_RANK
+            return len(self._all) - self._all.bisect_right(coins) + 1
+
+    def _rows(self, start: int, stop: int) -> List[Dict]:
+        """Строки топа с позиции start по stop (вызывать под блокировкой)"""
+        return [
+            {
+                'user_id': user_id,
+                'name': self._names[user_id],
+                'coins': -neg_coins,
+                'total_taps': self._taps[user_id],
+                'rank': idx
+            }
+            for idx, (neg_coins, user_id) in enumerate(self._named.islice(max(start, 0), stop), max(start, 0) + 1)
+        ]
+
+    def top(self, limit: int = 10) -> List[Dict]:
+        """Топ игроков с именем по убыванию монет"""
+        with self._lock:
+            return self._rows(0, limit)
+
+    def page(self, after: Optional[Tuple[int, int]] = None, before: Optional[Tuple[int, int]] = None,
+             limit: int = 10) -> List[Dict]:
+        """Страница топа после (или до) курсора (coins, user_id) - за O(log n + limit)"""
+        with self._lock:
+            if before is not None:
+                stop = self._named.bisect_left((-before[0], before[1]))
+                return self._rows(stop - limit, stop)
+            start = self._named.bisect_right((-after[0], after[1])) if after is not None else 0
+            return self._rows(start, start + limit)
+
+    def around(self, user_id: int, radius: int = 5) -> List[Dict]:
+        """Игрок и по radius соседей выше и ниже него в топе
+
+        Игрок без имени в топ не входит - тогда соседи берутся вокруг места,
+        где он стоял бы со своими монетами.
+        """
+        with self._lock:
+            position = self._named.bisect_left((-self._coins.get(user_id, 0), user_id))
+            own = 1 if user_id in self._names else 0
+            return self._rows(position - radius, position + own + radius)
@@ -0,0 +1,622 @@
+import calendar
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+import economy
+from leaderboard import Leaderboard
+from names import NameIndex
+from storage import TapStorage
+from windows import TapBuckets, WindowedLeaderboard, history_start
+
+logger = logging.getLogger(__name__)
+
+# Формат времени как у CURRENT_TIMESTAMP в SQLite (UTC)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def format_time(ts: float) -> str:
+    """Unix-время -> строка как в SQLite"""
+    return time.strftime(TIME_FORMAT, time.gmtime(ts))
+
+
+def parse_time(value) -> float:
+    """Строка времени из SQLite -> unix-время (пустое - текущее)"""
+    if not value:
+        return time.time()
+    return float(calendar.timegm(time.strptime(str(value)[:19], TIME_FORMAT)))
+
+
+class PlayerRecord:
+    """Игрок в памяти: __slots__ вместо dict экономят память на миллионах записей"""
+
+    __slots__ = ('user_id', 'username', 'display_name', 'coins', 'total_taps', 'created_at', 'last_active',
+                 'tap_power', 'income_per_hour', 'settled_at')
+
+    def __init__(self, user_id: int, username: str = '', display_name: Optional[str] = None,
+                 coins: int = 0, total_taps: int = 0, created_at: float = 0.0, last_active: float = 0.0,
+                 tap_power: int = 1, income_per_hour: int = 0, settled_at: Optional[float] = None):
+        self.user_id = user_id
+        self.username = username
+        self.display_name = display_name
+        self.coins = coins
+        self.total_taps = total_taps
+        self.created_at = created_at
+        self.last_active = last_active
+        self.tap_power = tap_power
+        self.income_per_hour = income_per_hour
+        self.settled_at = settled_at
+
+    def settle(self, now: float) -> int:
+        """Зачислить пассивный доход к моменту now; вернуть зачисленные монеты"""
+        coins = economy.accrued_income(self.income_per_hour, self.settled_at, now)
+        if coins:
+            self.coins += coins
+            self.settled_at += coins * economy.SECONDS_PER_HOUR / self.income_per_hour
+        return coins
+
+    def to_dict(self) -> Dict:
+        """Строка игрока в том же виде, что отдаёт TapDatabase"""
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'display_name': self.display_name,
+            'coins': self.coins,
+            'total_taps': self.total_taps,
+            'created_at': format_time(self.created_at),
+            'last_active': format_time(self.last_active),
+            'tap_power': self.tap_power,
+            'income_per_hour': self.income_per_hour,
+            'settled_at': self.settled_at
+        }
+
+    def to_row(self) -> list:
+        """Строка снимка"""
+        return [self.user_id, self.username, self.display_name, self.coins,
+                self.total_taps, self.created_at, self.last_active,
+                self.tap_power, self.income_per_hour, self.settled_at]
+
+
+class MemoryStorage(TapStorage):
+    """Хранилище целиком в памяти с журналом операций и снимками
+
+    Каждая запись сначала дописывается строкой JSON в журнал
+    <path>.<поколение>.log, а потом применяется к словарю игроков.
+    Раз в snapshot_every операций состояние сохраняется в <path>.snapshot,
+    и начинается журнал следующего поколения. При запуске загружается
+    снимок и проигрываются журналы его поколения и новее; оборванная
+    при падении последняя строка журнала отбрасывается.
+    """
+
+    inline_reads = True
+
+    def __init__(self, path: str = "tap_game.mem", snapshot_every: int = 100000,
+                 fsync_interval: float = 1.0, snapshot_on_close: bool = True):
+        self.path = path
+        self.snapshot_path = f"{path}.snapshot"
+        self.snapshot_every = snapshot_every
+        # fsync журнала не чаще раза в интервал: после падения процесса
+        # данные в ОС уже есть, при отключении питания теряется не больше интервала
+        self.fsync_interval = fsync_interval
+        self.snapshot_on_close = snapshot_on_close
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._players: Dict[int, PlayerRecord] = {}
+        # Нормализованное имя -> user_id: проверка уникальности без перебора игроков
+        self.names = NameIndex()
+        self._total_coins = 0
+        self._total_taps = 0
+        self.leaderboard = Leaderboard()
+        # Корзины тапов входят в снимок; рейтинги за период строятся из них при запуске
+        self.buckets = TapBuckets()
+        self.windows = WindowedLeaderboard()
+        # Игроки с пассивным доходом: массовое зачисление обходит только их
+        self._earners: Dict[int, PlayerRecord] = {}
+        # Упорядоченные user_id для постраничного обхода; строятся при первом обходе
+        self._user_ids: Optional[SortedList] = None
+        self._generation = 0
+        self._log = None
+        self._ops_since_snapshot = 0
+        self._last_sync = time.monotonic()
+        self._closed = False
+        self._recover()
+
+    def _log_path(self, generation: int) -> str:
+        """Файл журнала поколения"""
+        return f"{self.path}.{generation:06d}.log"
+
+    def _log_generations(self) -> List[int]:
+        """Поколения журналов на диске по возрастанию"""
+        generations = []
+        for log_path in glob.glob(glob.escape(self.path) + ".*.log"):
+            suffix = log_path[len(self.path) + 1:-len(".log")]
+            if suffix.isdigit():
+                generations.append(int(suffix))
+        return sorted(generations)
+
+    def _recover(self):
+        """Загрузить снимок и проиграть журналы после него"""
+        started = time.perf_counter()
+        generation = 0
+        if os.path.exists(self.snapshot_path):
+            generation = self._load_snapshot()
+
+        replayed = 0
+        logs = self._log_generations()
+        for log_generation in logs:
+            if log_generation < generation:
+                # Уже вошёл в снимок, но не был удалён до остановки
+                os.remove(self._log_path(log_generation))
+                continue
+            replayed += self._replay(log_generation, last=log_generation == logs[-1])
+            generation = log_generation
+
+        self._generation = generation
+        self._log = open(self._log_path(generation), 'a', encoding='utf-8')
+        self._ops_since_snapshot = replayed
+        self.leaderboard.load(
+            (record.user_id, record.display_name, record.coins, record.total_taps)
+            for record in self._players.values()
+        )
+        now = time.time()
+        self.windows.load_names(
+            (record.user_id, record.display_name) for record in self._players.values() if record.display_name
+        )
+        self.windows.load(self.buckets.rows(history_start(now)), now)
+        logger.info(
+            f"Хранилище в памяти загружено: {len(self._players)} игроков, "
+            f"операций из журнала: {replayed}, за {time.perf_counter() - started:.2f} с"
+        )
+
+    def _load_snapshot(self) -> int:
+        """Прочитать снимок; вернуть его поколение"""
+        with open(self.snapshot_path, encoding='utf-8') as snapshot:
+            header = json.loads(snapshot.readline())
+            # Сначала игроки, за ними корзины тапов (в снимках до рейтингов за период их нет)
+            for line in itertools.islice(snapshot, header['players']):
+                self._insert(PlayerRecord(*json.loads(line)))
+            for line in snapshot:
+                self.buckets.load(json.loads(line))
+        if len(self._players) != header['players']:
+            raise ValueError(f"Снимок {self.snapshot_path} повреждён: "
+                             f"{len(self._players)} игроков вместо {header['players']}")
+        return header['generation']
+
+    def _replay(self, generation: int, last: bool) -> int:
+        """Применить операции журнала; вернуть их число"""
+        log_path = self._log_path(generation)
+        applied = 0
+        offset = 0
+        with open(log_path, 'rb') as log:
+            for line in log:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("строка не дописана")
+                    op = json.loads(line)
+                except ValueError:
+                    if not last:
+                        raise ValueError(f"Журнал {log_path} повреждён на смещении {offset}")
+                    break
+                self._apply(op)
+                applied += 1
+                offset += len(line)
+
+        if offset != os.path.getsize(log_path):
+            logger.warning(f"Отброшен оборванный хвост журнала {log_path} со смещения {offset}")
+            with open(log_path, 'r+b') as log:
+                log.truncate(offset)
+        return applied
+
+    def _insert(self, record: PlayerRecord):
+        """Добавить запись игрока и учесть её в счётчиках"""
+        self._players[record.user_id] = record
+        if self._user_ids is not None:
+            self._user_ids.add(record.user_id)
+        if record.income_per_hour > 0:
+            self._earners[record.user_id] = record
+        self._total_coins += record.coins
+        self._total_taps += record.total_taps
+        # Имя, уже занятое после нормализации, остаётся у прежнего владельца
+        if record.display_name and self.names.reserve(record.user_id, record.display_name):
+            self.names.commit(record.user_id, record.display_name)
+
+    def _set_name(self, record: PlayerRecord, display_name: Optional[str]):
+        """Сменить имя игрока в записи и в индексе имён"""
+        record.display_name = display_name
+        self.names.commit(record.user_id, display_name or '')
+
+    def _apply(self, op: list):
+        """Применить операцию журнала к состоянию в памяти"""
+        kind = op[0]
+        if kind == 't':
+            # ['t', время, user_id, тапы, user_id, тапы, ...]
+            ts = op[1]
+            self.buckets.add(ts, zip(op[2::2], op[3::2]))
+            for idx in range(2, len(op), 2):
+                user_id, taps = op[idx], op[idx + 1]
+                record = self._players.get(user_id)
+                if record is None:
+                    self._insert(PlayerRecord(user_id, '', None, taps, taps, ts, ts))
+                    continue
+                coins = record.settle(ts) + taps * record.tap_power
+                record.coins += taps * record.tap_power
+                record.total_taps += taps
+                record.last_active = ts
+                self._total_coins += coins
+                self._total_taps += taps
+        elif kind == 'b':
+            # ['b', время, user_id, улучшение]: цена проверена до записи в журнал
+            _, ts, user_id, upgrade = op
+            record = self._players[user_id]
+            self._total_coins += record.settle(ts)
+            bought, price = economy.buy_upgrade(record.to_dict(), upgrade, ts)
+            record.coins -= price
+            record.tap_power = bought['tap_power']
+            record.income_per_hour = bought['income_per_hour']
+            record.settled_at = bought['settled_at']
+            record.last_active = ts
+            self._total_coins -= price
+            if record.income_per_hour > 0:
+                self._earners[user_id] = record
+        elif kind == 'e':
+            # ['e', время]: зачислить доход всем игрокам с доходом
+            ts = op[1]
+            for record in self._earners.values():
+                self._total_coins += record.settle(ts)
+        elif kind == 'w':
+            # ['w', время]: свернуть и удалить устаревшие корзины тапов
+            return self.buckets.compact(op[1])
+        elif kind == 'c':
+            _, user_id, username, ts = op
+            if user_id not in self._players:
+                self._insert(PlayerRecord(user_id, username, None, 0, 0, ts, ts))
+        elif kind == 's':
+            # Журналы до экономики пишут строку без её колонок
+            _, user_id, username, display_name, coins, total_taps, ts, *rest = op
+            tap_power, income_per_hour, settled_at = tuple(rest) + economy.ECONOMY_DEFAULTS[len(rest):]
+            record = self._players.get(user_id)
+            if record is None:
+                self._insert(PlayerRecord(user_id, username, display_name, coins, total_taps, ts, ts,
+                                          tap_power, income_per_hour, settled_at))
+                return
+            self._total_coins += coins - record.coins
+            self._total_taps += total_taps - record.total_taps
+            record.username = username
+            record.coins = coins
+            record.total_taps = total_taps
+            record.last_active = ts
+            record.tap_power = tap_power
+            record.income_per_hour = income_per_hour
+            record.settled_at = settled_at
+            if income_per_hour > 0:
+                self._earners[user_id] = record
+            else:
+                self._earners.pop(user_id, None)
+            self._set_name(record, display_name)
+        elif kind == 'u':
+            _, user_id, username, ts = op
+            record = self._players[user_id]
+            record.username = username
+            record.last_active = ts
+        elif kind == 'n':
+            _, user_id, display_name, ts = op
+            record = self._players[user_id]
+            self._set_name(record, display_name)
+            record.last_active = ts
+        elif kind == 'i':
+            self._insert(PlayerRecord(*op[1:]))
+        else:
+            raise ValueError(f"Неизвестная операция журнала: {kind}")
+
+    def _write(self, op: list):
+        """Дописать операцию в журнал и применить её; вернуть результат применения
+        (вызывать под блокировкой)"""
+        if self._closed:
+            raise RuntimeError("Хранилище закрыто")
+        # Сначала журнал: если запись на диск упала, состояние не меняется
+        self._log.write(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._log.flush()
+        result = self._apply(op)
+        self._ops_since_snapshot += 1
+
+        now = time.monotonic()
+        if now - self._last_sync >= self.fsync_interval:
+            os.fsync(self._log.fileno())
+            self._last_sync = now
+        return result
+
+    def _after_write(self):
+        """Снимок, если журнал вырос до snapshot_every операций"""
+        if self.snapshot_every and self._ops_since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self) -> int:
+        """Сохранить снимок и начать новое поколение журнала; вернуть число игроков"""
+        with self._snapshot_lock:
+            with self._lock:
+                rows = [record.to_row() for record in self._players.values()]
+                buckets = list(self.buckets.dump())
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._log.close()
+                self._generation += 1
+                generation = self._generation
+                self._log = open(self._log_path(generation), 'a', encoding='utf-8')
+                self._ops_since_snapshot = 0
+
+            # Файл пишется без блокировки: чтение и запись продолжаются в новое поколение
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as snapshot:
+                snapshot.write(json.dumps({
+                    'generation': generation, 'players': len(rows), 'buckets': len(buckets)
+                }) + '\n')
+                for row in rows + buckets:
+                    snapshot.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n')
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            for log_generation in self._log_generations():
+                if log_generation < generation:
+                    os.remove(self._log_path(log_generation))
+
+        logger.info(f"Снимок хранилища: {len(rows)} игроков, поколение {generation}")
+        return len(rows)
+
+    def sync(self):
+        """Сбросить журнал на диск"""
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        """Сохранить снимок (или сбросить журнал) и закрыть файлы"""
+        if self._closed:
+            return
+        if self.snapshot_on_close and self._ops_since_snapshot:
+            self.snapshot()
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log.close()
+            self._closed = True
+
+    def cached_player(self, user_id: int) -> Optional[Dict]:
+        """Данные игрока - все они в памяти; доход досчитывается при чтении"""
+        with self._lock:
+            record = self._players.get(user_id)
+            return economy.settle(record.to_dict()) if record is not None else None
+
+    def get_player(self, user_id: int) -> Dict:
+        """Получить данные игрока"""
+        return self.cached_player(user_id) or {}
+
+    def create_player(self, user_id: int, username: str = "") -> Dict:
+        """Создать нового игрока"""
+        with self._lock:
+            if user_id not in self._players:
+                self._write(['c', user_id, username, time.time()])
+                self.leaderboard.add_player(user_id)
+            player = self._players[user_id].to_dict()
+        self._after_write()
+        return player
+
+    def save_player(self, player_data: Dict) -> bool:
+        """Сохранить данные игрока"""
+        try:
+            display_name = player_data.get('display_name', '')
+            coins = player_data.get('coins', 0)
+            total_taps = player_data.get('total_taps', 0)
+            with self._lock:
+                if display_name and not self.names.is_available(display_name, player_data['user_id']):
+                    logger.error(f"Ошибка сохранения: имя {display_name!r} занято")
+                    return False
+                self._write(['s', player_data['user_id'], player_data.get('username', ''),
+                             display_name, coins, total_taps, time.time(),
+                             player_data.get('tap_power', 1), player_data.get('income_per_hour', 0),
+                             player_data.get('settled_at')])
+                self.leaderboard.set_player(player_data['user_id'], coins, total_taps, display_name or '')
+                self.windows.set_name(player_data['user_id'], display_name)
+            self._after_write()
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения: {e}")
+            return False
+
+    def set_username(self, user_id: int, username: str) -> bool:
+        """Обновить username, не трогая монеты"""
+        with self._lock:
+            if user_id not in self._players:
+                return False
+            self._write(['u', user_id, username, time.time()])
+        self._after_write()
+        return True
+
+    def add_tap(self, user_id: int, taps: int = 1) -> Dict:
+        """Добавить тап игроку"""
+        now = time.time()
+        with self._lock:
+            self._write(['t', now, user_id, taps])
+            record = self._players[user_id]
+            self.leaderboard.update([(user_id, record.coins, record.total_taps)])
+            self.windows.add([(user_id, taps)], now)
+            player = record.to_dict()
+        self._after_write()
+        return player
+
+    def add_taps_bulk(self, deltas: List[Tuple[int, int]]):
+        """Начислить тапы пачке игроков (user_id, delta) одной строкой журнала"""
+        if not deltas:
+            return
+        op = ['t', time.time()]
+        for user_id, taps in deltas:
+            op.append(user_id)
+            op.append(taps)
+        with self._lock:
+            self._write(op)
+            self.leaderboard.update(
+                (user_id, self._players[user_id].coins, self._players[user_id].total_taps)
+                for user_id, _ in deltas
+            )
+            self.windows.add(deltas, op[1])
+        self._after_write()
+
+    def buy_upgrade(self, user_id: int, upgrade: str) -> Dict:
+        """Купить уровень улучшения за монеты"""
+        now = time.time()
+        with self._lock:
+            record = self._players.get(user_id)
+            player = record.to_dict() if record is not None else {}
+            bought, price = economy.buy_upgrade(player, upgrade, now)
+            if bought is None:
+                return {'success': False, 'price': price, 'player': economy.settle(player, now)}
+            self._write(['b', now, user_id, upgrade])
+            self.leaderboard.update([(user_id, record.coins, record.total_taps)])
+            player = record.to_dict()
+        self._after_write()
+        return {'success': True, 'price': price, 'player': player}
+
+    def set_display_name(self, user_id: int, display_name: str) -> bool:
+        """Установить отображаемое имя"""
+        try:
+            with self._lock:
+                # Проверка и запись под одной блокировкой - без гонки двух одинаковых имён
+                if not self.names.is_available(display_name, user_id):
+                    return False
+                if user_id in self._players:
+                    self._write(['n', user_id, display_name, time.time()])
+                    self.leaderboard.set_name(user_id, display_name)
+                    self.windows.set_name(user_id, display_name)
+            self._after_write()
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка установки имени: {e}")
+            return False
+
+    def suggest_names(self, display_name: str, count: int = 3, user_id: int = 0) -> Dict:
+        """Свободно ли имя и какие похожие свободны"""
+        return {
+            'available': self.names.is_available(display_name, user_id),
+            'suggestions': self.names.suggest(display_name, count, user_id)
+        }
+
+    def get_top_players(self, limit: int = 10) -> List[Dict]:
+        """Получить топ игроков"""
+        return self.leaderboard.top(limit)
+
+    def get_top_page(self, after: Optional[Tuple[int, int]] = None, before: Optional[Tuple[int, int]] = None,
+                     limit: int = 10) -> List[Dict]:
+        """Страница топа после (или до) курсора (coins, user_id)"""
+        return self.leaderboard.page(after, before, limit)
+
+    def get_players_around(self, user_id: int, radius: int = 5) -> List[Dict]:
+        """Игрок и по radius соседей выше и ниже него в топе"""
+        return self.leaderboard.around(user_id, radius)
+
+    def get_player_rank(self, user_id: int) -> int:
+        """Получить ранг игрока"""
+        # Свои монеты - с доходом на момент запроса, чужие - на последнее зачисление
+        player = self.cached_player(user_id) or {}
+        return self.leaderboard.rank(user_id, player.get('coins'))
+
+    def get_window_top(self, window: str, limit: int = 10) -> List[Dict]:
+        """Топ игроков по тапам за текущий период"""
+        return self.windows.top(window, limit)
+
+    def get_window_rank(self, window: str, user_id: int) -> Dict:
+        """Ранг и тапы игрока за текущий период"""
+        return self.windows.rank(window, user_id)
+
+    def get_global_stats(self) -> Dict:
+        """Общая статистика по всем игрокам"""
+        with self._lock:
+            return {
+                'total_players': len(self._players),
+                'total_coins': self._total_coins,
+                'total_taps': self._total_taps
+            }
+
+    def list_user_ids(self, after_user_id: int = 0, limit: int = 1000) -> List[int]:
+        """Страница user_id по возрастанию после after_user_id"""
+        with self._lock:
+            if self._user_ids is None:
+                self._user_ids = SortedList(self._players)
+            return list(itertools.islice(
+                self._user_ids.irange(after_user_id, inclusive=(False, True)), limit
+            ))
+
+    def get_cache_stats(self) -> Dict:
+        """Размер хранилища и журнала"""
+        with self._lock:
+            return {
+                'players': {'size': len(self._players)},
+                'log': {'generation': self._generation, 'ops': self._ops_since_snapshot}
+            }
+
+    def reconcile_global_stats(self) -> Dict:
+        """Пересчитать статистику по игрокам и исправить расхождение"""
+        with self._lock:
+            cached = (self._total_coins, self._total_taps)
+            actual = (
+                sum(record.coins for record in self._players.values()),
+                sum(record.total_taps for record in self._players.values())
+            )
+            if cached != actual:
+                self._total_coins, self._total_taps = actual
+                logger.warning(f"Общая статистика хранилища расходилась: {cached} -> {actual}")
+        return self.get_global_stats()
+
+    def settle_income(self) -> int:
+        """Зачислить пассивный доход одной строкой журнала"""
+        now = time.time()
+        with self._lock:
+            settled = [
+                record for record in self._earners.values()
+                if economy.accrued_income(record.income_per_hour, record.settled_at, now)
+            ]
+            if not settled:
+                return 0
+            self._write(['e', now])
+            self.leaderboard.update((record.user_id, record.coins, record.total_taps) for record in settled)
+        self._after_write()
+        return len(settled)
+
+    def compact_windows(self) -> Dict:
+        """Свернуть и удалить устаревшие корзины тапов одной строкой журнала"""
+        with self._lock:
+            result = self._write(['w', time.time()])
+        self._after_write()
+        return result
+
+    def archive_inactive(self, inactive_days: float = 30, batch_size: int = 5000,
+                         shard: Optional[int] = None) -> Dict:
+        """Холодного слоя нет: игроки и так в памяти, запросы к ним не сканируют таблиц"""
+        return {'archived': 0}
+
+    def import_players(self, rows: Iterable[Tuple]) -> int:
+        """Вставить готовые строки (user_id, username, display_name, coins,
+        total_taps, created_at, last_active) - для миграций"""
+        imported = 0
+        with self._lock:
+            for row in rows:
+                # Строки без колонок экономики получают значения нового игрока
+                (user_id, username, display_name, coins, total_taps, created_at, last_active,
+                 tap_power, income_per_hour, settled_at) = tuple(row) + economy.ECONOMY_DEFAULTS[len(row) - 7:]
+                if user_id in self._players:
+                    raise ValueError(f"Игрок {user_id} уже есть в хранилище")
+                self._write(['i', user_id, username or '', display_name, coins or 0, total_taps or 0,
+                             parse_time(created_at), parse_time(last_active),
+                             tap_power, income_per_hour, settled_at])
+                self.leaderboard.load([(user_id, display_name, coins, total_taps)])
+                self.windows.set_name(user_id, display_name)
+                imported += 1
+        self._after_write()
+        return imported
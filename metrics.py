@@ -0,0 +1,371 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from storage import TapStorage
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value) -> str:
+    """Значение метки с экранированием \\, " и перевода строки"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    """Метки в формате Prometheus: {name="value",...}"""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        """Прибавить amount к счётчику с метками labels"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        """Текущее значение"""
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        """Строки экспозиции"""
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, как в Prometheus"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> [число наблюдений по корзинам (последняя - +Inf), сумма, количество]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        """Учесть одно наблюдение"""
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels) -> 'Timer':
+        """Контекстный менеджер, замеряющий блок with"""
+        return Timer(self, labels)
+
+    def count(self, *labels) -> int:
+        """Число наблюдений"""
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def samples(self) -> Iterable[str]:
+        """Строки экспозиции: накопленные корзины, сумма и количество"""
+        with self._lock:
+            items = [(labels, list(state[0]), state[1], state[2]) for labels, state in self._values.items()]
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {count}"
+
+
+class Timer:
+    """Замер длительности блока with в гистограмму"""
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Collected:
+    """Значения, которые в момент экспозиции отдаёт функция (размеры очередей, кэши)"""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        """Строки экспозиции"""
+        for labels, value in self.collect().items():
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class MetricsRegistry:
+    """Набор метрик процесса и их текстовая экспозиция"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory: Callable[[], Any]):
+        """Одна метрика на имя: модули могут объявлять её независимо"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Счётчик по имени"""
+        return self._get_or_create(name, lambda: Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Гистограмма по имени"""
+        return self._get_or_create(name, lambda: Histogram(name, documentation, labelnames, buckets))
+
+    def collected(self, name: str, documentation: str, collect: Callable[[], Dict[Tuple, float]],
+                  labelnames: Tuple[str, ...] = (), kind: str = 'gauge') -> Collected:
+        """Метрика, значения которой вычисляются при каждом чтении"""
+        metric = Collected(name, documentation, kind, labelnames, collect)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрики {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+# Реестр процесса: метрики объявляются в модулях, где их считают
+REGISTRY = MetricsRegistry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds", "Время обработки апдейта обработчиком aiogram", ("handler",)
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках aiogram", ("handler",)
+)
+DB_SECONDS = REGISTRY.histogram(
+    "db_operation_seconds", "Время операции хранилища в потоке БД", ("operation",)
+)
+DB_ERRORS = REGISTRY.counter(
+    "db_operation_errors_total", "Исключения в операциях хранилища", ("operation",)
+)
+
+
+class HandlerMetricsMiddleware:
+    """Внутренний middleware роутера: гистограмма задержек по обработчикам
+
+    aiogram принимает любой callable с сигнатурой middleware, поэтому модуль
+    не импортирует aiogram: API и инструменты подключают метрики без него.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class InstrumentedStorage(TapStorage):
+    """Обёртка над хранилищем: время и ошибки каждой операции"""
+
+    def __init__(self, storage: TapStorage):
+        self.storage = storage
+        self.inline_reads = storage.inline_reads
+
+    @property
+    def shard_count(self) -> int:
+        """Число независимых писателей"""
+        return self.storage.shard_count
+
+    @property
+    def reader_threads(self) -> int:
+        """Сколько потоков чтения имеет смысл держать"""
+        return self.storage.reader_threads
+
+    def shard_of(self, user_id: int) -> int:
+        """Номер шарда игрока"""
+        return self.storage.shard_of(user_id)
+
+    def _call(self, operation: str, func: Callable, *args):
+        """Вызвать метод хранилища, записав время и ошибку"""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception:
+            DB_ERRORS.inc(operation)
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, operation)
+
+    def cached_player(self, user_id: int) -> Optional[Dict]:
+        """Данные игрока без обращения к диску (не замеряется - это попадание в кэш)"""
+        return self.storage.cached_player(user_id)
+
+    def close(self):
+        """Закрыть хранилище"""
+        self.storage.close()
+
+    def get_player(self, user_id: int) -> Dict:
+        """Получить данные игрока"""
+        return self._call('get_player', self.storage.get_player, user_id)
+
+    def read_player(self, user_id: int) -> Tuple[Dict, bool]:
+        """Данные игрока без записи (замеряется как get_player)"""
+        return self._call('get_player', self.storage.read_player, user_id)
+
+    def rehydrate_player(self, user_id: int) -> Dict:
+        """Вернуть игрока из холодного слоя"""
+        return self._call('rehydrate_player', self.storage.rehydrate_player, user_id)
+
+    def create_player(self, user_id: int, username: str = "") -> Dict:
+        """Создать нового игрока"""
+        return self._call('create_player', self.storage.create_player, user_id, username)
+
+    def save_player(self, player_data: Dict) -> bool:
+        """Сохранить данные игрока"""
+        return self._call('save_player', self.storage.save_player, player_data)
+
+    def set_username(self, user_id: int, username: str) -> bool:
+        """Обновить username, не трогая монеты"""
+        return self._call('set_username', self.storage.set_username, user_id, username)
+
+    def add_tap(self, user_id: int, taps: int = 1) -> Dict:
+        """Добавить тап игроку"""
+        return self._call('add_tap', self.storage.add_tap, user_id, taps)
+
+    def add_taps_bulk(self, deltas: List[Tuple[int, int]]):
+        """Начислить тапы пачке игроков"""
+        return self._call('add_taps_bulk', self.storage.add_taps_bulk, deltas)
+
+    def buy_upgrade(self, user_id: int, upgrade: str) -> Dict:
+        """Купить уровень улучшения"""
+        return self._call('buy_upgrade', self.storage.buy_upgrade, user_id, upgrade)
+
+    def set_display_name(self, user_id: int, display_name: str) -> bool:
+        """Установить отображаемое имя"""
+        return self._call('set_display_name', self.storage.set_display_name, user_id, display_name)
+
+    def suggest_names(self, display_name: str, count: int = 3, user_id: int = 0) -> Dict:
+        """Свободно ли имя и какие похожие свободны"""
+        return self._call('suggest_names', self.storage.suggest_names, display_name, count, user_id)
+
+    def get_top_players(self, limit: int = 10) -> List[Dict]:
+        """Получить топ игроков"""
+        return self._call('get_top_players', self.storage.get_top_players, limit)
+
+    def get_player_rank(self, user_id: int) -> int:
+        """Получить ранг игрока"""
+        return self._call('get_player_rank', self.storage.get_player_rank, user_id)
+
+    def get_top_page(self, after: Optional[Tuple[int, int]] = None, before: Optional[Tuple[int, int]] = None,
+                     limit: int = 10) -> List[Dict]:
+        """Страница топа по курсору"""
+        return self._call('get_top_page', self.storage.get_top_page, after, before, limit)
+
+    def get_players_around(self, user_id: int, radius: int = 5) -> List[Dict]:
+        """Игрок и его соседи в топе"""
+        return self._call('get_players_around', self.storage.get_players_around, user_id, radius)
+
+    def get_window_top(self, window: str, limit: int = 10) -> List[Dict]:
+        """Топ игроков по тапам за текущий период"""
+        return self._call('get_window_top', self.storage.get_window_top, window, limit)
+
+    def get_window_rank(self, window: str, user_id: int) -> Dict:
+        """Ранг и тапы игрока за текущий период"""
+        return self._call('get_window_rank', self.storage.get_window_rank, window, user_id)
+
+    def get_global_stats(self) -> Dict:
+        """Общая статистика по всем игрокам"""
+        return self._call('get_global_stats', self.storage.get_global_stats)
+
+    def list_user_ids(self, after_user_id: int = 0, limit: int = 1000) -> List[int]:
+        """Страница user_id по возрастанию"""
+        return self._call('list_user_ids', self.storage.list_user_ids, after_user_id, limit)
+
+    def get_cache_stats(self) -> Dict:
+        """Статистика кэшей хранилища"""
+        return self.storage.get_cache_stats()
+
+    def reconcile_global_stats(self) -> Dict:
+        """Пересчитать общую статистику"""
+        return self._call('reconcile_global_stats', self.storage.reconcile_global_stats)
+
+    def settle_income(self) -> int:
+        """Зачислить накопленный пассивный доход"""
+        return self._call('settle_income', self.storage.settle_income)
+
+    def compact_windows(self) -> Dict:
+        """Свернуть и удалить устаревшие корзины тапов"""
+        return self._call('compact_windows', self.storage.compact_windows)
+
+    def archive_inactive(self, inactive_days: float = 30, batch_size: int = 5000,
+                         shard: Optional[int] = None) -> Dict:
+        """Перенести неактивных игроков в холодный слой"""
+        return self._call('archive_inactive', self.storage.archive_inactive, inactive_days, batch_size, shard)
+
+    def import_players(self, rows: Iterable[Tuple]) -> int:
+        """Вставить готовые строки игроков"""
+        return self._call('import_players', self.storage.import_players, rows)
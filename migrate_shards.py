@@ -0,0 +1,102 @@
+"""Разбить базу игроков на файлы-шарды
+
+Читает players из исходной базы и раскладывает строки по шардам так же,
+как TapDatabase(shards=N): tap_game.db -> tap_game.0.db ... tap_game.N-1.db.
+Исходный файл не изменяется. После миграции запустите бота с DB_SHARDS=N.
+
+    python migrate_shards.py --source tap_game.db --shards 4
+"""
+import argparse
+import logging
+import sqlite3
+import sys
+
+from database import SQL_GLOBAL_STATS, SQL_GLOBAL_STATS_ALL, TapDatabase
+from migrations import SQL_ADD_ECONOMY_COLUMNS, SQL_PLAYER_COLUMNS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SQL_EXPORT_PLAYERS = 'SELECT user_id, username, display_name, coins, total_taps, created_at, last_active{} FROM {}'
+SQL_TABLES = "SELECT name FROM sqlite_master WHERE type = 'table'"
+# Корзины тапов рейтингов за период: (таблица, колонка начала корзины); user_id первым - для split_by_shard
+TAP_BUCKET_TABLES = (('tap_hours', 'hour'), ('tap_days', 'day'))
+
+
+def copy_tap_buckets(src: sqlite3.Connection, target: TapDatabase, chunk_size: int) -> int:
+    """Скопировать корзины тапов по шардам, если они есть в исходной базе"""
+    tables = {row[0] for row in src.execute(SQL_TABLES)}
+    copied = 0
+    for table, column in TAP_BUCKET_TABLES:
+        if table not in tables:
+            continue
+        cursor = src.execute(f'SELECT user_id, {column}, taps FROM {table}')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for shard, group in target.split_by_shard(rows).items():
+                with target.pools[shard].transaction() as conn:
+                    conn.executemany(f'INSERT INTO {table} (user_id, {column}, taps) VALUES (?, ?, ?)', group)
+            copied += len(rows)
+    return copied
+
+
+def migrate(source: str, shards: int, chunk_size: int = 10000) -> bool:
+    """Скопировать игроков по шардам и сверить суммы; True, если всё сошлось"""
+    target = TapDatabase(source, shards=shards, in_memory_ranking=False, player_cache_size=0)
+    try:
+        if target.get_global_stats()['total_players']:
+            logger.error("Шарды уже содержат игроков - миграция остановлена")
+            return False
+
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        try:
+            # Холодные игроки переезжают в горячие таблицы шардов: перенос
+            # в холодный слой повторит фоновая задача бота
+            tables = ['players'] + (['players_cold'] if 'players_cold' in {row[0] for row in src.execute(SQL_TABLES)} else [])
+            expected = src.execute(SQL_GLOBAL_STATS_ALL if len(tables) > 1 else SQL_GLOBAL_STATS).fetchone()
+            # Колонки экономики - если исходная база уже обновлена до них
+            columns = {row[1] for row in src.execute(SQL_PLAYER_COLUMNS)}
+            economy = ''.join(f', {column}' for column in SQL_ADD_ECONOMY_COLUMNS if column in columns)
+            copied = 0
+            for table in tables:
+                cursor = src.execute(SQL_EXPORT_PLAYERS.format(economy, table))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    copied += target.import_players(rows)
+                    logger.info(f"Скопировано игроков: {copied}")
+            buckets = copy_tap_buckets(src, target, chunk_size)
+            if buckets:
+                logger.info(f"Скопировано корзин тапов: {buckets}")
+        finally:
+            src.close()
+
+        stats = target.get_global_stats()
+        actual = (stats['total_players'], stats['total_coins'], stats['total_taps'])
+        expected = (expected[0], expected[1] or 0, expected[2] or 0)
+        if actual != expected:
+            logger.error(f"Суммы не сошлись: источник {expected}, шарды {actual}")
+            return False
+
+        logger.info(f"Готово: {actual[0]} игроков в {shards} шардах: {', '.join(target.shard_paths)}")
+        return True
+    finally:
+        target.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="tap_game.db")
+    parser.add_argument("--shards", type=int, required=True)
+    args = parser.parse_args()
+
+    if args.shards < 2:
+        parser.error("--shards должно быть не меньше 2")
+    sys.exit(0 if migrate(args.source, args.shards) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import logging
+import sqlite3
+from typing import Callable, List, Tuple
+
+from names import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Версия схемы хранится в PRAGMA user_version файла базы (у каждого шарда своя).
+# Миграции применяются по порядку, каждая - в транзакции вместе с новой версией,
+# поэтому при запуске уже обновлённой базы не выполняется ни одного DDL-запроса.
+SQL_GET_VERSION = 'PRAGMA user_version'
+
+SQL_CREATE_PLAYERS = '''
+    CREATE TABLE IF NOT EXISTS players (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        display_name TEXT,
+        coins INTEGER DEFAULT 0,
+        total_taps INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+# Индексы для рейтинга: по монетам и частичный - по игрокам с именем
+SQL_CREATE_RANKING_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_players_coins ON players (coins)',
+    """CREATE INDEX IF NOT EXISTS idx_players_named_coins ON players (coins DESC, user_id)
+       WHERE display_name IS NOT NULL AND display_name != ''""",
+)
+# Общая статистика в одной строке: её поддерживают триггеры в той же
+# транзакции, что и изменение игрока, поэтому чтение - O(1) без скана таблицы
+SQL_CREATE_GLOBAL_STATS = (
+    '''CREATE TABLE IF NOT EXISTS global_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_players INTEGER NOT NULL DEFAULT 0,
+        total_coins INTEGER NOT NULL DEFAULT 0,
+        total_taps INTEGER NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS players_stats_insert AFTER INSERT ON players
+    BEGIN
+        UPDATE global_stats SET
+            total_players = total_players + 1,
+            total_coins = total_coins + COALESCE(NEW.coins, 0),
+            total_taps = total_taps + COALESCE(NEW.total_taps, 0)
+        WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS players_stats_update AFTER UPDATE OF coins, total_taps ON players
+    BEGIN
+        UPDATE global_stats SET
+            total_coins = total_coins + COALESCE(NEW.coins, 0) - COALESCE(OLD.coins, 0),
+            total_taps = total_taps + COALESCE(NEW.total_taps, 0) - COALESCE(OLD.total_taps, 0)
+        WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS players_stats_delete AFTER DELETE ON players
+    BEGIN
+        UPDATE global_stats SET
+            total_players = total_players - 1,
+            total_coins = total_coins - COALESCE(OLD.coins, 0),
+            total_taps = total_taps - COALESCE(OLD.total_taps, 0)
+        WHERE id = 1;
+    END''',
+)
+# Первичный подсчёт - только если строки статистики ещё нет
+SQL_SEED_GLOBAL_STATS = '''
+    INSERT OR IGNORE INTO global_stats (id, total_players, total_coins, total_taps)
+    SELECT 1, COUNT(*), COALESCE(SUM(coins), 0), COALESCE(SUM(total_taps), 0) FROM players
+'''
+
+# Ключ уникальности имени (names.normalize_name)
+SQL_PLAYER_COLUMNS = 'PRAGMA table_info(players)'
+SQL_ADD_NAME_KEY = 'ALTER TABLE players ADD COLUMN name_key TEXT'
+SQL_NAMES_WITHOUT_KEY = '''
+    SELECT user_id, display_name FROM players
+    WHERE name_key IS NULL AND display_name IS NOT NULL AND display_name != ''
+    ORDER BY created_at, user_id
+'''
+SQL_TAKEN_NAME_KEYS = 'SELECT name_key FROM players WHERE name_key IS NOT NULL'
+SQL_SET_NAME_KEY = 'UPDATE players SET name_key = ? WHERE user_id = ?'
+SQL_CREATE_NAME_KEY_INDEX = (
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_players_name_key ON players (name_key) WHERE name_key IS NOT NULL'
+)
+
+# Экономика (economy.py): монеты за тап, пассивный доход и момент его расчёта
+SQL_ADD_ECONOMY_COLUMNS = {
+    'tap_power': 'ALTER TABLE players ADD COLUMN tap_power INTEGER NOT NULL DEFAULT 1',
+    'income_per_hour': 'ALTER TABLE players ADD COLUMN income_per_hour INTEGER NOT NULL DEFAULT 0',
+    'settled_at': 'ALTER TABLE players ADD COLUMN settled_at REAL',
+}
+# Массовое зачисление дохода обходит только игроков с доходом
+SQL_CREATE_EARNING_INDEX = (
+    'CREATE INDEX IF NOT EXISTS idx_players_earning ON players (settled_at) WHERE income_per_hour > 0'
+)
+
+# Тапы по корзинам для рейтингов за период (windows.py): свежие - по часам,
+# старые сворачиваются в сутки. Ключ (начало корзины, user_id) без rowid
+SQL_CREATE_TAP_BUCKETS = (
+    '''CREATE TABLE IF NOT EXISTS tap_hours (
+        hour INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        taps INTEGER NOT NULL,
+        PRIMARY KEY (hour, user_id)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS tap_days (
+        day INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        taps INTEGER NOT NULL,
+        PRIMARY KEY (day, user_id)
+    ) WITHOUT ROWID''',
+)
+
+# Холодный слой: игроки без активности дольше порога и без пассивного дохода
+# переносятся сюда из players, чтобы горячая таблица и её индексы содержали
+# только активных. Монеты холодных не меняются, любая запись возвращает
+# игрока в players. Триггеры держат общую статистику по обеим таблицам
+SQL_CREATE_COLD_PLAYERS = (
+    '''CREATE TABLE IF NOT EXISTS players_cold (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        display_name TEXT,
+        coins INTEGER DEFAULT 0,
+        total_taps INTEGER DEFAULT 0,
+        created_at TIMESTAMP,
+        last_active TIMESTAMP,
+        tap_power INTEGER NOT NULL DEFAULT 1,
+        income_per_hour INTEGER NOT NULL DEFAULT 0,
+        settled_at REAL,
+        name_key TEXT,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_players_cold_coins ON players_cold (coins)',
+    """CREATE INDEX IF NOT EXISTS idx_players_cold_named_coins ON players_cold (coins DESC, user_id)
+       WHERE display_name IS NOT NULL AND display_name != ''""",
+    '''CREATE TRIGGER IF NOT EXISTS players_cold_stats_insert AFTER INSERT ON players_cold
+    BEGIN
+        UPDATE global_stats SET
+            total_players = total_players + 1,
+            total_coins = total_coins + COALESCE(NEW.coins, 0),
+            total_taps = total_taps + COALESCE(NEW.total_taps, 0)
+        WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS players_cold_stats_delete AFTER DELETE ON players_cold
+    BEGIN
+        UPDATE global_stats SET
+            total_players = total_players - 1,
+            total_coins = total_coins - COALESCE(OLD.coins, 0),
+            total_taps = total_taps - COALESCE(OLD.total_taps, 0)
+        WHERE id = 1;
+    END''',
+)
+
+
+def create_base_schema(conn: sqlite3.Connection, path: str):
+    """Таблица игроков, индексы рейтинга и общая статистика"""
+    # IF NOT EXISTS: базы, созданные до версионирования, уже содержат эти объекты
+    conn.execute(SQL_CREATE_PLAYERS)
+    for sql in SQL_CREATE_RANKING_INDEXES + SQL_CREATE_GLOBAL_STATS:
+        conn.execute(sql)
+    conn.execute(SQL_SEED_GLOBAL_STATS)
+
+
+def add_name_keys(conn: sqlite3.Connection, path: str):
+    """Колонка name_key, её заполнение и уникальный индекс"""
+    if 'name_key' not in {row[1] for row in conn.execute(SQL_PLAYER_COLUMNS)}:
+        conn.execute(SQL_ADD_NAME_KEY)
+
+    rows = conn.execute(SQL_NAMES_WITHOUT_KEY).fetchall()
+    if rows:
+        taken = {row[0] for row in conn.execute(SQL_TAKEN_NAME_KEYS)}
+        updates = []
+        for user_id, display_name in rows:
+            key = normalize_name(display_name)
+            # Первым имя получил тот, кто раньше зарегистрировался
+            if key and key not in taken:
+                taken.add(key)
+                updates.append((key, user_id))
+        conn.executemany(SQL_SET_NAME_KEY, updates)
+
+        logger.info(f"{path}: заполнено ключей имён: {len(updates)}")
+        if len(updates) < len(rows):
+            logger.warning(
+                f"{path}: {len(rows) - len(updates)} имён совпадают с более ранними после "
+                f"нормализации - они остаются, но не резервируются"
+            )
+    conn.execute(SQL_CREATE_NAME_KEY_INDEX)
+
+
+def add_economy(conn: sqlite3.Connection, path: str):
+    """Колонки улучшений и пассивного дохода"""
+    columns = {row[1] for row in conn.execute(SQL_PLAYER_COLUMNS)}
+    for column, sql in SQL_ADD_ECONOMY_COLUMNS.items():
+        if column not in columns:
+            conn.execute(sql)
+    conn.execute(SQL_CREATE_EARNING_INDEX)
+
+
+def add_tap_buckets(conn: sqlite3.Connection, path: str):
+    """Часовые и суточные корзины тапов"""
+    for sql in SQL_CREATE_TAP_BUCKETS:
+        conn.execute(sql)
+
+
+def add_cold_players(conn: sqlite3.Connection, path: str):
+    """Таблица холодных игроков"""
+    for sql in SQL_CREATE_COLD_PLAYERS:
+        conn.execute(sql)
+
+
+# (версия, описание, функция): новые миграции - только в конец списка
+Migration = Tuple[int, str, Callable[[sqlite3.Connection, str], None]]
+MIGRATIONS: List[Migration] = [
+    (1, "таблица игроков и общая статистика", create_base_schema),
+    (2, "ключи уникальности имён", add_name_keys),
+    (3, "улучшения и пассивный доход", add_economy),
+    (4, "корзины тапов для рейтингов за период", add_tap_buckets),
+    (5, "холодный слой неактивных игроков", add_cold_players),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы файла базы"""
+    return conn.execute(SQL_GET_VERSION).fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection, path: str, migrations: List[Migration] = MIGRATIONS) -> int:
+    """Довести схему до последней версии списка внутри открытой транзакции; вернуть число миграций"""
+    version = schema_version(conn)
+    latest = migrations[-1][0]
+    if version > latest:
+        raise RuntimeError(
+            f"{path}: схема версии {version} новее поддерживаемой ({latest}) - обновите бота"
+        )
+
+    applied = 0
+    for target, description, migration in migrations:
+        if target <= version:
+            continue
+        migration(conn, path)
+        conn.execute(f'PRAGMA user_version = {target}')
+        logger.info(f"{path}: схема обновлена до версии {target} ({description})")
+        applied += 1
+    return applied
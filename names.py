@@ -0,0 +1,104 @@
+import itertools
+import random
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Ограничения на отображаемое имя (как в боте и WebApp)
+MIN_NAME_LENGTH = 2
+MAX_NAME_LENGTH = 20
+
+
+def normalize_name(name: str) -> str:
+    """Ключ уникальности имени: NFKC, без регистра, пробелы схлопнуты
+
+    "Вася", "вася" и "ВАСЯ " дают один ключ, поэтому заняты вместе.
+    """
+    return ' '.join(unicodedata.normalize('NFKC', name).casefold().split())
+
+
+class NameIndex:
+    """Имя -> user_id в памяти: проверка и резервирование имени за O(1)
+
+    Резерв ставится до записи в базу и снимается, если запись не удалась,
+    поэтому два игрока не могут одновременно получить одно имя даже в
+    разных шардах.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def load(self, rows: Iterable[Tuple[int, str]]) -> int:
+        """Заполнить индекс парами (user_id, display_name); вернуть число конфликтов"""
+        conflicts = 0
+        with self._lock:
+            for user_id, display_name in rows:
+                key = normalize_name(display_name or '')
+                if not key:
+                    continue
+                if self._owners.setdefault(key, user_id) != user_id:
+                    conflicts += 1
+                    continue
+                self._keys[user_id] = key
+        return conflicts
+
+    def owner(self, display_name: str) -> Optional[int]:
+        """Владелец имени или None"""
+        return self._owners.get(normalize_name(display_name))
+
+    def is_available(self, display_name: str, user_id: int = 0) -> bool:
+        """Свободно ли имя (или уже принадлежит user_id)"""
+        return self._owners.get(normalize_name(display_name), user_id) == user_id
+
+    def reserve(self, user_id: int, display_name: str) -> bool:
+        """Занять имя за игроком; False - если оно у другого"""
+        key = normalize_name(display_name)
+        if not key:
+            return True
+        with self._lock:
+            return self._owners.setdefault(key, user_id) == user_id
+
+    def release(self, user_id: int, display_name: str):
+        """Снять резерв, если запись имени не удалась"""
+        key = normalize_name(display_name)
+        with self._lock:
+            if self._owners.get(key) == user_id and self._keys.get(user_id) != key:
+                del self._owners[key]
+
+    def commit(self, user_id: int, display_name: str):
+        """Имя записано: освободить прежнее имя игрока"""
+        key = normalize_name(display_name)
+        with self._lock:
+            old = self._keys.get(user_id)
+            if old is not None and old != key and self._owners.get(old) == user_id:
+                del self._owners[old]
+            if key:
+                self._owners[key] = user_id
+                self._keys[user_id] = key
+            else:
+                self._keys.pop(user_id, None)
+
+    def suggest(self, display_name: str, count: int = 3, user_id: int = 0) -> List[str]:
+        """Свободные варианты имени: с номером и со случайным числом"""
+        base = ' '.join(display_name.split())[:MAX_NAME_LENGTH] or 'Игрок'
+        suffixes = itertools.chain(
+            (str(number) for number in range(2, 10)),
+            (str(random.randint(10, 9999)) for _ in range(50))
+        )
+        suggestions = []
+        seen = set()
+        for suffix in suffixes:
+            candidate = base[:MAX_NAME_LENGTH - len(suffix)] + suffix
+            key = normalize_name(candidate)
+            if key in seen or not self.is_available(candidate, user_id):
+                continue
+            seen.add(key)
+            suggestions.append(candidate)
+            if len(suggestions) >= count:
+                break
+        return suggestions
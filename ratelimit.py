@@ -0,0 +1,68 @@
+import time
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class TokenBucketLimiter:
+    """Токен-бакеты по ключу: не больше rate событий в секунду с запасом burst
+
+    Рассчитан на вызовы из одного event loop, поэтому без блокировок.
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        if not rate > 0:
+            raise ValueError(f"rate={rate!r}: ожидается положительная скорость")
+        if not burst >= 1:
+            raise ValueError(f"burst={burst!r}: ожидается не меньше 1")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        # Ключ -> (токены, время обновления). Бакет, простоявший дольше
+        # burst / rate, уже полон и неотличим от отсутствующего
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}
+        self.idle_ttl = burst / rate
+        self.allowed = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def consume(self, key: Hashable, count: int = 1) -> int:
+        """Списать до count токенов; вернуть, сколько событий пропущено"""
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = self.burst
+        else:
+            tokens = bucket[0] + (now - bucket[1]) * self.rate
+            if tokens > self.burst:
+                tokens = self.burst
+
+        granted = count if count <= tokens else int(tokens)
+        self._buckets[key] = (tokens - granted, now)
+        self.allowed += granted
+        self.rejected += count - granted
+        return granted
+
+    def delay(self, key: Hashable, count: int = 1) -> float:
+        """Через сколько секунд у ключа накопится count токенов (0 - уже есть)"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return 0.0
+        tokens = bucket[0] + (self.clock() - bucket[1]) * self.rate
+        return max(0.0, (count - tokens) / self.rate)
+
+    def evict_idle(self) -> int:
+        """Удалить бакеты, которые уже успели наполниться; вернуть их число"""
+        deadline = self.clock() - self.idle_ttl
+        idle = [key for key, (_, updated) in self._buckets.items() if updated <= deadline]
+        for key in idle:
+            del self._buckets[key]
+        return len(idle)
+
+    def stats(self) -> Dict:
+        """Счётчики пропущенных и отброшенных событий"""
+        return {
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'tracked': len(self._buckets)
+        }
@@ -0,0 +1,46 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Склейка одинаковых запросов: пока запрос выполняется, повторы ждут его результат
+
+    Первый вызов по ключу запускает функцию, остальные вызовы с тем же ключом
+    получают тот же результат (или то же исключение), не обращаясь к базе.
+    Результат не запоминается: следующий запрос после завершения идёт заново.
+    Все вызовы делаются из одного event loop, поэтому блокировка не нужна.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат func() - общий для всех, кто ждёт тот же ключ"""
+        flight = self._flights.get(key)
+        # Завершённый, но ещё не снятый запрос не переиспользуем: его результат уже устарел
+        if flight is None or flight.done():
+            self.executed += 1
+            flight = self._flights[key] = asyncio.ensure_future(func())
+            flight.add_done_callback(functools.partial(self._land, key))
+        else:
+            self.shared += 1
+        # Отмена одного ожидающего не отменяет запрос остальным
+        return await asyncio.shield(flight)
+
+    def _land(self, key: Hashable, flight: asyncio.Future):
+        """Запрос завершён: следующий вызов по ключу пойдёт в базу"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Если все ожидающие отменены, исключение некому забрать - не шумим в лог
+        if not flight.cancelled():
+            flight.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Выполненные запросы и склеенные с ними повторы"""
+        return {'executed': self.executed, 'shared': self.shared, 'in_flight': len(self._flights)}
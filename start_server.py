@@ -1,22 +1,145 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import gzip
+import hashlib
 import os
 
-class CORSRequestHandler(SimpleHTTPRequestHandler):
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Маршрут -> файл. Отдаём только WebApp, а не весь каталог (там .env и база)
+ROUTES = {
+    '/': 'index.html',
+    '/index.html': 'index.html',
+    '/webapp.html': 'index.html',
+}
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+}
+# HTML всегда перепроверяется по ETag, поэтому обновления доходят сразу,
+# а повторные открытия получают 304 без тела
+CACHE_CONTROL = 'no-cache'
+
+
+class Asset:
+    """Файл, загруженный в память вместе со сжатыми вариантами"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self.variants = {'identity': self.body}
+        self.variants['gzip'] = gzip.compress(self.body, compresslevel=9)
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(self.body, quality=11)
+
+    def negotiate(self, accept_encoding: str):
+        """Выбрать самое компактное кодирование из поддерживаемых клиентом"""
+        accepted = set()
+        for part in accept_encoding.split(','):
+            name, _, params = part.partition(';')
+            params = params.strip()
+            quality = 1.0
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if quality > 0:
+                accepted.add(name.strip().lower())
+
+        best = 'identity'
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                if len(self.variants[encoding]) < len(self.variants[best]):
+                    best = encoding
+        return best, self.variants[best]
+
+
+def load_assets(root: str) -> dict:
+    """Загрузить все файлы маршрутов в память"""
+    assets = {}
+    for filename in set(ROUTES.values()):
+        assets[filename] = Asset(os.path.join(root, filename))
+    return {route: assets[filename] for route, filename in ROUTES.items()}
+
+
+class CORSRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят разными send(): без TCP_NODELAY keep-alive упирается в delayed ACK
+    disable_nagle_algorithm = True
+    assets = {}
+
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         super().end_headers()
-    
+
     def do_OPTIONS(self):
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
+    def do_HEAD(self):
+        self.serve(head_only=True)
+
+    def do_GET(self):
+        self.serve()
+
+    def serve(self, head_only: bool = False):
+        """Отдать файл из памяти с учётом ETag и сжатия"""
+        asset = self.assets.get(self.path.split('?', 1)[0])
+        if asset is None:
+            self.send_error(404)
+            return
+
+        if asset.etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', asset.etag)
+            self.send_header('Cache-Control', CACHE_CONTROL)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        encoding, body = asset.negotiate(self.headers.get('Accept-Encoding', ''))
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', asset.etag)
+        self.send_header('Cache-Control', CACHE_CONTROL)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Журнал на каждый запрос при тысячах открытий только тормозит
+        pass
+
+
+class WebAppServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Очередь соединений для всплеска открытий после рассылки
+    request_queue_size = 1024
+
+
 if __name__ == '__main__':
-    os.chdir(os.path.dirname(__file__))
-    server_address = ('localhost', 8000)
-    httpd = HTTPServer(server_address, CORSRequestHandler)
-    print("✅ Сервер запущен на http://localhost:8000")
-    print("📱 WebApp доступен по адресу: http://localhost:8000/webapp.html")
+    parser = argparse.ArgumentParser(description='Статический сервер WebApp')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    CORSRequestHandler.assets = load_assets(os.path.dirname(os.path.abspath(__file__)))
+    httpd = WebAppServer((args.host, args.port), CORSRequestHandler)
+    print(f"✅ Сервер запущен на http://{args.host}:{args.port}")
+    print(f"📱 WebApp доступен по адресу: http://{args.host}:{args.port}/webapp.html")
     print("🤖 Telegram бот должен использовать этот URL в тестовом режиме")
-    httpd.serve_forever()
\ No newline at end of file
+    httpd.serve_forever()
@@ -0,0 +1,176 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class TapStorage(ABC):
+    """Хранилище игроков: всё, что бот и API делают с данными
+
+    Реализации синхронные; AsyncTapDatabase выносит их вызовы в потоки.
+    Запись игрока идёт через поток-писатель его шарда (shard_of), чтение -
+    через общий пул потоков, либо прямо в event loop, если inline_reads.
+    """
+
+    # Чтение не ходит на диск - можно вызывать прямо из event loop
+    inline_reads = False
+
+    @property
+    def shard_count(self) -> int:
+        """Число независимых писателей"""
+        return 1
+
+    @property
+    def reader_threads(self) -> int:
+        """Сколько потоков чтения имеет смысл держать"""
+        return 1
+
+    def shard_of(self, user_id: int) -> int:
+        """Номер шарда игрока"""
+        return user_id % self.shard_count
+
+    def split_by_shard(self, items: Iterable[Tuple]) -> Dict[int, List[Tuple]]:
+        """Разложить кортежи, начинающиеся с user_id, по шардам"""
+        groups: Dict[int, List[Tuple]] = {}
+        for item in items:
+            groups.setdefault(self.shard_of(item[0]), []).append(item)
+        return groups
+
+    def cached_player(self, user_id: int) -> Optional[Dict]:
+        """Данные игрока, если они доступны без обращения к диску"""
+        return None
+
+    @abstractmethod
+    def close(self):
+        """Закрыть хранилище"""
+
+    @abstractmethod
+    def get_player(self, user_id: int) -> Dict:
+        """Получить данные игрока ({} - если его нет); монеты - с пассивным
+        доходом на момент чтения (economy.settle). Игрока из холодного слоя
+        возвращает обратно (rehydrate_player) - это запись его шарда"""
+
+    def read_player(self, user_id: int) -> Tuple[Dict, bool]:
+        """get_player без записи: (данные игрока, в холодном ли он слое)"""
+        return self.get_player(user_id), False
+
+    def rehydrate_player(self, user_id: int) -> Dict:
+        """Вернуть игрока из холодного слоя (запись его шарда); его данные как get_player"""
+        return self.get_player(user_id)
+
+    @abstractmethod
+    def create_player(self, user_id: int, username: str = "") -> Dict:
+        """Создать игрока (или вернуть существующего)"""
+
+    @abstractmethod
+    def save_player(self, player_data: Dict) -> bool:
+        """Сохранить данные игрока"""
+
+    @abstractmethod
+    def set_username(self, user_id: int, username: str) -> bool:
+        """Обновить username, не трогая монеты"""
+
+    @abstractmethod
+    def add_tap(self, user_id: int, taps: int = 1) -> Dict:
+        """Добавить тапы игроку (создав его при необходимости); тап приносит
+        tap_power монет, накопленный пассивный доход зачисляется заодно"""
+
+    @abstractmethod
+    def add_taps_bulk(self, deltas: List[Tuple[int, int]]):
+        """Начислить тапы пачке игроков (user_id, delta)"""
+
+    @abstractmethod
+    def buy_upgrade(self, user_id: int, upgrade: str) -> Dict:
+        """Купить уровень улучшения (economy.UPGRADES) за монеты:
+        {'success': хватило ли монет, 'price': цена, 'player': строка игрока}"""
+
+    @abstractmethod
+    def set_display_name(self, user_id: int, display_name: str) -> bool:
+        """Установить отображаемое имя; False - если имя занято"""
+
+    @abstractmethod
+    def suggest_names(self, display_name: str, count: int = 3, user_id: int = 0) -> Dict:
+        """{'available': свободно ли имя для user_id, 'suggestions': свободные варианты}"""
+
+    @abstractmethod
+    def get_top_players(self, limit: int = 10) -> List[Dict]:
+        """Топ игроков с именем по убыванию монет"""
+
+    @abstractmethod
+    def get_top_page(self, after: Optional[Tuple[int, int]] = None, before: Optional[Tuple[int, int]] = None,
+                     limit: int = 10) -> List[Dict]:
+        """Страница топа в порядке get_top_players: limit строк после курсора
+        after или до курсора before - (coins, user_id) строки предыдущей страницы.
+        Без курсоров - первая страница"""
+
+    @abstractmethod
+    def get_players_around(self, user_id: int, radius: int = 5) -> List[Dict]:
+        """Строки топа вокруг игрока: по radius выше и ниже него (и он сам,
+        если у него есть имя)"""
+
+    @abstractmethod
+    def get_player_rank(self, user_id: int) -> int:
+        """Получить ранг игрока"""
+
+    @abstractmethod
+    def get_window_top(self, window: str, limit: int = 10) -> List[Dict]:
+        """Топ игроков с именем по тапам за текущий период (windows.WINDOWS):
+        [{'user_id', 'name', 'taps', 'rank'}]"""
+
+    @abstractmethod
+    def get_window_rank(self, window: str, user_id: int) -> Dict:
+        """{'rank': ранг, 'taps': тапы} игрока за текущий период"""
+
+    @abstractmethod
+    def get_global_stats(self) -> Dict:
+        """Общая статистика по всем игрокам"""
+
+    @abstractmethod
+    def list_user_ids(self, after_user_id: int = 0, limit: int = 1000) -> List[int]:
+        """До limit user_id больше after_user_id по возрастанию - страница обхода
+        всех игроков по ключу (без OFFSET, каждая страница стоит одинаково)"""
+
+    @abstractmethod
+    def get_cache_stats(self) -> Dict:
+        """Статистика кэшей хранилища"""
+
+    @abstractmethod
+    def reconcile_global_stats(self) -> Dict:
+        """Пересчитать общую статистику по игрокам и исправить расхождение"""
+
+    @abstractmethod
+    def settle_income(self) -> int:
+        """Зачислить накопленный пассивный доход всем игрокам с доходом, чтобы
+        топ и ранги его учитывали; вернуть число игроков с начислением"""
+
+    @abstractmethod
+    def compact_windows(self) -> Dict:
+        """Свернуть старые часовые корзины тапов в суточные и удалить корзины
+        старше хранения: {'rolled_up': часовых строк, 'pruned': суточных строк}"""
+
+    @abstractmethod
+    def archive_inactive(self, inactive_days: float = 30, batch_size: int = 5000,
+                         shard: Optional[int] = None) -> Dict:
+        """Перенести игроков без активности дольше inactive_days (и без дохода)
+        в холодный слой - все шарды или только shard; следующая запись или чтение
+        игрока возвращает его обратно. Топ, ранги и общая статистика учитывают
+        холодных: {'archived': n}"""
+
+    @abstractmethod
+    def import_players(self, rows: Iterable[Tuple]) -> int:
+        """Вставить готовые строки (user_id, username, display_name, coins,
+        total_taps, created_at, last_active) - для миграций"""
+
+
+def create_storage(engine: str, db_path: str, **options) -> TapStorage:
+    """Открыть хранилище по имени движка: sqlite, memory или remote"""
+    # Импорт внутри: модули движков сами импортируют этот
+    if engine == "sqlite":
+        from database import TapDatabase
+        return TapDatabase(db_path, **options)
+    if engine == "memory":
+        from memory_storage import MemoryStorage
+        return MemoryStorage(db_path, **options)
+    if engine == "remote":
+        # db_path - адрес сокета процесса-писателя
+        from ipc import RemoteStorage
+        return RemoteStorage(db_path, **options)
+    raise ValueError(f"Неизвестный движок хранилища: {engine}")
@@ -0,0 +1,156 @@
+"""Запуск бота в несколько процессов
+
+Супервизор создаёт сегмент разделяемой памяти, запускает процесс-писатель
+(единственный владелец базы) и --workers процессов main.py в режиме
+вебхука на одном порту: SO_REUSEPORT, соединения распределяет ядро.
+Воркеры пишут в базу через писателя по Unix-сокету, а топ и общую
+статистику читают из разделяемой памяти. Упавший воркер перезапускается.
+
+    DB_SHARDS=4 WEBHOOK_BASE_URL=https://bot.example.com python supervisor.py --workers 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import secrets
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from config import Config, load_config
+from ipc import SharedSnapshot, StorageServer, publish_snapshots
+from storage import create_storage
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Как часто писатель публикует топ и статистику в разделяемую память
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "0.5"))  # секунд
+# Не перезапускать воркер чаще, чем раз в интервал
+RESTART_INTERVAL = 5.0  # секунд
+SHUTDOWN_TIMEOUT = 30.0  # секунд
+
+
+def run_writer(config: Config, address: str, authkey: bytes, snapshot_name: str, ready, stop):
+    """Процесс-писатель: хранилище, IPC-сервер и публикация снимков"""
+    # Ctrl+C получает вся группа процессов, а писатель должен пережить воркеров
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Хранилище писателя - те же настройки (окружение и .env), что у main.py
+    storage = create_storage(config.db_engine, config.db_path, **config.storage_options())
+    server = StorageServer(storage, address, authkey)
+    server.start()
+
+    snapshot = SharedSnapshot(snapshot_name)
+    publisher_stop = threading.Event()
+    publisher = threading.Thread(
+        target=publish_snapshots, args=(storage, snapshot, SNAPSHOT_INTERVAL, publisher_stop),
+        name="snapshot-publisher", daemon=True
+    )
+    publisher.start()
+    ready.set()
+
+    stop.wait()
+    publisher_stop.set()
+    publisher.join()
+    server.stop()
+    storage.close()
+    snapshot.close()
+    logger.info(f"Писатель остановлен, обработано запросов: {server.requests}")
+
+
+def start_worker(worker_id: int, env: dict, port: int) -> subprocess.Popen:
+    """Запустить воркер main.py в режиме вебхука"""
+    worker_env = dict(env, WORKER_ID=str(worker_id), WEBHOOK_PORT=str(port))
+    # Своя сессия: Ctrl+C получает только супервизор и гасит воркеров по порядку
+    process = subprocess.Popen([sys.executable, MAIN_SCRIPT], env=worker_env, start_new_session=True)
+    logger.info(f"Воркер {worker_id} запущен (pid {process.pid})")
+    return process
+
+
+def main():
+    # .env читается здесь: воркеры получат те же переменные через окружение
+    config = load_config()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=config.webhook_port)
+    args = parser.parse_args()
+
+    if config.db_engine == "remote":
+        parser.error("DB_ENGINE=remote - это хранилище воркеров; писателю нужен sqlite или memory")
+
+    authkey = secrets.token_bytes(32)
+    runtime_dir = tempfile.mkdtemp(prefix="tapgame-")
+    address = os.path.join(runtime_dir, "writer.sock")
+    snapshot = SharedSnapshot(create=True)
+
+    ctx = multiprocessing.get_context("spawn")
+    ready, stop = ctx.Event(), ctx.Event()
+    writer = ctx.Process(
+        target=run_writer, args=(config, address, authkey, snapshot.name, ready, stop), name="tap-writer"
+    )
+    writer.start()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    workers = {}
+    try:
+        if not ready.wait(120) or not writer.is_alive():
+            raise RuntimeError("Процесс-писатель не запустился")
+
+        env = dict(
+            os.environ,
+            BOT_MODE="webhook",
+            DB_ENGINE="remote",
+            DB_PATH=address,
+            IPC_AUTHKEY=authkey.hex(),
+            SNAPSHOT_SHM=snapshot.name,
+            WEBHOOK_REUSE_PORT="1"
+        )
+        started = {}
+        for worker_id in range(args.workers):
+            workers[worker_id] = start_worker(worker_id, env, args.port)
+            started[worker_id] = time.monotonic()
+
+        while not stopping.wait(1.0):
+            if not writer.is_alive():
+                logger.error("Процесс-писатель завершился - останавливаем воркеров")
+                break
+            for worker_id, process in workers.items():
+                code = process.poll()
+                if code is None or time.monotonic() - started[worker_id] < RESTART_INTERVAL:
+                    continue
+                logger.warning(f"Воркер {worker_id} завершился с кодом {code} - перезапуск")
+                workers[worker_id] = start_worker(worker_id, env, args.port)
+                started[worker_id] = time.monotonic()
+    finally:
+        # Сначала воркеры: при остановке они дописывают накопленные тапы через писателя
+        for process in workers.values():
+            if process.poll() is None:
+                process.terminate()
+        for worker_id, process in workers.items():
+            try:
+                process.wait(SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                logger.error(f"Воркер {worker_id} не остановился за {SHUTDOWN_TIMEOUT} с")
+                process.kill()
+
+        stop.set()
+        writer.join(SHUTDOWN_TIMEOUT)
+        if writer.is_alive():
+            writer.terminate()
+        snapshot.close(unlink=True)
+        shutil.rmtree(runtime_dir, ignore_errors=True)
+        logger.info("Супервизор остановлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import glob
+import heapq
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Журнал событий тапов: каждое начисление (user_id, момент в мс, тапов) -
+# запись фиксированной длины в сегменте <path>.<номер>.seg. Сегменты только
+# дописываются; заполненный закрывается и начинается следующий. Запись,
+# оборванная на середине при падении, при чтении отбрасывается.
+SEGMENT_MAGIC = b'TAPEVT01'
+# Заголовок сегмента: сигнатура, длина записи, резерв
+HEADER = struct.Struct('<8sI4x')
+RECORD = struct.Struct('<qqi')
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+# Буфер записей до записи в файл
+DEFAULT_BUFFER_BYTES = 64 * 1024
+HOUR_MS = 3600 * 1000
+
+TapEvent = Tuple[int, int, int]
+
+
+def segment_paths(path: str) -> List[str]:
+    """Сегменты журнала по возрастанию номера"""
+    segments = []
+    for segment_path in glob.glob(glob.escape(path) + ".*.seg"):
+        suffix = segment_path[len(path) + 1:-len(".seg")]
+        if suffix.isdigit():
+            segments.append((int(suffix), segment_path))
+    return [segment_path for _, segment_path in sorted(segments)]
+
+
+def read_segment(segment_path: str) -> Iterator[TapEvent]:
+    """События сегмента (user_id, ts_ms, тапов) через mmap, без чтения файла в память"""
+    with open(segment_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, record_size = HEADER.unpack_from(mm)
+            if magic != SEGMENT_MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{segment_path}: не сегмент журнала тапов")
+            # Хвост неполной записи - след падения во время записи
+            end = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+            view = memoryview(mm)[HEADER.size:end]
+            records = RECORD.iter_unpack(view)
+            try:
+                yield from records
+            finally:
+                # mmap не закрыть, пока на него ссылается итератор
+                del records
+                view.release()
+
+
+def read_events(path: str) -> Iterator[TapEvent]:
+    """События всех сегментов журнала по порядку записи"""
+    for segment_path in segment_paths(path):
+        yield from read_segment(segment_path)
+
+
+def merged_events(paths: List[str]) -> Iterator[TapEvent]:
+    """События нескольких журналов (например, по одному на воркер) в порядке времени"""
+    return heapq.merge(*(read_events(path) for path in paths), key=lambda event: event[1])
+
+
+def hourly_summaries(events: Iterable[TapEvent], lateness: int = HOUR_MS) -> Iterator[Tuple[int, int, int, int]]:
+    """Сводки (начало часа в мс, user_id, тапов, событий) по событиям в порядке времени
+
+    В памяти держатся только часы, которые ещё могут пополниться: час
+    отдаётся, когда события ушли от него дальше lateness. Событие, опоздавшее
+    сильнее, даёт отдельную строку того же часа - при загрузке строки суммируются.
+    """
+    open_hours: Dict[int, Dict[int, List[int]]] = {}
+    closed_before = None
+    for user_id, ts, taps in events:
+        hour = ts - ts % HOUR_MS
+        users = open_hours.get(hour)
+        if users is None:
+            users = open_hours[hour] = {}
+        summary = users.get(user_id)
+        if summary is None:
+            users[user_id] = [taps, 1]
+        else:
+            summary[0] += taps
+            summary[1] += 1
+
+        # Час закрыт, когда с его конца прошло больше lateness; граница сдвигается раз в час
+        cutoff = ts - lateness - HOUR_MS
+        cutoff -= cutoff % HOUR_MS
+        if closed_before is None or cutoff > closed_before:
+            closed_before = cutoff
+            for closed in sorted(start for start in open_hours if start <= cutoff):
+                for closed_user_id, (closed_taps, closed_events) in open_hours.pop(closed).items():
+                    yield closed, closed_user_id, closed_taps, closed_events
+
+    for hour in sorted(open_hours):
+        for user_id, (taps, events_count) in open_hours[hour].items():
+            yield hour, user_id, taps, events_count
+
+
+class TapEventLog:
+    """Запись событий тапов в сегменты журнала
+
+    События копятся в буфере и уходят в файл, когда буфер заполнен или при
+    flush() - его вызывает сброс накопителя тапов. fsync не делается: журнал
+    служит аналитике и античиту, а не восстановлению монет. Журнал пишется
+    только из event loop накопителя, поэтому блокировки нет: на горячем пути
+    она стоила бы дороже самой записи.
+    """
+
+    def __init__(self, path: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 buffer_bytes: int = DEFAULT_BUFFER_BYTES):
+        self.path = path
+        self.segment_bytes = max(segment_bytes, HEADER.size + RECORD.size)
+        self.buffer_bytes = buffer_bytes
+        self._buffer = bytearray()
+        self._file = None
+        self._file_size = 0
+        existing = segment_paths(path)
+        # Новый процесс начинает новый сегмент: старый мог оборваться на середине записи
+        self._segment = int(existing[-1][len(path) + 1:-len(".seg")]) if existing else 0
+        self.events = 0
+        self.bytes_written = 0
+        self.segments = 0
+
+    def _segment_path(self, segment: int) -> str:
+        return f"{self.path}.{segment:06d}.seg"
+
+    def append(self, user_id: int, taps: int, ts: Optional[float] = None):
+        """Записать событие: игрок user_id сделал taps тапов в момент ts"""
+        self._buffer += RECORD.pack(user_id, int((ts or time.time()) * 1000), taps)
+        self.events += 1
+        if len(self._buffer) >= self.buffer_bytes:
+            self._write_buffer()
+
+    def flush(self):
+        """Записать буфер в файл"""
+        self._write_buffer()
+
+    def _write_buffer(self):
+        """Дописать буфер в текущий сегмент, открывая новые по мере заполнения"""
+        offset = 0
+        while offset < len(self._buffer):
+            # Сегмент заканчивается на границе записи
+            room = (self.segment_bytes - self._file_size) // RECORD.size * RECORD.size
+            if self._file is None or not room:
+                self._rotate()
+                room = (self.segment_bytes - self._file_size) // RECORD.size * RECORD.size
+            chunk = self._buffer[offset:offset + room]
+            self._file.write(chunk)
+            self._file_size += len(chunk)
+            self.bytes_written += len(chunk)
+            offset += len(chunk)
+        self._buffer.clear()
+        if self._file is not None:
+            self._file.flush()
+
+    def _rotate(self):
+        """Закрыть заполненный сегмент и начать следующий"""
+        if self._file is not None:
+            self._file.close()
+        self._segment += 1
+        segment_path = self._segment_path(self._segment)
+        self._file = open(segment_path, 'xb')
+        self._file.write(HEADER.pack(SEGMENT_MAGIC, RECORD.size))
+        self._file_size = HEADER.size
+        self.segments += 1
+        logger.debug(f"Новый сегмент журнала тапов: {segment_path}")
+
+    def close(self):
+        """Записать буфер и закрыть сегмент"""
+        self._write_buffer()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, int]:
+        """Записанные события, байты и открытые сегменты"""
+        return {
+            'events': self.events,
+            'bytes': self.bytes_written,
+            'segments': self.segments,
+            'buffered_bytes': len(self._buffer)
+        }
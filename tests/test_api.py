@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from aggregator import TapAggregator
+from api import TapApi, sign_init_data, verify_init_data
+from database import AsyncTapDatabase, TapDatabase
+
+BOT_TOKEN = "123456:test"
+
+
+def test_verify_init_data():
+    assert verify_init_data(sign_init_data(42, BOT_TOKEN), BOT_TOKEN) == 42
+    with pytest.raises(ValueError):
+        verify_init_data(sign_init_data(42, "654321:other"), BOT_TOKEN)
+    with pytest.raises(ValueError):
+        verify_init_data(sign_init_data(42, BOT_TOKEN).replace("42", "43"), BOT_TOKEN)
+    with pytest.raises(ValueError):
+        verify_init_data(sign_init_data(42, BOT_TOKEN, auth_date=int(time.time()) - 2 * 86400), BOT_TOKEN)
+    with pytest.raises(ValueError):
+        verify_init_data("", BOT_TOKEN)
+    with pytest.raises(ValueError):
+        verify_init_data(sign_init_data(42, ""), "")
+
+
+def test_api_uses_user_from_init_data(tmp_path):
+    async def scenario():
+        db = AsyncTapDatabase(TapDatabase(str(tmp_path / "api.db")))
+        taps = TapAggregator(db)
+        client = TestClient(TestServer(TapApi(db, taps, BOT_TOKEN).create_app()))
+        await client.start_server()
+        try:
+            # user_id из тела игнорируется: игрок - тот, кто подписан в initData
+            resp = await client.post("/api/taps", json={
+                "user_id": 2, "taps": 5, "client_seq": 1, "init_data": sign_init_data(1, BOT_TOKEN)
+            })
+            assert resp.status == 200
+            assert (await resp.json())["coins"] == 5
+            await taps.flush()
+            assert (await db.get_player(2)) == {}
+
+            resp = await client.post("/api/taps", json={"user_id": 1, "taps": 5, "client_seq": 2})
+            assert resp.status == 401
+            resp = await client.get("/api/state", params={"user_id": 1})
+            assert resp.status == 401
+            resp = await client.post("/api/upgrade", json={"upgrade": "tap_power", "init_data": "hash=0"})
+            assert resp.status == 401
+
+            resp = await client.get("/api/state", params={"init_data": sign_init_data(1, BOT_TOKEN)})
+            assert (await resp.json())["coins"] == 5
+        finally:
+            await client.close()
+            await taps.stop()
+            await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_metrics_require_token(tmp_path):
+    async def scenario():
+        db = AsyncTapDatabase(TapDatabase(str(tmp_path / "metrics.db")))
+        taps = TapAggregator(db)
+        cases = (
+            ("", {}, {}, 404),
+            ("secret", {}, {}, 403),
+            ("secret", {"token": "wrong"}, {}, 403),
+            ("secret", {"token": "secret"}, {}, 200),
+            ("secret", {}, {"Authorization": "Bearer secret"}, 200),
+            ("secret", {}, {"Authorization": "Bearer wrong"}, 403),
+            # Токен принимается только в схеме Bearer
+            ("secret", {}, {"Authorization": "XXXXXXXsecret"}, 403),
+            ("secret", {}, {"Authorization": "Basic secret"}, 403),
+        )
+        for token, query, headers, status in cases:
+            client = TestClient(TestServer(TapApi(db, taps, BOT_TOKEN, metrics_token=token).create_app()))
+            await client.start_server()
+            try:
+                resp = await client.get("/metrics", params=query, headers=headers)
+                assert resp.status == status, (token, query, headers)
+            finally:
+                await client.close()
+        await taps.stop()
+        await db.close()
+
+    asyncio.run(scenario())
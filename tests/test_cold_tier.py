@@ -0,0 +1,147 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from database import AsyncTapDatabase, TapDatabase
+from ipc import RemoteStorage, StorageServer
+from names import normalize_name
+
+DORMANT = '2020-01-01 00:00:00'
+
+
+@pytest.fixture
+def db(tmp_path):
+    # Рейтинг SQL-запросами: монеты холодных игроков - в _cold_coins
+    db = TapDatabase(str(tmp_path / "cold.db"), in_memory_ranking=False, shards=2)
+    db.import_players([
+        (user_id, f"user{user_id}", f"name{user_id}", user_id * 10, user_id, DORMANT, DORMANT)
+        for user_id in range(1, 21)
+    ])
+    yield db
+    db.close()
+
+
+def cold_rows(db):
+    return sum(sqlite3.connect(path).execute('SELECT COUNT(*) FROM players_cold').fetchone()[0]
+               for path in db.shard_paths)
+
+
+def test_archive_keeps_ranks_and_stats(db):
+    ranks = [db.get_player_rank(user_id) for user_id in range(1, 21)]
+    top = db.get_top_players(10)
+    stats = db.get_global_stats()
+    assert asyncio.run(archive(db)) == {'archived': 20}
+    assert cold_rows(db) == 20
+    db.top_cache.clear()
+    assert db.get_top_players(10) == top
+    assert db.get_global_stats() == stats
+    # Ранг - только чтение: игроки остаются холодными, ранги те же
+    assert [db.get_player_rank(user_id) for user_id in range(1, 21)] == ranks
+    assert cold_rows(db) == 20
+    # get_player возвращает игрока в players
+    assert [db.get_player(user_id)['coins'] for user_id in range(1, 21)] == [
+        user_id * 10 for user_id in range(1, 21)
+    ]
+    assert cold_rows(db) == 0
+    assert [db.get_player_rank(user_id) for user_id in range(1, 21)] == ranks
+
+
+async def archive(db):
+    adb = AsyncTapDatabase(db)
+    try:
+        return await adb.archive_inactive(30)
+    finally:
+        # close() закрыл бы и саму базу
+        for executor in adb._writers + [adb._executor]:
+            executor.shutdown(wait=True)
+
+
+def test_reads_rehydrate_on_writer_during_archive(db):
+    async def scenario():
+        adb = AsyncTapDatabase(db)
+        writers = set()
+        rehydrate = db.rehydrate_player
+
+        def tracked(user_id):
+            writers.add(threading.current_thread().name)
+            return rehydrate(user_id)
+
+        db.rehydrate_player = tracked
+        try:
+            for _ in range(5):
+                db.player_cache.clear()
+                # Чтения холодных игроков, архивация и тапы одновременно
+                results = await asyncio.gather(
+                    adb.archive_inactive(0),
+                    *(adb.get_player(user_id) for user_id in range(1, 21)),
+                    *(adb.add_tap(user_id) for user_id in range(1, 21, 5)),
+                    adb.archive_inactive(0),
+                )
+                assert all(player['user_id'] == user_id for user_id, player in zip(range(1, 21), results[1:21]))
+        finally:
+            for executor in adb._writers + [adb._executor]:
+                executor.shutdown(wait=True)
+        return writers
+
+    writers = asyncio.run(scenario())
+    assert writers and all(name.startswith("tapdb-writer") for name in writers)
+    # Каждый игрок ровно в одной таблице, холодные монеты совпадают с таблицей
+    hot = sum(sqlite3.connect(path).execute('SELECT COUNT(*) FROM players').fetchone()[0]
+              for path in db.shard_paths)
+    assert hot + cold_rows(db) == 20
+    cold_coins = sorted(
+        coins for path in db.shard_paths
+        for coins, in sqlite3.connect(path).execute('SELECT coins FROM players_cold')
+    )
+    assert list(db._cold_coins) == cold_coins
+    assert db.get_global_stats()['total_players'] == 20
+    assert db.get_global_stats()['total_taps'] == sum(range(1, 21)) + 5 * 4
+
+
+def test_rolled_back_rehydrate_keeps_cold_coins(db):
+    db.archive_inactive(30)
+    # Игрок 3 снова в players, игрок 5 того же шарда - холодный
+    rank = db.get_player_rank(5)
+    db.archive_inactive(30)
+    db.get_player(3)
+    cold_coins = list(db._cold_coins)
+
+    with pytest.raises(RuntimeError):
+        with db._player_transaction([7]) as conn:
+            conn.execute('UPDATE players SET coins = coins + 1 WHERE user_id = 7')
+            raise RuntimeError("откат")
+    assert list(db._cold_coins) == cold_coins
+    assert cold_rows(db) == 19
+
+    # Имя занято в базе в обход индекса имён - уникальный индекс откатывает транзакцию
+    db.names._owners.pop(normalize_name("name3"))
+    assert not db.set_display_name(5, "name3")
+    assert cold_rows(db) == 19
+    assert list(db._cold_coins) == cold_coins
+    assert db.get_player_rank(5) == rank
+
+
+def test_remote_reads_rehydrate_under_shard_lock(db, tmp_path):
+    server = StorageServer(db, str(tmp_path / "writer.sock"), b"test")
+    server.start()
+    remote = RemoteStorage(server.address, b"test", connections=2)
+    try:
+        remote.archive_inactive(30)
+        assert cold_rows(db) == 20
+        assert remote.read_player(3) == (db.read_player(3)[0], True)
+        # Чтение без переноса не берёт блокировку шарда, перенос - ждёт её
+        lock = server._shard_locks[db.shard_of(3)]
+        with lock:
+            assert remote.read_player(3)[1]
+            moved = threading.Thread(target=remote.get_player, args=(3,))
+            moved.start()
+            moved.join(0.2)
+            assert moved.is_alive() and cold_rows(db) == 20
+        moved.join()
+        assert cold_rows(db) == 19
+        assert remote.read_player(3) == (db.get_player(3), False)
+    finally:
+        remote.close()
+        server.stop()
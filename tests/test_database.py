@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import SQL_GLOBAL_STATS, TapDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = TapDatabase(str(tmp_path / "taps.db"))
+    yield db
+    db.close()
+
+
+def table_stats(db):
+    """Суммы по таблице игроков - с ними сверяется global_stats"""
+    conn = sqlite3.connect(db.db_path)
+    try:
+        players, coins, taps = conn.execute(SQL_GLOBAL_STATS).fetchone()
+    finally:
+        conn.close()
+    return {'total_players': players, 'total_coins': coins or 0, 'total_taps': taps or 0}
+
+
+def test_add_tap_creates_and_increments(db):
+    # Upsert создаёт игрока первым тапом и возвращает строку после записи
+    first = db.add_tap(1, 3)
+    assert (first['coins'], first['total_taps']) == (3, 3)
+    second = db.add_tap(1, 2)
+    assert (second['coins'], second['total_taps']) == (5, 5)
+    # Строка обновляется на месте: дата создания не переписывается
+    assert second['created_at'] == first['created_at']
+    assert db.get_player(1)['coins'] == 5
+
+
+def test_add_tap_keeps_existing_fields(db):
+    db.create_player(1, "alice")
+    assert db.set_display_name(1, "Alice")
+    player = db.add_tap(1, 4)
+    assert (player['username'], player['display_name'], player['coins']) == ("alice", "Alice", 4)
+
+
+def test_add_taps_bulk_sums_repeated_players(db):
+    db.add_tap(1, 1)
+    db.add_taps_bulk([(1, 2), (2, 5), (1, 3), (3, 1)])
+    assert [db.get_player(user_id)['total_taps'] for user_id in (1, 2, 3)] == [6, 5, 1]
+
+
+def test_concurrent_taps_are_not_lost(db):
+    threads, taps_per_thread = 8, 200
+
+    def tap(user_ids):
+        for _ in range(taps_per_thread):
+            for user_id in user_ids:
+                db.add_tap(user_id, 1)
+
+    def tap_bulk():
+        for _ in range(taps_per_thread):
+            db.add_taps_bulk([(1, 1), (2, 1)])
+
+    workers = [threading.Thread(target=tap, args=([1, 2],)) for _ in range(threads)]
+    workers.append(threading.Thread(target=tap_bulk))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    expected = (threads + 1) * taps_per_thread
+    for user_id in (1, 2):
+        player = db.get_player(user_id)
+        assert (player['coins'], player['total_taps']) == (expected, expected)
+
+
+def test_global_stats_follow_writes(db):
+    db.create_player(1, "a")
+    db.add_tap(1, 10)
+    db.add_taps_bulk([(user_id, user_id) for user_id in range(2, 50)])
+    db.save_player(dict(db.get_player(2), coins=1000))
+    db.buy_upgrade(2, "tap_power")
+    assert db.get_global_stats() == table_stats(db)
+
+
+def test_reconcile_agrees_after_bulk_taps(db):
+    for round_ in range(5):
+        db.add_taps_bulk([(user_id, round_ + 1) for user_id in range(1, 200)])
+    stats = db.get_global_stats()
+    assert stats == table_stats(db)
+    # Счётчики триггеров не расходились - сверка ничего не меняет
+    assert db.reconcile_global_stats() == stats
+
+
+def test_reconcile_repairs_drift(db):
+    db.add_taps_bulk([(user_id, 1) for user_id in range(1, 10)])
+    with db.pools[0].transaction() as conn:
+        conn.execute('UPDATE global_stats SET total_coins = total_coins + 100 WHERE id = 1')
+    assert db.get_global_stats() != table_stats(db)
+    assert db.reconcile_global_stats() == table_stats(db)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from edits import MessageEditor, edit_digest
+
+
+def sender(shown, text, modified=True):
+    async def send():
+        shown.append(text)
+        return modified
+    return send
+
+
+def test_edit_digest_is_stable():
+    assert edit_digest("a", '{"k": 1}') == edit_digest("a", '{"k": 1}')
+    assert edit_digest("a", '{"k": 1}') != edit_digest("a", '{"k": 2}')
+    assert edit_digest("a") != edit_digest("b")
+    # Граница текста и клавиатуры учитывается
+    assert edit_digest("ab", "c") != edit_digest("a", "bc")
+
+
+def test_unchanged_edits_are_skipped_and_latest_is_sent():
+    async def scenario():
+        editor = MessageEditor(interval=0.05)
+        shown = []
+
+        assert await editor.edit(1, 10, edit_digest("a"), sender(shown, "a"))
+        # Тот же текст не отправляется
+        assert not await editor.edit(1, 10, edit_digest("a"), sender(shown, "a"))
+        # Частые правки склеиваются: уходит последняя
+        assert not await editor.edit(1, 10, edit_digest("b"), sender(shown, "b"))
+        assert not await editor.edit(1, 10, edit_digest("c"), sender(shown, "c"))
+        await asyncio.sleep(0.2)
+        assert shown == ["a", "c"]
+
+        # Telegram ответил "not modified": текст на экране, повтор не нужен
+        await asyncio.sleep(0.1)
+        assert not await editor.edit(1, 11, edit_digest("a"), sender(shown, "a", modified=False))
+        assert not await editor.edit(1, 11, edit_digest("a"), sender(shown, "a"))
+        await asyncio.sleep(0.2)
+        assert editor.stats() == {
+            'sent': 2, 'skipped': 2, 'unchanged': 1, 'debounced': 1, 'failed': 0, 'pending': 0
+        }
+
+        # Отложенное при закрытии отправляется сразу
+        await editor.edit(1, 10, edit_digest("d"), sender(shown, "d"))
+        await editor.close()
+        assert shown[-1] == "d"
+
+    asyncio.run(scenario())
+
+
+def test_failed_edit_is_sent_again():
+    async def scenario():
+        editor = MessageEditor(interval=0)
+        shown = []
+
+        async def fail():
+            raise RuntimeError("сеть недоступна")
+
+        with pytest.raises(RuntimeError):
+            await editor.edit(1, 10, edit_digest("a"), fail)
+        assert await editor.edit(1, 10, edit_digest("a"), sender(shown, "a"))
+        assert shown == ["a"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import handlers
+from config import Config
+from main import create_app
+
+BOT_TOKEN = "123456:test"
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeWebAppData:
+    def __init__(self, data: str):
+        self.data = data
+
+
+class FakeMessage:
+    """Сообщение с данными WebApp от пользователя user_id"""
+
+    def __init__(self, user_id: int, payload: dict):
+        self.from_user = FakeUser(user_id)
+        self.web_app_data = FakeWebAppData(json.dumps(payload))
+        self.answers = []
+
+    async def answer(self, text: str, **kwargs):
+        self.answers.append(json.loads(text))
+
+
+def make_game(tmp_path, **options):
+    return create_app(Config(
+        bot_token=BOT_TOKEN, db_path=str(tmp_path / "game.db"), api_public_url="",
+        broadcast_db_path=str(tmp_path / "broadcasts.db"), **options
+    ), with_bot=False)
+
+
+def test_web_app_taps_credit_the_sender(tmp_path):
+    async def scenario():
+        game = make_game(tmp_path)
+        try:
+            message = FakeMessage(1, {"action": "tap"})
+            await handlers.handle_web_app_data(message, game)
+            assert message.answers == [{"success": True, "coins": 1, "total_taps": 1, "coins_added": 1}]
+
+            # Чужой user_id в данных WebApp не даёт тапать за другого игрока
+            forged = FakeMessage(1, {"action": "tap", "user_id": 2})
+            await handlers.handle_web_app_data(forged, game)
+            assert forged.answers[0]["success"] is False
+            await game.taps.flush()
+            assert (await game.db.get_player(1))["coins"] == 1
+            assert not await game.db.get_player(2)
+        finally:
+            await game.db.close()
+
+    asyncio.run(scenario())
+
+
+def test_web_app_taps_use_the_sender_bucket(tmp_path):
+    async def scenario():
+        game = make_game(tmp_path, tap_rate_limit=1, tap_rate_burst=2)
+        try:
+            for _ in range(3):
+                await handlers.handle_web_app_data(FakeMessage(1, {"action": "tap", "user_id": 1}), game)
+            # Бакет игрока 1 пуст, бакет игрока 2 не тронут
+            assert game.tap_limiter.stats() == {'allowed': 2, 'rejected': 1, 'tracked': 1}
+            message = FakeMessage(2, {"action": "tap"})
+            await handlers.handle_web_app_data(message, game)
+            assert message.answers[0]["coins_added"] == 1
+        finally:
+            await game.db.close()
+
+    asyncio.run(scenario())
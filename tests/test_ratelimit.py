@@ -0,0 +1,29 @@
+import pytest
+
+from ratelimit import TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_refills_at_rate():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate=2, burst=3, clock=clock)
+    assert limiter.consume(1, 5) == 3
+    assert limiter.delay(1) == 0.5
+    clock.now = 1.0
+    assert limiter.consume(1, 5) == 2
+    clock.now = 10.0
+    assert limiter.evict_idle() == 1
+    assert len(limiter) == 0
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 10), (-1, 10), (1, 0), (1, 0.5)])
+def test_rejects_invalid_limits(rate, burst):
+    with pytest.raises(ValueError):
+        TokenBucketLimiter(rate=rate, burst=burst)
@@ -0,0 +1,102 @@
+import random
+import sqlite3
+
+import pytest
+
+from database import TapDatabase, shard_paths
+from migrate_shards import migrate
+
+PLAYERS = 300
+
+
+def fill(db, seed=1):
+    """Игроки с именами и без, тапы, улучшения и корзины тапов"""
+    rnd = random.Random(seed)
+    for user_id in range(1, PLAYERS + 1):
+        db.create_player(user_id, f"user{user_id}")
+        if user_id % 3:
+            assert db.set_display_name(user_id, f"Игрок {user_id}")
+    db.add_taps_bulk([(user_id, rnd.randint(1, 500)) for user_id in range(1, PLAYERS + 1)])
+    for user_id in rnd.sample(range(1, PLAYERS + 1), 20):
+        db.add_tap(user_id, rnd.randint(1, 50))
+    db.buy_upgrade(7, "tap_power")
+
+
+def view(db):
+    """Всё, что бот показывает игрокам, без зависимостей от раскладки по файлам"""
+    db.top_cache.clear()
+    top = db.get_top_players(20)
+    players = {}
+    for user_id in range(1, PLAYERS + 1):
+        player = db.get_player(user_id)
+        players[user_id] = (player['username'], player['display_name'], player['coins'],
+                            player['total_taps'], player['tap_power'])
+    return {
+        'players': players,
+        'top': top,
+        'page': db.get_top_page(after=(top[-1]['coins'], top[-1]['user_id']), limit=20),
+        'ranks': [db.get_player_rank(user_id) for user_id in range(1, PLAYERS + 1, 7)],
+        'around': db.get_players_around(10, 3),
+        'window_top': db.get_window_top('day', 10),
+        'stats': db.get_global_stats(),
+        'user_ids': db.list_user_ids(0, PLAYERS + 10),
+    }
+
+
+def test_shard_paths():
+    assert shard_paths("tap_game.db", 1) == ["tap_game.db"]
+    assert shard_paths("data/tap_game.db", 3) == ["data/tap_game.0.db", "data/tap_game.1.db", "data/tap_game.2.db"]
+
+
+def test_players_are_routed_by_user_id(tmp_path):
+    db = TapDatabase(str(tmp_path / "taps.db"), shards=3)
+    try:
+        fill(db)
+        assert db.split_by_shard([(4, 1), (5, 1), (6, 1), (7, 1)]) == {1: [(4, 1), (7, 1)], 2: [(5, 1)], 0: [(6, 1)]}
+        for shard, path in enumerate(db.shard_paths):
+            conn = sqlite3.connect(path)
+            user_ids = [row[0] for row in conn.execute('SELECT user_id FROM players')]
+            hour_ids = [row[0] for row in conn.execute('SELECT user_id FROM tap_hours')]
+            conn.close()
+            assert user_ids and all(user_id % 3 == shard for user_id in user_ids)
+            assert all(user_id % 3 == shard for user_id in hour_ids)
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("in_memory_ranking", [True, False])
+@pytest.mark.parametrize("shards", [2, 3])
+def test_migrate_then_read_back(tmp_path, shards, in_memory_ranking):
+    source = str(tmp_path / "taps.db")
+    single = TapDatabase(source, in_memory_ranking=in_memory_ranking)
+    fill(single)
+    expected = view(single)
+    # Часть игроков в холодном слое - их миграция тоже переносит
+    with single.pools[0].transaction() as conn:
+        conn.execute("UPDATE players SET last_active = '2020-01-01 00:00:00' WHERE user_id % 5 = 0")
+    assert single.archive_inactive(30)['archived'] == PLAYERS // 5
+    single.close()
+
+    assert migrate(source, shards)
+    sharded = TapDatabase(source, shards=shards, in_memory_ranking=in_memory_ranking)
+    try:
+        assert view(sharded) == expected
+        assert sharded.reconcile_global_stats() == expected['stats']
+    finally:
+        sharded.close()
+
+    # Повторная миграция в заполненные шарды не запускается
+    assert not migrate(source, shards)
+
+
+@pytest.mark.parametrize("in_memory_ranking", [True, False])
+def test_sharded_matches_single_file(tmp_path, in_memory_ranking):
+    single = TapDatabase(str(tmp_path / "single.db"), in_memory_ranking=in_memory_ranking)
+    sharded = TapDatabase(str(tmp_path / "sharded.db"), shards=4, in_memory_ranking=in_memory_ranking)
+    try:
+        fill(single)
+        fill(sharded)
+        assert view(sharded) == view(single)
+    finally:
+        single.close()
+        sharded.close()
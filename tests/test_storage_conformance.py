@@ -0,0 +1,352 @@
+import os
+import random
+
+import pytest
+
+from leaderboard import NO_RANK
+from memory_storage import MemoryStorage
+from storage import create_storage
+
+# Все движки обязаны вести себя одинаково: (движок, параметры create_storage)
+ENGINES = {
+    'sqlite': ('sqlite', {}),
+    'sqlite-sql-ranking': ('sqlite', {'in_memory_ranking': False}),
+    'sqlite-3-shards': ('sqlite', {'shards': 3}),
+    'sqlite-3-shards-sql-ranking': ('sqlite', {'shards': 3, 'in_memory_ranking': False}),
+    'memory': ('memory', {'snapshot_every': 50}),
+}
+PLAYERS = 60
+
+
+class Engine:
+    """Хранилище выбранного движка во временном каталоге; reopen - как перезапуск бота"""
+
+    def __init__(self, name: str, workdir: str):
+        self.engine, self.options = ENGINES[name]
+        self.path = os.path.join(workdir, "taps.db" if self.engine == 'sqlite' else "taps.mem")
+        self.storage = None
+        self.open()
+
+    def open(self):
+        self.storage = create_storage(self.engine, self.path, **self.options)
+        if self.engine == 'sqlite':
+            # Топ без кэша: проверяется сам движок, а не срок жизни кэша
+            self.storage.top_cache.ttl = 0
+        return self.storage
+
+    def reopen(self):
+        self.storage.close()
+        return self.open()
+
+
+@pytest.fixture(params=list(ENGINES))
+def engine(request, tmp_path):
+    engine = Engine(request.param, str(tmp_path))
+    yield engine
+    engine.storage.close()
+
+
+@pytest.fixture
+def db(engine):
+    return engine.storage
+
+
+def fill(db, seed=1):
+    """Игроки с именами и без, с разными монетами и совпадающими монетами"""
+    rnd = random.Random(seed)
+    for user_id in range(1, PLAYERS + 1):
+        db.create_player(user_id, f"user{user_id}")
+        if user_id % 4:
+            assert db.set_display_name(user_id, f"Игрок {user_id}")
+    # Одинаковые монеты у нескольких игроков - порядок по user_id
+    db.add_taps_bulk([(user_id, rnd.choice([5, 10, 10, 50, 120, 300])) for user_id in range(1, PLAYERS + 1)])
+    for user_id in rnd.sample(range(1, PLAYERS + 1), 10):
+        db.add_tap(user_id, rnd.randint(1, 30))
+
+
+def model(db):
+    """Ожидаемый топ и ранги, посчитанные перебором строк игроков"""
+    players = [db.get_player(user_id) for user_id in range(1, PLAYERS + 1)]
+    named = sorted((p for p in players if p.get('display_name')), key=lambda p: (-p['coins'], p['user_id']))
+    return players, named
+
+
+def top_row(player, rank):
+    return {'user_id': player['user_id'], 'name': player['display_name'], 'coins': player['coins'],
+            'total_taps': player['total_taps'], 'rank': rank}
+
+
+def view(db):
+    """Всё, что видят игроки, для сравнения состояний"""
+    return {
+        # Время создания и активности у движков, заполненных по очереди, разное
+        'players': [{key: value for key, value in db.get_player(user_id).items()
+                     if key not in ('created_at', 'last_active')}
+                    for user_id in range(1, PLAYERS + 2)],
+        'top': db.get_top_players(15),
+        'ranks': [db.get_player_rank(user_id) for user_id in range(1, PLAYERS + 2)],
+        'window_top': db.get_window_top('day', 10),
+        'stats': db.get_global_stats(),
+        # Варианты имён случайны - сравнивается только занятость
+        'names': [db.suggest_names(f"игрок {user_id}")['available'] for user_id in range(1, 9)],
+    }
+
+
+def test_create_and_get(db):
+    assert db.get_player(1) == {}
+    player = db.create_player(1, "alice")
+    assert (player['user_id'], player['username'], player['coins'], player['total_taps']) == (1, "alice", 0, 0)
+    assert player['tap_power'] == 1 and player['income_per_hour'] == 0
+    # Повторное создание не сбрасывает игрока
+    db.add_tap(1, 3)
+    assert db.create_player(1, "other")['coins'] == 3
+    assert db.set_username(1, "bob")
+    assert db.get_player(1)['username'] == "bob"
+    assert not db.set_username(2, "nobody")
+
+
+def test_taps_and_stats(db):
+    assert db.add_tap(1, 2)['coins'] == 2
+    db.add_taps_bulk([(1, 3), (2, 4), (1, 1)])
+    assert (db.get_player(1)['total_taps'], db.get_player(2)['total_taps']) == (6, 4)
+    assert db.get_global_stats() == {'total_players': 2, 'total_coins': 10, 'total_taps': 10}
+    assert db.reconcile_global_stats() == db.get_global_stats()
+
+
+def test_top_and_rank(db):
+    fill(db)
+    players, named = model(db)
+    assert db.get_top_players(15) == [top_row(p, idx) for idx, p in enumerate(named[:15], 1)]
+    for player in players:
+        higher = sum(1 for other in players if other['coins'] > player['coins'])
+        assert db.get_player_rank(player['user_id']) == higher + 1
+    db.create_player(PLAYERS + 1)
+    assert db.get_player_rank(PLAYERS + 1) == NO_RANK
+
+
+def test_pages(db):
+    fill(db)
+    _, named = model(db)
+    expected = [top_row(p, idx) for idx, p in enumerate(named, 1)]
+    # Вперёд по курсору последней строки до конца
+    pages, page = [], db.get_top_page(limit=7)
+    while page:
+        pages.append(page)
+        page = db.get_top_page(after=(page[-1]['coins'], page[-1]['user_id']), limit=7)
+    assert [row for page in pages for row in page] == expected
+    # Назад от первой строки страницы - предыдущая страница
+    for previous, page in zip(pages, pages[1:]):
+        assert db.get_top_page(before=(page[0]['coins'], page[0]['user_id']), limit=7) == previous
+    assert db.get_top_page(before=(expected[0]['coins'], expected[0]['user_id'])) == []
+
+
+def test_around(db):
+    fill(db)
+    _, named = model(db)
+    expected = [top_row(p, idx) for idx, p in enumerate(named, 1)]
+    for user_id in (1, 4, 7, named[0]['user_id'], named[-1]['user_id']):
+        position = next((idx for idx, row in enumerate(expected) if row['user_id'] == user_id), None)
+        if position is None:
+            # Без имени: соседи вокруг места, где игрок стоял бы
+            player = db.get_player(user_id)
+            position = sum(1 for p in named if (-p['coins'], p['user_id']) < (-player['coins'], user_id))
+            rows = expected[max(position - 2, 0):position + 2]
+        else:
+            rows = expected[max(position - 2, 0):position + 3]
+        assert db.get_players_around(user_id, 2) == rows, user_id
+
+
+def test_windows(db):
+    fill(db)
+    players, named = model(db)
+    # Все тапы сделаны сейчас - за день, неделю и сезон одинаковы
+    by_taps = sorted(named, key=lambda p: (-p['total_taps'], p['user_id']))
+    for window in ('day', 'week', 'season'):
+        assert db.get_window_top(window, 5) == [
+            {'user_id': p['user_id'], 'name': p['display_name'], 'taps': p['total_taps'], 'rank': idx}
+            for idx, p in enumerate(by_taps[:5], 1)
+        ]
+        for player in players[:10]:
+            higher = sum(1 for other in players if other['total_taps'] > player['total_taps'])
+            assert db.get_window_rank(window, player['user_id']) == {'rank': higher + 1, 'taps': player['total_taps']}
+    assert db.get_window_rank('day', PLAYERS + 5) == {'rank': NO_RANK, 'taps': 0}
+    with pytest.raises(ValueError):
+        db.get_window_top('year')
+
+
+def test_names(db):
+    db.create_player(1)
+    db.create_player(2)
+    assert db.set_display_name(1, "Вася")
+    # Регистр и пробелы не делают имя другим
+    assert not db.set_display_name(2, "ВАСЯ ")
+    assert db.set_display_name(1, "вася")
+    result = db.suggest_names("Вася", 3, user_id=2)
+    assert not result['available'] and len(result['suggestions']) == 3
+    assert all(db.suggest_names(name, user_id=2)['available'] for name in result['suggestions'])
+    assert db.suggest_names("Вася", user_id=1)['available']
+    # Смена имени освобождает прежнее
+    assert db.set_display_name(1, "Петя")
+    assert db.set_display_name(2, "Вася")
+    assert [db.get_player(user_id)['display_name'] for user_id in (1, 2)] == ["Петя", "Вася"]
+    assert [row['name'] for row in db.get_top_players()] == ["Петя", "Вася"]
+    db.add_taps_bulk([(1, 1), (2, 2)])
+    assert [row['name'] for row in db.get_top_players()] == ["Вася", "Петя"]
+
+
+def test_upgrades(db):
+    db.create_player(1)
+    result = db.buy_upgrade(1, 'tap_power')
+    assert not result['success'] and result['price'] == 100 and result['player']['tap_power'] == 1
+    db.add_tap(1, 150)
+    result = db.buy_upgrade(1, 'tap_power')
+    assert result['success'] and result['player']['coins'] == 50 and result['player']['tap_power'] == 2
+    assert db.add_tap(1, 5)['coins'] == 60
+    assert db.get_global_stats()['total_coins'] == 60
+    with pytest.raises(ValueError):
+        db.buy_upgrade(1, 'unknown')
+
+
+def test_list_user_ids(db):
+    db.add_taps_bulk([(user_id, 1) for user_id in range(1, 26)])
+    pages, after = [], 0
+    while True:
+        page = db.list_user_ids(after, 4)
+        if not page:
+            break
+        pages.extend(page)
+        after = page[-1]
+    assert pages == list(range(1, 26))
+
+
+def test_state_survives_restart(engine):
+    fill(engine.storage)
+    engine.storage.buy_upgrade(3, 'tap_power')
+    expected = view(engine.storage)
+    created_at = engine.storage.get_player(1)['created_at']
+    assert view(engine.reopen()) == expected
+    assert engine.storage.get_player(1)['created_at'] == created_at
+
+
+def test_engines_agree(tmp_path):
+    views = {}
+    for name in ENGINES:
+        (tmp_path / name).mkdir()
+        engine = Engine(name, str(tmp_path / name))
+        try:
+            fill(engine.storage)
+            views[name] = view(engine.storage)
+        finally:
+            engine.storage.close()
+    reference = views.pop('sqlite')
+    for name, other in views.items():
+        assert other == reference, name
+
+
+# Восстановление хранилища в памяти: журнал операций и снимки
+
+def memory_storage(path, **options):
+    options.setdefault('snapshot_every', 0)
+    options.setdefault('snapshot_on_close', False)
+    return MemoryStorage(path, **options)
+
+
+def test_memory_recovers_from_torn_journal_tail(tmp_path):
+    path = str(tmp_path / "taps.mem")
+    db = memory_storage(path)
+    fill(db)
+    expected = view(db)
+    db.close()
+    log_path = db._log_path(db._generation)
+    size = os.path.getsize(log_path)
+    # Падение посреди записи: недописанная строка без перевода строки
+    with open(log_path, 'ab') as log:
+        log.write(b'["t",1700000000,1,')
+
+    db = memory_storage(path)
+    try:
+        assert view(db) == expected
+        # Оборванный хвост отрезан - новые операции пишутся с целой строки
+        assert os.path.getsize(log_path) == size
+        db.add_tap(1, 1)
+    finally:
+        db.close()
+    db = memory_storage(path)
+    try:
+        assert db.get_player(1)['total_taps'] == expected['players'][0]['total_taps'] + 1
+    finally:
+        db.close()
+
+
+def test_memory_recovers_from_truncated_journal(tmp_path):
+    path = str(tmp_path / "taps.mem")
+    db = memory_storage(path)
+    fill(db)
+    expected = view(db)
+    db.add_tap(2, 7)
+    db.close()
+    log_path = db._log_path(db._generation)
+    # Файл обрезан посреди последней операции: теряется только она
+    with open(log_path, 'r+b') as log:
+        log.truncate(os.path.getsize(log_path) - 3)
+
+    db = memory_storage(path)
+    try:
+        assert view(db) == expected
+    finally:
+        db.close()
+
+
+def test_memory_rejects_corrupted_older_generation(tmp_path):
+    path = str(tmp_path / "taps.mem")
+    db = memory_storage(path)
+    db.add_tap(1, 1)
+    db._log.flush()
+    first_log = db._log_path(db._generation)
+    # Новое поколение без снимка: журнал прежнего нужен целиком
+    db._generation += 1
+    db._log.close()
+    db._log = open(db._log_path(db._generation), 'a', encoding='utf-8')
+    db.add_tap(1, 1)
+    db.close()
+    with open(first_log, 'ab') as log:
+        log.write(b'{broken\n')
+
+    with pytest.raises(ValueError):
+        memory_storage(path)
+
+
+def test_memory_recovers_from_snapshot_and_later_generations(tmp_path):
+    path = str(tmp_path / "taps.mem")
+    # Снимок каждые 20 операций: состояние - снимок плюс журналы после него
+    db = memory_storage(path, snapshot_every=20)
+    fill(db)
+    db.buy_upgrade(5, 'tap_power')
+    assert os.path.exists(db.snapshot_path)
+    generation = db._generation
+    assert generation > 1
+    db.add_taps_bulk([(user_id, 3) for user_id in range(1, 8)])
+    expected = view(db)
+    db.close()
+    # Журналы, вошедшие в снимок, удалены
+    assert db._log_generations()[0] >= generation
+
+    db = memory_storage(path)
+    try:
+        assert view(db) == expected
+        db.snapshot()
+        db.add_tap(9, 2)
+        expected = view(db)
+    finally:
+        db.close()
+    # Журнал поколения старше снимка, оставшийся после падения, при запуске удаляется
+    stale = db._log_path(0)
+    with open(stale, 'w', encoding='utf-8') as log:
+        log.write('["t",1700000000,1,1000]\n')
+
+    db = memory_storage(path)
+    try:
+        assert view(db) == expected
+        assert not os.path.exists(stale)
+    finally:
+        db.close()
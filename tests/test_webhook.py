@@ -0,0 +1,55 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from config import Config
+from main import create_app
+
+BOT_TOKEN = "123456:test"
+SECRET = "webhook-secret"
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1, "date": 0, "text": "/start",
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"}
+    }
+}
+
+
+def test_webhook_checks_secret_and_dispatches_updates(tmp_path):
+    async def scenario():
+        game = create_app(Config(
+            bot_token=BOT_TOKEN, bot_mode="webhook", webhook_secret=SECRET, api_public_url="",
+            db_path=str(tmp_path / "game.db"), broadcast_db_path=str(tmp_path / "broadcasts.db")
+        ))
+        received = []
+
+        # Апдейты перехватываются до обработчиков: в Telegram тест не ходит
+        async def record(handler, update, data):
+            received.append(update.update_id)
+
+        game.dispatcher.update.outer_middleware(record)
+        client = TestClient(TestServer(game.create_webhook_app()))
+        await client.start_server()
+        try:
+            path = game.config.webhook_path
+            resp = await client.post(path, json=UPDATE)
+            assert resp.status == 401
+            resp = await client.post(path, json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+            assert resp.status == 401
+            await asyncio.sleep(0.05)
+            assert received == []
+
+            resp = await client.post(path, json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+            assert resp.status == 200
+            for _ in range(100):
+                if received:
+                    break
+                await asyncio.sleep(0.01)
+            assert received == [1]
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,226 @@
+import calendar
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from leaderboard import NO_RANK
+
+# Рейтинги за период считаются по тапам (монеты включают доход и траты).
+# Периоды календарные, по UTC: день, неделя с понедельника, сезон - месяц
+WINDOWS = ('day', 'week', 'season')
+WINDOW_TITLES = {'day': 'за день', 'week': 'за неделю', 'season': 'за сезон'}
+
+HOUR = 3600
+DAY = 86400
+# Тапы копятся в часовых корзинах; корзины старше двух суток сворачиваются
+# в суточные, суточные хранятся дольше самого длинного периода (сезона)
+HOURLY_RETENTION = 2 * DAY
+DAILY_RETENTION = 35 * DAY
+
+
+def hour_start(ts: float) -> int:
+    """Начало часа"""
+    return int(ts // HOUR) * HOUR
+
+
+def day_start(ts: float) -> int:
+    """Начало суток (UTC)"""
+    return int(ts // DAY) * DAY
+
+
+def window_start(window: str, ts: float) -> int:
+    """Начало периода, в который попадает момент ts"""
+    if window == 'day':
+        return day_start(ts)
+    if window == 'week':
+        # 1 января 1970 - четверг: сдвигаем к понедельнику
+        day = day_start(ts)
+        return day - ((day // DAY + 3) % 7) * DAY
+    if window == 'season':
+        year, month = time.gmtime(ts)[:2]
+        return calendar.timegm((year, month, 1, 0, 0, 0))
+    raise ValueError(f"Неизвестный период рейтинга: {window}")
+
+
+def check_window(window: str):
+    """ValueError для неизвестного периода"""
+    if window not in WINDOWS:
+        raise ValueError(f"Неизвестный период рейтинга: {window}")
+
+
+def compaction_cutoffs(now: float) -> Tuple[int, int]:
+    """Часы раньше первой границы сворачиваются в сутки, сутки раньше второй удаляются"""
+    return day_start(now - HOURLY_RETENTION), day_start(now - DAILY_RETENTION)
+
+
+def history_start(ts: float) -> int:
+    """С какого момента нужны корзины, чтобы собрать все текущие периоды"""
+    return min(window_start(window, ts) for window in WINDOWS)
+
+
+class TapBuckets:
+    """Тапы по часам и суткам в памяти - для хранилища без SQL (memory)"""
+
+    def __init__(self):
+        self.hours: Dict[int, Dict[int, int]] = {}
+        self.days: Dict[int, Dict[int, int]] = {}
+
+    def add(self, ts: float, deltas: Iterable[Tuple[int, int]]):
+        """Прибавить тапы (user_id, taps) в корзину часа ts"""
+        bucket = self.hours.setdefault(hour_start(ts), {})
+        for user_id, taps in deltas:
+            bucket[user_id] = bucket.get(user_id, 0) + taps
+
+    def compact(self, now: float) -> Dict[str, int]:
+        """Свернуть старые часы в сутки и удалить корзины старше хранения"""
+        hour_cutoff, day_cutoff = compaction_cutoffs(now)
+        rolled = 0
+        for hour in [hour for hour in self.hours if hour < hour_cutoff]:
+            day = self.days.setdefault(day_start(hour), {})
+            for user_id, taps in self.hours.pop(hour).items():
+                day[user_id] = day.get(user_id, 0) + taps
+                rolled += 1
+
+        pruned = 0
+        for day in [day for day in self.days if day < day_cutoff]:
+            pruned += len(self.days.pop(day))
+        return {'rolled_up': rolled, 'pruned': pruned}
+
+    def rows(self, since: int = 0) -> Iterable[Tuple[int, int, int]]:
+        """Строки (начало корзины, user_id, тапы) с начала since"""
+        for buckets in (self.days, self.hours):
+            for start, bucket in buckets.items():
+                if start >= since:
+                    for user_id, taps in bucket.items():
+                        yield start, user_id, taps
+
+    def dump(self) -> Iterable[list]:
+        """Строки снимка: ['d' или 'h', начало, user_id, тапы]"""
+        for kind, buckets in (('d', self.days), ('h', self.hours)):
+            for start, bucket in buckets.items():
+                for user_id, taps in bucket.items():
+                    yield [kind, start, user_id, taps]
+
+    def load(self, row: list):
+        """Строка снимка"""
+        kind, start, user_id, taps = row
+        buckets = self.days if kind == 'd' else self.hours
+        bucket = buckets.setdefault(start, {})
+        bucket[user_id] = bucket.get(user_id, 0) + taps
+
+
+class WindowedLeaderboard:
+    """Рейтинги за текущие день, неделю и сезон в памяти: топ и ранг за O(log n)
+
+    Тапы прибавляются к счётчикам всех текущих периодов сразу, поэтому
+    запрос не суммирует историю. Когда период сменяется, его счётчики
+    начинаются заново; при запуске они собираются из корзин хранилища.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: Dict[int, str] = {}
+        self._starts: Dict[str, int] = {}
+        self._taps: Dict[str, Dict[int, int]] = {}
+        # Мультимножество тапов периода - для ранга
+        self._all: Dict[str, SortedList] = {}
+        # (-taps, user_id) игроков с именем - для топа
+        self._named: Dict[str, SortedList] = {}
+        self._roll(time.time())
+
+    def _roll(self, now: float):
+        """Начать заново периоды, которые сменились (вызывать под блокировкой)"""
+        for window in WINDOWS:
+            start = window_start(window, now)
+            # Запоздавшая пачка с прошлым временем не откатывает период назад
+            if start > self._starts.get(window, -1):
+                self._starts[window] = start
+                self._taps[window] = {}
+                self._all[window] = SortedList()
+                self._named[window] = SortedList()
+
+    def _add(self, window: str, user_id: int, taps: int):
+        """Прибавить тапы игроку в периоде (вызывать под блокировкой)"""
+        scores = self._taps[window]
+        old = scores.get(user_id)
+        if old is not None:
+            self._all[window].remove(old)
+            if user_id in self._names:
+                self._named[window].remove((-old, user_id))
+        new = (old or 0) + taps
+        scores[user_id] = new
+        self._all[window].add(new)
+        if user_id in self._names:
+            self._named[window].add((-new, user_id))
+
+    def load_names(self, rows: Iterable[Tuple[int, str]]):
+        """Имена игроков парами (user_id, display_name)"""
+        for user_id, display_name in rows:
+            self.set_name(user_id, display_name)
+
+    def set_name(self, user_id: int, display_name: Optional[str]):
+        """Обновить отображаемое имя (пустое - игрок не попадает в топ)"""
+        with self._lock:
+            had_name = user_id in self._names
+            if display_name:
+                self._names[user_id] = display_name
+            else:
+                self._names.pop(user_id, None)
+            if had_name == bool(display_name):
+                return
+            for window in WINDOWS:
+                taps = self._taps[window].get(user_id)
+                if taps is None:
+                    continue
+                if display_name:
+                    self._named[window].add((-taps, user_id))
+                else:
+                    self._named[window].remove((-taps, user_id))
+
+    def load(self, buckets: Iterable[Tuple[int, int, int]], now: Optional[float] = None):
+        """Собрать текущие периоды из корзин (начало корзины, user_id, тапы)"""
+        with self._lock:
+            self._roll(now or time.time())
+            for start, user_id, taps in buckets:
+                for window in WINDOWS:
+                    if start >= self._starts[window]:
+                        self._add(window, user_id, taps)
+
+    def add(self, deltas: Iterable[Tuple[int, int]], ts: Optional[float] = None):
+        """Учесть тапы (user_id, taps), сделанные в момент ts"""
+        ts = ts or time.time()
+        with self._lock:
+            self._roll(ts)
+            for user_id, taps in deltas:
+                for window in WINDOWS:
+                    # Тапы из пачки, записанной уже после смены периода, в новый не идут
+                    if ts >= self._starts[window]:
+                        self._add(window, user_id, taps)
+
+    def top(self, window: str, limit: int = 10) -> List[Dict]:
+        """Топ игроков с именем за текущий период"""
+        check_window(window)
+        with self._lock:
+            self._roll(time.time())
+            return [
+                {
+                    'user_id': user_id,
+                    'name': self._names[user_id],
+                    'taps': -neg_taps,
+                    'rank': idx
+                }
+                for idx, (neg_taps, user_id) in enumerate(self._named[window].islice(0, limit), 1)
+            ]
+
+    def rank(self, window: str, user_id: int) -> Dict:
+        """{'rank': ранг, 'taps': тапы} игрока за текущий период"""
+        check_window(window)
+        with self._lock:
+            self._roll(time.time())
+            taps = self._taps[window].get(user_id, 0)
+            if not taps:
+                return {'rank': NO_RANK, 'taps': 0}
+            all_taps = self._all[window]
+            return {'rank': len(all_taps) - all_taps.bisect_right(taps) + 1, 'taps': taps}